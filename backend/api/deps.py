@@ -1,14 +1,26 @@
-from sqlalchemy.orm import Session
-from core.database import get_db
+import secrets
+from typing import Optional
+from fastapi import Header, HTTPException
+from config.settings import settings
+from core.database import get_db, get_async_db
 
-# 数据库依赖 - 直接使用get_db生成器
-get_database = get_db
+# 数据库依赖 - API请求使用异步会话，避免查询阻塞事件循环
+get_database = get_async_db
+
+# 运维接口访问校验：/system/* 会暴露SQL文本和内部运行状态
+async def require_system_token(x_system_token: Optional[str] = Header(None)):
+    """校验请求头 X-System-Token，未配置 SYSTEM_API_TOKEN 时运维接口不可用"""
+    if not settings.system_api_token:
+        raise HTTPException(status_code=403, detail="运维接口未启用，请配置 SYSTEM_API_TOKEN")
+    if not x_system_token or not secrets.compare_digest(x_system_token, settings.system_api_token):
+        raise HTTPException(status_code=401, detail="运维接口访问令牌无效")
 
 # 服务实例依赖
 from services.project_service import ProjectService
 from services.testcase_service import TestCaseService
 from services.test_execution_service import TestExecutionService
 from services.version_service import VersionService
+from services.rollup_service import RollupService, rollup_service
 
 def get_project_service() -> ProjectService:
     """获取项目服务实例"""
@@ -24,4 +36,8 @@ def get_test_execution_service() -> TestExecutionService:
 
 def get_version_service() -> VersionService:
     """获取版本管理服务实例"""
-    return VersionService()
\ No newline at end of file
+    return VersionService()
+
+def get_rollup_service() -> RollupService:
+    """获取测试结果汇总服务实例"""
+    return rollup_service
@@ -3,9 +3,12 @@ AI相关API路由
 提供AI能力的RESTful接口
 """
 
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, UploadFile, File, Form
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, UploadFile, File, Form, Header, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Dict, Any, List, Optional
+import json
+import asyncio
 import logging
 
 from services.ai.ai_service import ai_service
@@ -25,18 +28,26 @@ class TestCaseGenerationRequest(BaseModel):
     type: str = Field("functional", description="需求类型")
     acceptance_criteria: str = Field("", description="验收标准")
     business_value: str = Field("", description="业务价值")
-    provider: str = Field("glm", description="AI提供商")
+    provider: str = Field("glm", description="AI提供商，auto表示按近期表现自动选择")
     use_rag: bool = Field(True, description="是否使用RAG增强")
 
+class CompletionStreamRequest(BaseModel):
+    """流式文本生成请求"""
+    prompt: str = Field(..., description="提示词")
+    provider: str = Field("glm", description="AI提供商，auto表示按近期表现自动选择")
+    model: Optional[str] = Field(None, description="模型名称")
+    temperature: float = Field(0.7, description="采样温度")
+    max_tokens: int = Field(2000, description="最大生成token数")
+
 class TestAnalysisRequest(BaseModel):
     """测试结果分析请求"""
     test_results: List[Dict[str, Any]] = Field(..., description="测试结果列表")
-    provider: str = Field("glm", description="AI提供商")
+    provider: str = Field("glm", description="AI提供商，auto表示按近期表现自动选择")
 
 class TestReportRequest(BaseModel):
     """测试报告生成请求"""
     execution_data: Dict[str, Any] = Field(..., description="执行数据")
-    provider: str = Field("glm", description="AI提供商")
+    provider: str = Field("glm", description="AI提供商，auto表示按近期表现自动选择")
 
 class KnowledgeDocumentRequest(BaseModel):
     """知识文档添加请求"""
@@ -76,6 +87,24 @@ class APIResponse(BaseModel):
     data: Optional[Dict[str, Any]] = None
     error: Optional[str] = None
 
+# Server-Sent Events响应头
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no"
+}
+
+def format_sse(event: Optional[Dict[str, Any]]) -> str:
+    """格式化为SSE消息，None表示心跳"""
+    if event is None:
+        return ": keep-alive\n\n"
+    
+    lines = []
+    if event.get('id'):
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['type']}")
+    lines.append(f"data: {json.dumps(event, ensure_ascii=False, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
 @router.post("/generate-test-case", response_model=APIResponse)
 async def generate_test_case(
     request: TestCaseGenerationRequest,
@@ -114,6 +143,71 @@ async def generate_test_case(
         logger.error(f"生成测试用例API错误: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/generate-test-case/stream")
+async def stream_generate_test_case(
+    request: TestCaseGenerationRequest,
+    current_user: Dict = Depends(get_current_user)
+):
+    """以SSE流式生成测试用例（context/delta/done事件）"""
+    requirement_data = {
+        'title': request.title,
+        'description': request.description,
+        'priority': request.priority,
+        'type': request.type,
+        'acceptance_criteria': request.acceptance_criteria,
+        'business_value': request.business_value
+    }
+    
+    async def event_generator():
+        try:
+            async for event in ai_service.stream_test_case_from_requirement(
+                requirement_data=requirement_data,
+                provider=request.provider,
+                use_rag=request.use_rag
+            ):
+                yield format_sse(event)
+        except Exception as e:
+            logger.error(f"流式生成测试用例API错误: {e}")
+            yield format_sse({'type': 'error', 'data': {'error': str(e)}})
+    
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+@router.post("/completion/stream")
+async def stream_completion(
+    request: CompletionStreamRequest,
+    current_user: Dict = Depends(get_current_user)
+):
+    """以SSE流式返回大模型生成的文本（delta/done事件）"""
+    from services.ai.llm_client import llm_client
+    
+    params = {'temperature': request.temperature, 'max_tokens': request.max_tokens}
+    if request.model:
+        params['model'] = request.model
+    
+    async def event_generator():
+        try:
+            async for chunk in llm_client.stream_text_completion(
+                prompt=request.prompt,
+                provider=request.provider,
+                endpoint='completion_stream',
+                **params
+            ):
+                yield format_sse({'type': 'delta', 'data': {'content': chunk}})
+            yield format_sse({'type': 'done', 'data': {'success': True, 'provider': request.provider}})
+        except Exception as e:
+            logger.error(f"流式生成API错误: {e}")
+            yield format_sse({'type': 'error', 'data': {'error': str(e)}})
+    
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
 @router.post("/analyze-test-results", response_model=APIResponse)
 async def analyze_test_results(
     request: TestAnalysisRequest,
@@ -330,7 +424,7 @@ async def get_workflow_status(
 ):
     """获取工作流执行状态"""
     try:
-        result = ai_service.get_workflow_status(execution_id)
+        result = await asyncio.to_thread(ai_service.get_workflow_status, execution_id)
         
         if 'error' not in result:
             return APIResponse(
@@ -350,11 +444,65 @@ async def get_workflow_status(
         logger.error(f"获取工作流状态API错误: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/workflow/events/{execution_id}")
+async def stream_workflow_events(
+    execution_id: str,
+    last_event_id: Optional[int] = Query(None, description="从该事件ID之后继续推送"),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    current_user: Dict = Depends(get_current_user)
+):
+    """以SSE推送工作流执行事件（node_started/node_finished/variable_set等）"""
+    resume_from = last_event_id
+    if resume_from is None and last_event_id_header and last_event_id_header.isdigit():
+        resume_from = int(last_event_id_header)
+    
+    async def event_generator():
+        try:
+            async for event in ai_service.stream_workflow_events(execution_id, resume_from):
+                yield format_sse(event)
+        except Exception as e:
+            logger.error(f"工作流事件流错误: {e}")
+            yield format_sse({'type': 'error', 'execution_id': execution_id, 'data': {'error': str(e)}})
+    
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+@router.get("/workflow/status/{execution_id}/variables/{key}", response_model=APIResponse)
+async def get_workflow_variable(
+    execution_id: str,
+    key: str,
+    current_user: Dict = Depends(get_current_user)
+):
+    """获取工作流执行变量（含单独存储的大变量）"""
+    try:
+        result = await asyncio.to_thread(ai_service.get_workflow_variable, execution_id, key)
+        
+        if 'error' not in result:
+            return APIResponse(
+                success=True,
+                message="获取变量成功",
+                data=result
+            )
+        else:
+            raise HTTPException(
+                status_code=404,
+                detail=result.get('error')
+            )
+            
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"获取工作流变量API错误: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/status", response_model=APIResponse)
 async def get_ai_status(current_user: Dict = Depends(get_current_user)):
     """获取AI服务状态"""
     try:
-        result = ai_service.get_ai_status()
+        result = await asyncio.to_thread(ai_service.get_ai_status)
         
         if result.get('success'):
             return APIResponse(
@@ -390,12 +538,44 @@ async def get_available_providers(current_user: Dict = Depends(get_current_user)
         logger.error(f"获取提供商API错误: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/llm/metrics", response_model=APIResponse)
+async def get_llm_metrics(current_user: Dict = Depends(get_current_user)):
+    """获取大模型客户端指标（缓存命中率等）"""
+    try:
+        from services.ai.llm_client import llm_client
+        
+        return APIResponse(
+            success=True,
+            message="获取大模型指标成功",
+            data=llm_client.get_metrics()
+        )
+        
+    except Exception as e:
+        logger.error(f"获取大模型指标API错误: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.delete("/llm/cache", response_model=APIResponse)
+async def clear_llm_cache(current_user: Dict = Depends(get_current_user)):
+    """清空大模型响应缓存"""
+    try:
+        from services.ai.llm_client import llm_client
+        llm_client.cache.clear()
+        
+        return APIResponse(
+            success=True,
+            message="大模型响应缓存已清空"
+        )
+        
+    except Exception as e:
+        logger.error(f"清空大模型缓存API错误: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/knowledge/list", response_model=APIResponse)
 async def get_knowledge_list(current_user: Dict = Depends(get_current_user)):
     """获取知识库文档列表"""
     try:
         from services.ai.rag_engine import rag_engine
-        documents = rag_engine.get_all_documents()
+        documents = await asyncio.to_thread(rag_engine.get_all_documents)
         
         return APIResponse(
             success=True,
@@ -415,7 +595,7 @@ async def delete_knowledge_document(
     """删除知识库文档"""
     try:
         from services.ai.rag_engine import rag_engine
-        result = rag_engine.delete_document(document_id)
+        result = await asyncio.to_thread(rag_engine.delete_document, document_id)
         
         if result.get('success'):
             return APIResponse(
@@ -444,7 +624,8 @@ async def update_knowledge_links(
     """更新知识文档关联关系"""
     try:
         from services.ai.rag_engine import rag_engine
-        result = rag_engine.update_document_links(
+        result = await asyncio.to_thread(
+            rag_engine.update_document_links,
             document_id=document_id,
             requirement_ids=request.requirement_ids,
             testcase_ids=request.testcase_ids
@@ -468,7 +649,7 @@ async def get_knowledge_categories(current_user: Dict = Depends(get_current_user
     """获取知识库分类"""
     try:
         from services.ai.rag_engine import rag_engine
-        categories = rag_engine.get_categories()
+        categories = await asyncio.to_thread(rag_engine.get_categories)
         
         return APIResponse(
             success=True,
@@ -485,7 +666,7 @@ async def get_workflows(current_user: Dict = Depends(get_current_user)):
     """获取所有工作流"""
     try:
         from services.ai.workflow_engine import workflow_engine
-        workflows = workflow_engine.get_workflows()
+        workflows = await asyncio.to_thread(workflow_engine.get_workflows)
         
         return APIResponse(
             success=True,
@@ -1,7 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-from api.deps import get_database, get_project_service
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from api.deps import get_database, get_project_service, get_rollup_service, require_system_token
 from schemas.response_schemas import ProjectCreate, ProjectResponse
 from models.database_models import Project
 
@@ -11,30 +11,30 @@ router = APIRouter()
 @router.post("/projects", response_model=ProjectResponse)
 async def create_project(
     project: ProjectCreate,
-    db: Session = Depends(get_database),
+    db: AsyncSession = Depends(get_database),
     project_service = Depends(get_project_service)
 ):
     """创建测试项目"""
-    return project_service.create_project(db, project)
+    return await project_service.create_project(db, project)
 
 
 @router.get("/projects", response_model=List[ProjectResponse])
 async def get_projects(
-    db: Session = Depends(get_database),
+    db: AsyncSession = Depends(get_database),
     project_service = Depends(get_project_service)
 ):
     """获取所有测试项目"""
-    return project_service.get_projects(db)
+    return await project_service.get_projects(db)
 
 
 @router.get("/projects/{project_id}", response_model=ProjectResponse)
 async def get_project(
     project_id: int,
-    db: Session = Depends(get_database),
+    db: AsyncSession = Depends(get_database),
     project_service = Depends(get_project_service)
 ):
     """获取指定项目"""
-    project = project_service.get_project(db, project_id)
+    project = await project_service.get_project(db, project_id)
     if not project:
         raise HTTPException(status_code=404, detail="项目不存在")
     return project
@@ -44,11 +44,11 @@ async def get_project(
 async def update_project(
     project_id: int,
     project_update: dict,
-    db: Session = Depends(get_database),
+    db: AsyncSession = Depends(get_database),
     project_service = Depends(get_project_service)
 ):
     """更新项目信息"""
-    project = project_service.update_project(db, project_id, project_update)
+    project = await project_service.update_project(db, project_id, project_update)
     if not project:
         raise HTTPException(status_code=404, detail="项目不存在")
     return project
@@ -57,11 +57,11 @@ async def update_project(
 @router.delete("/projects/{project_id}")
 async def delete_project(
     project_id: int,
-    db: Session = Depends(get_database),
+    db: AsyncSession = Depends(get_database),
     project_service = Depends(get_project_service)
 ):
     """删除项目"""
-    success = project_service.delete_project(db, project_id)
+    success = await project_service.delete_project(db, project_id)
     if not success:
         raise HTTPException(status_code=404, detail="项目不存在")
     return {"message": "项目删除成功"}
@@ -70,11 +70,36 @@ async def delete_project(
 @router.get("/projects/{project_id}/statistics")
 async def get_project_statistics(
     project_id: int,
-    db: Session = Depends(get_database),
+    percentiles: bool = False,
+    db: AsyncSession = Depends(get_database),
     project_service = Depends(get_project_service)
 ):
-    """获取项目统计信息"""
-    statistics = project_service.get_project_statistics(db, project_id)
+    """获取项目统计信息，percentiles=true 时附带执行耗时分位数"""
+    statistics = await project_service.get_project_statistics(db, project_id, percentiles)
     if not statistics:
         raise HTTPException(status_code=404, detail="项目不存在")
-    return statistics
\ No newline at end of file
+    return statistics
+
+
+@router.get("/projects/{project_id}/trends")
+async def get_project_trends(
+    project_id: int,
+    granularity: str = Query("day", pattern="^(hour|day)$", description="汇总粒度: hour/day"),
+    days: int = Query(30, ge=1, le=730, description="统计最近的天数"),
+    testcase_id: Optional[int] = Query(None, description="只统计指定用例"),
+    db: AsyncSession = Depends(get_database),
+    rollup_service = Depends(get_rollup_service)
+):
+    """获取项目测试结果趋势（读取增量维护的汇总表，不扫描原始结果）"""
+    return await rollup_service.get_trends(db, project_id, granularity, days, testcase_id)
+
+
+@router.post("/projects/{project_id}/trends/rebuild", dependencies=[Depends(require_system_token)])
+async def rebuild_project_trends(
+    project_id: int,
+    db: AsyncSession = Depends(get_database),
+    rollup_service = Depends(get_rollup_service)
+):
+    """根据原始测试结果重建项目的汇总数据（回填历史数据）"""
+    processed = await rollup_service.rebuild(db, project_id)
+    return {"message": "汇总数据重建完成", "processed_results": processed}
@@ -1,7 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from core.database import get_db
+from core.database import get_async_db
 from models.database_models import Requirement, Project
 from pydantic import BaseModel
 from datetime import datetime
@@ -51,25 +52,25 @@ async def get_requirements(
     priority: Optional[str] = None,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取需求列表"""
-    query = db.query(Requirement)
+    query = select(Requirement)
     
     if project_id:
-        query = query.filter(Requirement.project_id == project_id)
+        query = query.where(Requirement.project_id == project_id)
     if status:
-        query = query.filter(Requirement.status == status)
+        query = query.where(Requirement.status == status)
     if priority:
-        query = query.filter(Requirement.priority == priority)
+        query = query.where(Requirement.priority == priority)
     
-    requirements = query.offset(skip).limit(limit).all()
+    requirements = (await db.scalars(query.offset(skip).limit(limit))).all()
     return requirements
 
 @router.get("/requirements/{requirement_id}", response_model=RequirementResponse)
-async def get_requirement(requirement_id: int, db: Session = Depends(get_db)):
+async def get_requirement(requirement_id: int, db: AsyncSession = Depends(get_async_db)):
     """获取单个需求详情"""
-    requirement = db.query(Requirement).filter(Requirement.id == requirement_id).first()
+    requirement = await db.get(Requirement, requirement_id)
     if not requirement:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -80,11 +81,11 @@ async def get_requirement(requirement_id: int, db: Session = Depends(get_db)):
 @router.post("/requirements", response_model=RequirementResponse)
 async def create_requirement(
     requirement: RequirementCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """创建新需求"""
     # 验证项目是否存在
-    project = db.query(Project).filter(Project.id == requirement.project_id).first()
+    project = await db.get(Project, requirement.project_id)
     if not project:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -93,18 +94,18 @@ async def create_requirement(
     
     db_requirement = Requirement(**requirement.dict())
     db.add(db_requirement)
-    db.commit()
-    db.refresh(db_requirement)
+    await db.commit()
+    await db.refresh(db_requirement)
     return db_requirement
 
 @router.put("/requirements/{requirement_id}", response_model=RequirementResponse)
 async def update_requirement(
     requirement_id: int,
     requirement_update: RequirementUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """更新需求"""
-    db_requirement = db.query(Requirement).filter(Requirement.id == requirement_id).first()
+    db_requirement = await db.get(Requirement, requirement_id)
     if not db_requirement:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -113,7 +114,7 @@ async def update_requirement(
     
     # 验证项目是否存在
     if requirement_update.project_id:
-        project = db.query(Project).filter(Project.id == requirement_update.project_id).first()
+        project = await db.get(Project, requirement_update.project_id)
         if not project:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -125,14 +126,14 @@ async def update_requirement(
         setattr(db_requirement, field, value)
     
     db_requirement.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(db_requirement)
+    await db.commit()
+    await db.refresh(db_requirement)
     return db_requirement
 
 @router.delete("/requirements/{requirement_id}")
-async def delete_requirement(requirement_id: int, db: Session = Depends(get_db)):
+async def delete_requirement(requirement_id: int, db: AsyncSession = Depends(get_async_db)):
     """删除需求"""
-    db_requirement = db.query(Requirement).filter(Requirement.id == requirement_id).first()
+    db_requirement = await db.get(Requirement, requirement_id)
     if not db_requirement:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -142,14 +143,14 @@ async def delete_requirement(requirement_id: int, db: Session = Depends(get_db))
     try:
         # 先删除与版本的关联关系
         from models.database_models import VersionRequirement
-        db.query(VersionRequirement).filter(VersionRequirement.requirement_id == requirement_id).delete()
+        await db.execute(delete(VersionRequirement).where(VersionRequirement.requirement_id == requirement_id))
         
         # 删除需求
-        db.delete(db_requirement)
-        db.commit()
+        await db.delete(db_requirement)
+        await db.commit()
         return {"message": "需求删除成功"}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"删除需求失败: {str(e)}"
@@ -158,28 +159,28 @@ async def delete_requirement(requirement_id: int, db: Session = Depends(get_db))
 @router.get("/projects/{project_id}/requirements", response_model=List[RequirementResponse])
 async def get_project_requirements(
     project_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取项目的所有需求"""
     # 验证项目是否存在
-    project = db.query(Project).filter(Project.id == project_id).first()
+    project = await db.get(Project, project_id)
     if not project:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="项目不存在"
         )
     
-    requirements = db.query(Requirement).filter(Requirement.project_id == project_id).all()
+    requirements = (await db.scalars(select(Requirement).where(Requirement.project_id == project_id))).all()
     return requirements
 
 @router.post("/requirements/{requirement_id}/comments")
 async def add_requirement_comment(
     requirement_id: int,
     comment: dict,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """添加需求评论"""
-    db_requirement = db.query(Requirement).filter(Requirement.id == requirement_id).first()
+    db_requirement = await db.get(Requirement, requirement_id)
     if not db_requirement:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -199,7 +200,7 @@ async def add_requirement_comment(
     
     db_requirement.comments.append(comment_data)
     db_requirement.updated_at = datetime.utcnow()
-    db.commit()
+    await db.commit()
     
     return {"message": "评论添加成功", "comment": comment_data}
 
@@ -207,10 +208,10 @@ async def add_requirement_comment(
 async def link_testcases_to_requirement(
     requirement_id: int,
     link_data: dict,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """关联测试用例到需求"""
-    db_requirement = db.query(Requirement).filter(Requirement.id == requirement_id).first()
+    db_requirement = await db.get(Requirement, requirement_id)
     if not db_requirement:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -226,6 +227,6 @@ async def link_testcases_to_requirement(
         db_requirement.linked_test_cases = link_data["test_cases"]
     
     db_requirement.updated_at = datetime.utcnow()
-    db.commit()
+    await db.commit()
     
     return {"message": "测试用例关联成功"}
\ No newline at end of file
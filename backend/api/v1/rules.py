@@ -1,8 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from typing import List, Optional
 from pydantic import BaseModel
-from api.deps import get_db
+from api.deps import get_database
 from models.database_models import RuleTemplate, RuleDefinition, AssertionRule
 from services.rule_engine_service import RuleEngineService
 from datetime import datetime
@@ -51,22 +53,22 @@ class GenerateTestCasesRequest(BaseModel):
 
 
 @router.get("/templates")
-def get_rule_templates(
+async def get_rule_templates(
     protocol: Optional[str] = None,
     category: Optional[str] = None,
     is_enabled: Optional[bool] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_database)
 ):
-    query = db.query(RuleTemplate)
+    query = select(RuleTemplate).options(selectinload(RuleTemplate.rule_definitions))
     
     if protocol:
-        query = query.filter(RuleTemplate.protocol == protocol)
+        query = query.where(RuleTemplate.protocol == protocol)
     if category:
-        query = query.filter(RuleTemplate.category == category)
+        query = query.where(RuleTemplate.category == category)
     if is_enabled is not None:
-        query = query.filter(RuleTemplate.is_enabled == is_enabled)
+        query = query.where(RuleTemplate.is_enabled == is_enabled)
     
-    templates = query.order_by(RuleTemplate.priority.desc()).all()
+    templates = (await db.scalars(query.order_by(RuleTemplate.priority.desc()))).all()
     
     result = []
     for template in templates:
@@ -87,8 +89,8 @@ def get_rule_templates(
 
 
 @router.get("/templates/{template_id}")
-def get_rule_template(template_id: int, db: Session = Depends(get_db)):
-    template = db.query(RuleTemplate).filter(RuleTemplate.id == template_id).first()
+async def get_rule_template(template_id: int, db: AsyncSession = Depends(get_database)):
+    template = await RuleEngineService(db).get_rule_template_with_details(template_id)
     
     if not template:
         raise HTTPException(status_code=404, detail="规则模板不存在")
@@ -132,9 +134,9 @@ def get_rule_template(template_id: int, db: Session = Depends(get_db)):
 
 
 @router.post("/templates")
-def create_rule_template(
+async def create_rule_template(
     template_data: RuleTemplateCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_database)
 ):
     template = RuleTemplate(
         name=template_data.name,
@@ -146,7 +148,7 @@ def create_rule_template(
     )
     
     db.add(template)
-    db.flush()
+    await db.flush()
     
     for rule_def_data in template_data.rule_definitions:
         rule_def = RuleDefinition(
@@ -157,7 +159,7 @@ def create_rule_template(
             is_required=rule_def_data.is_required
         )
         db.add(rule_def)
-        db.flush()
+        await db.flush()
         
         for assertion_data in rule_def_data.assertions:
             assertion = AssertionRule(
@@ -170,8 +172,7 @@ def create_rule_template(
             )
             db.add(assertion)
     
-    db.commit()
-    db.refresh(template)
+    await db.commit()
     
     return {
         "success": True,
@@ -181,12 +182,12 @@ def create_rule_template(
 
 
 @router.put("/templates/{template_id}")
-def update_rule_template(
+async def update_rule_template(
     template_id: int,
     template_data: RuleTemplateUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_database)
 ):
-    template = db.query(RuleTemplate).filter(RuleTemplate.id == template_id).first()
+    template = await db.get(RuleTemplate, template_id)
     
     if not template:
         raise HTTPException(status_code=404, detail="规则模板不存在")
@@ -206,33 +207,33 @@ def update_rule_template(
     
     template.updated_at = datetime.utcnow()
     
-    db.commit()
+    await db.commit()
     
     return {"success": True, "message": "规则模板更新成功"}
 
 
 @router.delete("/templates/{template_id}")
-def delete_rule_template(template_id: int, db: Session = Depends(get_db)):
-    template = db.query(RuleTemplate).filter(RuleTemplate.id == template_id).first()
+async def delete_rule_template(template_id: int, db: AsyncSession = Depends(get_database)):
+    template = await db.get(RuleTemplate, template_id)
     
     if not template:
         raise HTTPException(status_code=404, detail="规则模板不存在")
     
-    db.delete(template)
-    db.commit()
+    await db.delete(template)
+    await db.commit()
     
     return {"success": True, "message": "规则模板删除成功"}
 
 
 @router.post("/generate-testcases")
-def generate_testcases(
+async def generate_testcases(
     request: GenerateTestCasesRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_database)
 ):
     rule_engine = RuleEngineService(db)
     
     try:
-        testcases = rule_engine.generate_testcases_by_rules(
+        testcases = await rule_engine.generate_testcases_by_rules(
             request.api_info,
             request.rule_template_ids
         )
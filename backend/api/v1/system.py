@@ -0,0 +1,47 @@
+from fastapi import APIRouter, Depends, Query
+from api.deps import require_system_token
+from core.query_stats import query_stats
+from core.database import get_pool_stats
+from services.result_writer import result_writer
+from services.result_retention import result_retention
+
+# 运维接口统一校验访问令牌
+router = APIRouter(dependencies=[Depends(require_system_token)])
+
+
+@router.get("/system/query-stats")
+async def get_query_stats(
+    limit: int = Query(20, ge=1, le=200, description="返回的语句数"),
+    order_by: str = Query("total_ms", description="排序指标: total_ms/count/max_ms/p95_ms")
+):
+    """获取SQL语句耗时统计（按语句指纹聚合的前N条）和最近的慢查询"""
+    return {
+        **query_stats.get_summary(),
+        "statements": query_stats.top(limit, order_by),
+        "recent_slow_queries": query_stats.slow_queries(limit)
+    }
+
+
+@router.delete("/system/query-stats")
+async def reset_query_stats():
+    """清空SQL语句耗时统计"""
+    query_stats.reset()
+    return {"message": "SQL统计已清空"}
+
+
+@router.get("/system/pool-stats")
+async def get_database_pool_stats():
+    """获取同步和异步连接池的使用情况（已借出/溢出连接数、获取连接的等待时间）、容量和各子系统配额"""
+    return get_pool_stats()
+
+
+@router.get("/system/result-writer")
+async def get_result_writer_stats():
+    """获取测试结果缓冲写入器的状态（待写入条数、已写入/失败条数、每批写入耗时）"""
+    return result_writer.get_stats()
+
+
+@router.get("/system/test-results/archives")
+async def list_test_result_archives():
+    """列出测试结果归档文件（按月）"""
+    return result_retention.list_archives()
@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from api.deps import get_database, get_testcase_service
 from schemas.response_schemas import TestCaseCreate, TestCaseResponse
@@ -12,40 +12,40 @@ router = APIRouter()
 async def create_testcase(
     project_id: int,
     testcase: TestCaseCreate,
-    db: Session = Depends(get_database),
+    db: AsyncSession = Depends(get_database),
     testcase_service = Depends(get_testcase_service)
 ):
     """创建测试用例"""
-    return testcase_service.create_testcase(db, project_id, testcase)
+    return await testcase_service.create_testcase(db, project_id, testcase)
 
 
 @router.get("/projects/{project_id}/testcases", response_model=List[TestCaseResponse])
 async def get_testcases(
     project_id: int,
-    db: Session = Depends(get_database),
+    db: AsyncSession = Depends(get_database),
     testcase_service = Depends(get_testcase_service)
 ):
     """获取项目的测试用例"""
-    return testcase_service.get_testcases(db, project_id)
+    return await testcase_service.get_testcases(db, project_id)
 
 
 @router.get("/testcases", response_model=List[TestCaseResponse])
 async def get_all_testcases(
-    db: Session = Depends(get_database),
+    db: AsyncSession = Depends(get_database),
     testcase_service = Depends(get_testcase_service)
 ):
     """获取所有测试用例"""
-    return testcase_service.get_all_testcases(db)
+    return await testcase_service.get_all_testcases(db)
 
 
 @router.get("/testcases/{testcase_id}", response_model=TestCaseResponse)
 async def get_testcase(
     testcase_id: int,
-    db: Session = Depends(get_database),
+    db: AsyncSession = Depends(get_database),
     testcase_service = Depends(get_testcase_service)
 ):
     """获取指定测试用例"""
-    testcase = testcase_service.get_testcase(db, testcase_id)
+    testcase = await testcase_service.get_testcase(db, testcase_id)
     if not testcase:
         raise HTTPException(status_code=404, detail="测试用例不存在")
     return testcase
@@ -55,11 +55,11 @@ async def get_testcase(
 async def update_testcase(
     testcase_id: int,
     testcase_update: dict,
-    db: Session = Depends(get_database),
+    db: AsyncSession = Depends(get_database),
     testcase_service = Depends(get_testcase_service)
 ):
     """更新测试用例"""
-    testcase = testcase_service.update_testcase(db, testcase_id, testcase_update)
+    testcase = await testcase_service.update_testcase(db, testcase_id, testcase_update)
     if not testcase:
         raise HTTPException(status_code=404, detail="测试用例不存在")
     return testcase
@@ -68,11 +68,11 @@ async def update_testcase(
 @router.delete("/testcases/{testcase_id}")
 async def delete_testcase(
     testcase_id: int,
-    db: Session = Depends(get_database),
+    db: AsyncSession = Depends(get_database),
     testcase_service = Depends(get_testcase_service)
 ):
     """删除测试用例"""
-    success = testcase_service.delete_testcase(db, testcase_id)
+    success = await testcase_service.delete_testcase(db, testcase_id)
     if not success:
         raise HTTPException(status_code=404, detail="测试用例不存在")
     return {"message": "测试用例删除成功"}
@@ -82,19 +82,32 @@ async def delete_testcase(
 async def get_testcases_by_protocol(
     project_id: int,
     protocol: str,
-    db: Session = Depends(get_database),
+    db: AsyncSession = Depends(get_database),
     testcase_service = Depends(get_testcase_service)
 ):
     """根据协议类型获取测试用例"""
-    return testcase_service.get_testcases_by_protocol(db, project_id, protocol)
+    return await testcase_service.get_testcases_by_protocol(db, project_id, protocol)
 
 
 @router.get("/testcases/{testcase_id}/results")
 async def get_testcase_results(
     testcase_id: int,
     limit: int = 10,
-    db: Session = Depends(get_database),
+    db: AsyncSession = Depends(get_database),
     testcase_service = Depends(get_testcase_service)
 ):
     """获取测试用例的执行历史"""
-    return testcase_service.get_test_results(db, testcase_id, limit)
+    return await testcase_service.get_test_results(db, testcase_id, limit)
+
+
+@router.get("/results/{result_id}/response")
+async def get_test_result_response(
+    result_id: int,
+    db: AsyncSession = Depends(get_database),
+    testcase_service = Depends(get_testcase_service)
+):
+    """获取测试结果的完整响应内容（执行历史中只返回大响应的摘要和预览）"""
+    response = await testcase_service.get_test_result_response(db, result_id)
+    if response is None:
+        raise HTTPException(status_code=404, detail="测试结果不存在")
+    return response
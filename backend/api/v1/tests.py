@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from api.deps import get_database, get_test_execution_service
 from schemas.response_schemas import (
     HttpTestRequest, HttpTestResponse,
@@ -54,7 +54,7 @@ async def test_mq_interface(
 async def execute_batch_test(
     batch_request: BatchTestRequest,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_database),
+    db: AsyncSession = Depends(get_database),
     test_execution_service = Depends(get_test_execution_service)
 ):
     """执行批量测试"""
@@ -68,7 +68,7 @@ async def execute_batch_test(
 @router.get("/test/batch/{task_id}")
 async def get_batch_test_status(
     task_id: str,
-    db: Session = Depends(get_database),
+    db: AsyncSession = Depends(get_database),
     test_execution_service = Depends(get_test_execution_service)
 ):
     """获取批量测试任务状态"""
@@ -84,11 +84,11 @@ async def get_batch_test_status(
 @router.get("/reports/{report_id}")
 async def get_test_report(
     report_id: int,
-    db: Session = Depends(get_database),
+    db: AsyncSession = Depends(get_database),
     test_execution_service = Depends(get_test_execution_service)
 ):
     """获取测试报告"""
-    report = test_execution_service.get_test_report(db, report_id)
+    report = await test_execution_service.get_test_report(db, report_id)
     if not report:
         raise HTTPException(status_code=404, detail="报告不存在")
     return report
@@ -98,12 +98,14 @@ async def get_test_report(
 async def generate_test_report(
     project_id: int,
     version_id: int = None,
-    db: Session = Depends(get_database),
+    percentiles: bool = False,
+    include_archived: bool = False,
+    db: AsyncSession = Depends(get_database),
     test_execution_service = Depends(get_test_execution_service)
 ):
-    """生成测试报告"""
+    """生成测试报告，percentiles=true 时在摘要中附带执行耗时分位数，include_archived=true 时包含已归档的结果"""
     try:
-        report = await test_execution_service.generate_test_report(db, project_id, version_id)
+        report = await test_execution_service.generate_test_report(db, project_id, version_id, percentiles, include_archived)
         return {"report_id": report.id, "message": "测试报告生成成功"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
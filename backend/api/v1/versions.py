@@ -1,11 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import sessionmaker, Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import select, delete, func, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from typing import List, Optional
-from core.database import get_db
+from core.database import get_async_db
 from models.database_models import Version, Requirement, VersionRequirement
 from pydantic import BaseModel
 from datetime import datetime
-from services.ai_generator import ai_generator
+import base64
+import json
+from services.ai.batch_generator import batch_generator
 
 router = APIRouter()
 
@@ -33,41 +37,96 @@ class VersionResponse(VersionBase):
 @router.post("/versions", response_model=VersionResponse)
 async def create_version(
     version: VersionCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """创建版本记录"""
     try:
         db_version = Version(**version.dict())
         db.add(db_version)
-        db.commit()
-        db.refresh(db_version)
+        await db.commit()
+        await db.refresh(db_version)
         return db_version
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"创建版本失败: {str(e)}"
         )
 
+def _encode_cursor(version: Version) -> str:
+    """以 (created_at, id) 作为游标，保证排序稳定"""
+    payload = json.dumps([version.created_at.isoformat() if version.created_at else None, version.id])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+def _decode_cursor(cursor: str):
+    try:
+        created_at, version_id = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        return (datetime.fromisoformat(created_at) if created_at else None), int(version_id)
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="无效的分页游标")
+
+def _requirement_dict(req: Requirement) -> dict:
+    return {
+        "id": req.id,
+        "title": req.title,
+        "description": req.description,
+        "priority": req.priority,
+        "status": req.status,
+        "type": req.type,
+        "project_id": req.project_id,
+        "assigned_to": req.assigned_to,
+        "reporter": req.reporter,
+        "created_at": req.created_at.isoformat() if req.created_at else None
+    }
+
 @router.get("/versions")
 async def get_versions(
-    db: Session = Depends(get_db)
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=200, description="每页数量，不传则返回全部"),
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 中的游标"),
+    summary: bool = Query(False, description="摘要模式：只返回需求数量，不返回需求详情"),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """获取版本历史"""
+    """获取版本历史
+    
+    按创建时间倒序返回，传入 limit 时分页，还有下一页时通过响应头 X-Next-Cursor 返回游标。
+    """
     try:
-        versions = db.query(Version).order_by(Version.created_at.desc()).all()
+        query = select(Version).order_by(Version.created_at.desc(), Version.id.desc())
+        if cursor:
+            created_at, version_id = _decode_cursor(cursor)
+            if created_at is None:
+                query = query.where(Version.created_at.is_(None), Version.id < version_id)
+            else:
+                query = query.where(or_(
+                    Version.created_at < created_at,
+                    and_(Version.created_at == created_at, Version.id < version_id),
+                    Version.created_at.is_(None)
+                ))
+        if limit:
+            # 多取一条用于判断是否还有下一页
+            query = query.limit(limit + 1)
+        
+        if not summary:
+            # 一次预加载所有版本的需求关联和需求，避免逐个版本查询
+            query = query.options(selectinload(Version.requirements).selectinload(VersionRequirement.requirement))
+        rows = (await db.scalars(query)).all()
+        
+        versions = rows[:limit] if limit else rows
+        if limit and len(rows) > limit:
+            response.headers["X-Next-Cursor"] = _encode_cursor(versions[-1])
+        
+        requirement_counts = {}
+        if summary and versions:
+            count_rows = await db.execute(
+                select(VersionRequirement.version_id, func.count(VersionRequirement.id))
+                .where(VersionRequirement.version_id.in_([version.id for version in versions]))
+                .group_by(VersionRequirement.version_id)
+            )
+            requirement_counts = dict(count_rows.all())
         
-        # 为每个版本添加关联的需求信息
         result = []
         for version in versions:
-            # 获取关联的需求
-            version_requirements = db.query(VersionRequirement).filter(
-                VersionRequirement.version_id == version.id
-            ).all()
-            
-            requirement_ids = [vr.requirement_id for vr in version_requirements]
-            requirements = db.query(Requirement).filter(Requirement.id.in_(requirement_ids)).all()
-            
             # 构建版本数据
             version_dict = {
                 "id": version.id,
@@ -77,36 +136,29 @@ async def get_versions(
                 "release_date": version.release_date.isoformat() if version.release_date else None,
                 "created_at": version.created_at.isoformat() if version.created_at else None,
                 "created_by": version.created_by,
-                "changes": version.changes,
-                "requirements": [
-                    {
-                        "id": req.id,
-                        "title": req.title,
-                        "description": req.description,
-                        "priority": req.priority,
-                        "status": req.status,
-                        "type": req.type,
-                        "project_id": req.project_id,
-                        "assigned_to": req.assigned_to,
-                        "reporter": req.reporter,
-                        "created_at": req.created_at.isoformat() if req.created_at else None
-                    }
-                    for req in requirements
-                ]
+                "changes": version.changes
             }
+            if summary:
+                version_dict["requirement_count"] = requirement_counts.get(version.id, 0)
+            else:
+                version_dict["requirements"] = [
+                    _requirement_dict(vr.requirement) for vr in version.requirements if vr.requirement is not None
+                ]
             result.append(version_dict)
         
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取版本列表失败: {str(e)}")
 
 @router.get("/versions/{version_id}", response_model=VersionResponse)
 async def get_version(
     version_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取指定版本"""
-    version = db.query(Version).filter(Version.id == version_id).first()
+    version = await db.get(Version, version_id)
     if not version:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -118,10 +170,10 @@ async def get_version(
 async def update_version(
     version_id: int,
     version_update: dict,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """更新版本信息"""
-    version = db.query(Version).filter(Version.id == version_id).first()
+    version = await db.get(Version, version_id)
     if not version:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -132,11 +184,11 @@ async def update_version(
         for field, value in version_update.items():
             if hasattr(version, field):
                 setattr(version, field, value)
-        db.commit()
-        db.refresh(version)
+        await db.commit()
+        await db.refresh(version)
         return version
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"更新版本失败: {str(e)}"
@@ -145,10 +197,10 @@ async def update_version(
 @router.delete("/versions/{version_id}")
 async def delete_version(
     version_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """删除版本"""
-    version = db.query(Version).filter(Version.id == version_id).first()
+    version = await db.get(Version, version_id)
     if not version:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -157,14 +209,14 @@ async def delete_version(
     
     try:
         # 先删除与需求的关联关系
-        db.query(VersionRequirement).filter(VersionRequirement.version_id == version_id).delete()
+        await db.execute(delete(VersionRequirement).where(VersionRequirement.version_id == version_id))
         
         # 删除版本
-        db.delete(version)
-        db.commit()
+        await db.delete(version)
+        await db.commit()
         return {"message": "版本删除成功"}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"删除版本失败: {str(e)}"
@@ -172,10 +224,10 @@ async def delete_version(
 
 @router.get("/versions/latest", response_model=VersionResponse)
 async def get_latest_version(
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取最新版本"""
-    version = db.query(Version).order_by(Version.created_at.desc()).first()
+    version = await db.scalar(select(Version).order_by(Version.created_at.desc()).limit(1))
     if not version:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -187,64 +239,64 @@ async def get_latest_version(
 async def add_requirements_to_version(
     version_id: int,
     requirement_ids: List[int],
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """将需求添加到版本中"""
     # 验证版本是否存在
-    version = db.query(Version).filter(Version.id == version_id).first()
+    version = await db.get(Version, version_id)
     if not version:
         raise HTTPException(status_code=404, detail="版本不存在")
     
     # 验证需求是否存在
-    requirements = db.query(Requirement).filter(Requirement.id.in_(requirement_ids)).all()
+    requirements = (await db.scalars(select(Requirement).where(Requirement.id.in_(requirement_ids)))).all()
     if len(requirements) != len(requirement_ids):
         raise HTTPException(status_code=404, detail="部分需求不存在")
     
+    # 一次查出已经关联的需求
+    existing_ids = set((await db.scalars(select(VersionRequirement.requirement_id).where(
+        VersionRequirement.version_id == version_id,
+        VersionRequirement.requirement_id.in_(requirement_ids)
+    ))).all())
+    
     # 添加关联关系
     for req_id in requirement_ids:
-        # 检查是否已经关联
-        existing = db.query(VersionRequirement).filter(
-            VersionRequirement.version_id == version_id,
-            VersionRequirement.requirement_id == req_id
-        ).first()
-        
-        if not existing:
+        if req_id not in existing_ids:
             version_requirement = VersionRequirement(
                 version_id=version_id,
                 requirement_id=req_id
             )
             db.add(version_requirement)
     
-    db.commit()
+    await db.commit()
     return {"message": "需求已成功添加到版本"}
 
 @router.delete("/versions/{version_id}/requirements/{requirement_id}")
 async def remove_requirement_from_version(
     version_id: int,
     requirement_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """从版本中移除需求"""
-    version_requirement = db.query(VersionRequirement).filter(
+    version_requirement = await db.scalar(select(VersionRequirement).where(
         VersionRequirement.version_id == version_id,
         VersionRequirement.requirement_id == requirement_id
-    ).first()
+    ).limit(1))
     
     if not version_requirement:
         raise HTTPException(status_code=404, detail="关联关系不存在")
     
-    db.delete(version_requirement)
-    db.commit()
+    await db.delete(version_requirement)
+    await db.commit()
     return {"message": "需求已从版本中移除"}
 
 @router.get("/versions/{version_id}/requirements")
 async def get_version_requirements(
     version_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取版本中的所有需求"""
     # 验证版本是否存在
-    version = db.query(Version).filter(Version.id == version_id).first()
+    version = await db.get(Version, version_id)
     if not version:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -252,12 +304,11 @@ async def get_version_requirements(
         )
     
     # 获取关联的需求
-    version_requirements = db.query(VersionRequirement).filter(
-        VersionRequirement.version_id == version_id
-    ).all()
-    
-    requirement_ids = [vr.requirement_id for vr in version_requirements]
-    requirements = db.query(Requirement).filter(Requirement.id.in_(requirement_ids)).all()
+    requirements = (await db.scalars(
+        select(Requirement)
+        .join(VersionRequirement, VersionRequirement.requirement_id == Requirement.id)
+        .where(VersionRequirement.version_id == version_id)
+    )).all()
     
     return requirements
 
@@ -265,13 +316,18 @@ async def get_version_requirements(
 async def generate_test_cases_for_version(
     version_id: int,
     request: dict,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """为版本关联的需求生成测试用例"""
+    """为版本关联的需求生成测试用例
+    
+    请求参数：provider 大模型提供商，batch_size 每次调用包含的需求数，
+    concurrency 并发调用数，model 备用生成器使用的模型
+    """
     model = request.get("model", "glm-4.6")
+    provider = request.get("provider", "glm")
     
     # 验证版本是否存在
-    version = db.query(Version).filter(Version.id == version_id).first()
+    version = await db.get(Version, version_id)
     if not version:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -279,9 +335,9 @@ async def generate_test_cases_for_version(
         )
     
     # 获取版本关联的需求
-    version_requirements = db.query(VersionRequirement).filter(
+    version_requirements = (await db.scalars(select(VersionRequirement).where(
         VersionRequirement.version_id == version_id
-    ).all()
+    ))).all()
     
     if not version_requirements:
         raise HTTPException(
@@ -290,7 +346,7 @@ async def generate_test_cases_for_version(
         )
     
     requirement_ids = [vr.requirement_id for vr in version_requirements]
-    requirements = db.query(Requirement).filter(Requirement.id.in_(requirement_ids)).all()
+    requirements = (await db.scalars(select(Requirement).where(Requirement.id.in_(requirement_ids)))).all()
     
     if not requirements:
         raise HTTPException(
@@ -298,24 +354,28 @@ async def generate_test_cases_for_version(
             detail="未找到有效的需求"
         )
     
+    # 结束只读事务，调用大模型期间不占用数据库连接
+    await db.commit()
+    
     try:
-        generated_testcases = []
-        
-        # 为每个需求生成测试用例
-        for requirement in requirements:
-            testcase = await ai_generator.generate_test_case_from_requirement(requirement, model)
-            generated_testcases.append({
-                "requirement_id": requirement.id,
-                "requirement_title": requirement.title,
-                "testcase": testcase
-            })
+        # 按批并发生成，失败的需求单独重试
+        result = await batch_generator.generate_for_requirements(
+            requirements,
+            provider=provider,
+            batch_size=request.get("batch_size"),
+            concurrency=request.get("concurrency"),
+            model=model
+        )
+        generated_testcases = result["results"]
         
         return {
             "message": "测试用例生成成功",
             "version_id": version_id,
             "model": model,
+            "provider": provider,
             "generated_count": len(generated_testcases),
-            "testcases": generated_testcases
+            "testcases": generated_testcases,
+            "stats": result["stats"]
         }
         
     except Exception as e:
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Optional, Dict, List
 
 
 class Settings(BaseSettings):
@@ -18,11 +18,25 @@ class Settings(BaseSettings):
     mysql_database: str = "test_system"
     
     # 数据库连接池配置
-    db_pool_size: int = 10
-    db_max_overflow: int = 20
+    # 两个连接池合计最多 db_pool_size + db_max_overflow + db_async_pool_size + db_async_max_overflow 个连接，
+    # 乘以实例数后不应超过 MySQL 的 max_connections
+    # 同步连接池：工作流、RAG、旧版接口等后台子系统
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
     db_pool_timeout: int = 30
     db_pool_recycle: int = 300
     db_pool_pre_ping: bool = True
+    # 各子系统同时持有的会话上限。api、result_writer 使用异步连接池，其余使用同步连接池，
+    # 每个连接池上的配额之和不宜超过该连接池的 pool_size + max_overflow（见 /system/pool-stats 的 capacity）
+    db_subsystem_quotas: Dict[str, int] = {"api": 20, "result_writer": 1, "workflow": 5, "rag": 3, "legacy": 5}
+    # 异步连接池（aiomysql）：API请求和测试结果写入器
+    db_async_pool_size: int = 10
+    db_async_max_overflow: int = 15
+    # 启动时自动执行数据库迁移（alembic upgrade head），多实例部署时可关闭并在发布流程中单独执行
+    db_auto_migrate: bool = True
+    
+    # 运维接口（/api/v1/system/*）的访问令牌，请求头 X-System-Token；为空时这些接口不可用
+    system_api_token: str = ""
     
     # CORS配置
     cors_origins: list = ["*"]
@@ -35,11 +49,32 @@ class Settings(BaseSettings):
     request_log_file: str = "requests.log"
     sql_log_file: str = "sql.log"
     
+    # SQL监控配置
+    sql_echo: bool = False  # 逐条输出SQL日志，仅用于本地调试
+    sql_sample_rate: float = 0.1  # 查询耗时统计的抽样比例，慢查询总会被记录
+    sql_slow_query_ms: int = 500  # 慢查询阈值（毫秒）
+    sql_stats_max_fingerprints: int = 500  # 最多统计的语句指纹数
+    
     # 测试配置
     default_http_timeout: int = 30
     default_tcp_timeout: int = 30
     default_mq_timeout: int = 30
     
+    # 测试结果写入配置（缓冲后批量插入）
+    result_writer_batch_size: int = 500  # 累计多少条结果写入一次
+    result_writer_flush_interval_ms: int = 200  # 最长缓冲时间（毫秒），到时不足一批也写入
+    result_writer_max_pending: int = 10000  # 缓冲队列上限，队列满时提交结果会等待（背压）
+    
+    # 测试结果保留与归档配置
+    test_result_retention_months: int = 6  # 数据库中保留的月数，更早的结果归档后删除，0 表示不删除
+    test_result_partition_months_ahead: int = 3  # 提前创建的月度分区数
+    test_result_archive_dir: str = "archive/test_results"  # 归档文件目录（按月 JSONL.gz）
+    
+    # 测试结果响应内容存储配置
+    response_blob_threshold_bytes: int = 4096  # 序列化后超过该大小的响应压缩后单独存储
+    response_preview_chars: int = 512  # 外置响应在结果行中保留的预览字符数
+    response_blob_zstd_level: int = 3  # zstd 压缩级别（未安装 zstandard 时使用 zlib）
+    
     # AI配置 - OpenAI
     OPENAI_API_KEY: Optional[str] = None
     OPENAI_BASE_URL: str = "https://api.openai.com/v1"
@@ -53,6 +88,60 @@ class Settings(BaseSettings):
     # AI配置 - DeepSeek
     DEEPSEEK_API_KEY: Optional[str] = None
     
+    # AI配置 - 大模型连接池
+    LLM_POOL_LIMIT: int = 20  # 每个提供商的最大连接数
+    LLM_KEEPALIVE_TIMEOUT: int = 60  # 空闲连接保持时间（秒）
+    LLM_CONNECT_TIMEOUT: int = 10  # 建立连接超时（秒）
+    LLM_READ_TIMEOUT: int = 120  # 读取响应超时（秒）
+    
+    # AI配置 - 大模型响应缓存
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_MAX_ENTRIES: int = 1000  # 内存LRU容量
+    LLM_CACHE_TTL: int = 86400  # 缓存有效期（秒）
+    LLM_CACHE_DB_PATH: str = "llm_cache.sqlite3"  # 磁盘缓存文件，留空则仅使用内存缓存
+    LLM_CACHE_NONZERO_TEMPERATURE: bool = False  # 是否缓存温度大于0的调用；用例生成、结果分析等JSON输出的调用使用温度0，默认即走缓存
+    
+    # AI配置 - 大模型限流与重试
+    LLM_DEFAULT_RPM: int = 60  # 每个提供商每分钟请求数上限，0表示不限制
+    LLM_DEFAULT_TPM: int = 100000  # 每个提供商每分钟token数上限，0表示不限制
+    LLM_MAX_CONCURRENCY: int = 8  # 每个提供商的最大并发调用数
+    LLM_RATE_LIMITS: Dict[str, Dict[str, int]] = {}  # 按提供商覆盖，如 {"glm": {"rpm": 120, "tpm": 200000, "concurrency": 16}}
+    LLM_MAX_RETRIES: int = 3  # 遇到429/5xx时的最大重试次数
+    LLM_RETRY_BASE_DELAY: float = 1.0  # 指数退避初始等待（秒）
+    LLM_RETRY_MAX_DELAY: float = 30.0  # 单次退避最大等待（秒）
+    
+    # AI配置 - 多提供商路由
+    LLM_FAILOVER_ORDER: List[str] = ["glm", "tongyi", "openai"]  # 首选提供商失败后的转移顺序
+    LLM_HEDGE_ENABLED: bool = True  # 首选提供商超过p95延迟未返回时向下一个提供商发送对冲请求
+    LLM_HEDGE_MIN_SAMPLES: int = 20  # 计算p95所需的最少样本数，样本不足时不对冲
+    LLM_HEDGE_MIN_DELAY: float = 2.0  # 对冲等待的下限（秒）
+    LLM_ROUTER_EWMA_ALPHA: float = 0.2  # 延迟/错误率指数加权平均系数
+    LLM_ROUTER_FAILURE_THRESHOLD: int = 3  # 连续失败多少次后暂时跳过该提供商
+    LLM_ROUTER_COOLDOWN: int = 30  # 跳过提供商的时长（秒）
+    
+    # AI配置 - token预算
+    LLM_MAX_PROMPT_TOKENS: int = 8000  # 单次调用提示词的token上限，超出时裁剪，0表示不限制
+    LLM_ANALYSIS_INPUT_TOKENS: int = 4000  # 测试分析/报告接口输入数据的token预算
+    LLM_ANALYSIS_MAX_SHARDS: int = 8  # 测试结果分析的最大分片数，超出部分的低频失败模式不单独分析
+    
+    # AI配置 - 离线模拟提供商（压测用，注册为 mock）
+    LLM_MOCK_ENABLED: bool = False
+    LLM_MOCK_LATENCY_MS: float = 300  # 平均响应延迟（毫秒）
+    LLM_MOCK_LATENCY_DISTRIBUTION: str = "lognormal"  # constant/uniform/exponential/lognormal
+    LLM_MOCK_LATENCY_SIGMA: float = 0.5  # 对数正态分布的sigma，越大长尾越明显
+    LLM_MOCK_TOKENS_PER_SECOND: float = 50  # 模拟输出速率，0表示不限制
+    LLM_MOCK_ERROR_RATE: float = 0.0  # 模拟500错误的比例
+    LLM_MOCK_RATE_LIMIT_RATE: float = 0.0  # 模拟429限流的比例
+    LLM_MOCK_RETRY_AFTER: float = 1.0  # 模拟限流响应的Retry-After（秒）
+    LLM_MOCK_RESPONSE_TEMPLATE: str = ""  # 响应模板，支持 $digest/$prompt/$prompt_preview，留空返回模拟测试用例JSON
+    LLM_MOCK_SEED: Optional[int] = None  # 随机种子，设置后延迟和错误序列可复现
+    
+    # AI配置 - 批量生成
+    LLM_BATCH_SIZE: int = 5  # 每次调用合并的需求数
+    LLM_BATCH_CONCURRENCY: int = 8  # 批量生成的并发调用数
+    LLM_BATCH_MAX_RETRIES: int = 2  # 失败条目的逐个重试轮数
+    LLM_BATCH_ITEM_MAX_TOKENS: int = 1000  # 每个需求预留的生成token数
+    
     # RAG配置
     RAG_CHUNK_SIZE: int = 500
     RAG_CHUNK_OVERLAP: int = 50
@@ -61,7 +150,16 @@ class Settings(BaseSettings):
     # Workflow配置
     WORKFLOW_MAX_EXECUTION_TIME: int = 3600  # 1小时
     WORKFLOW_MAX_CONCURRENT: int = 10
-    
+    WORKFLOW_HISTORY_MODE: str = "summary"  # full: 记录完整值, summary: 仅记录类型/大小/摘要, none: 不记录
+    WORKFLOW_HISTORY_MAX_ENTRIES: int = 200  # 历史环形缓冲区容量，0表示不限制
+    WORKFLOW_VARIABLE_SPILL_BYTES: int = 64 * 1024  # 超过该大小的变量单独存储
+    WORKFLOW_EVENT_BUFFER_SIZE: int = 1000  # 每个执行保留的事件数，用于断点续传
+    WORKFLOW_EVENT_RETENTION: int = 600  # 执行结束后事件保留时间（秒）
+    WORKFLOW_EVENT_HEARTBEAT: int = 15  # 事件流心跳间隔（秒）
+    WORKFLOW_EVENT_MAX_AGE: int = 3600  # 最后一条事件之后通道的最长保留时间（秒），未结束的执行同样清理
+    WORKFLOW_DEFINITION_CACHE_TTL: int = 60  # 工作流图缓存有效期（秒），0表示不缓存
+    WORKFLOW_MAP_CONCURRENCY: int = 5  # MAP节点默认并发数
+
     model_config = {
         "env_file": ".env",
         "env_file_encoding": "utf-8"
@@ -72,6 +170,11 @@ class Settings(BaseSettings):
         """获取数据库连接URL"""
         return f"mysql+pymysql://{self.mysql_user}:{self.mysql_password}@{self.mysql_host}:{self.mysql_port}/{self.mysql_database}"
 
+    @property
+    def async_database_url(self) -> str:
+        """获取异步数据库连接URL"""
+        return f"mysql+aiomysql://{self.mysql_user}:{self.mysql_password}@{self.mysql_host}:{self.mysql_port}/{self.mysql_database}"
+
 
 # 全局配置实例
 settings = Settings()
\ No newline at end of file
@@ -1,26 +1,221 @@
-from sqlalchemy import create_engine
+import time
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional, AsyncIterator
+from sqlalchemy import create_engine, exc
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 from config.settings import settings
-import logging
+from core.query_stats import query_stats
 
-# 设置SQL日志
-logging.getLogger('sqlalchemy.engine').setLevel(logging.INFO)
-logging.getLogger('sqlalchemy.pool').setLevel(logging.INFO)
 
-# 创建数据库引擎
+class _WaitTimingMixin:
+    """记录连接获取等待时间"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._wait_lock = threading.Lock()
+        self.wait_stats = {
+            "checkouts": 0,
+            "total_wait_ms": 0.0,
+            "max_wait_ms": 0.0,
+            "timeouts": 0
+        }
+
+    def _do_get(self):
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with self._wait_lock:
+                self.wait_stats["checkouts"] += 1
+                self.wait_stats["total_wait_ms"] += elapsed_ms
+                self.wait_stats["max_wait_ms"] = max(self.wait_stats["max_wait_ms"], elapsed_ms)
+                if timed_out:
+                    self.wait_stats["timeouts"] += 1
+
+
+class InstrumentedQueuePool(_WaitTimingMixin, QueuePool):
+    """记录连接获取等待时间的连接池"""
+    pass
+
+
+class InstrumentedAsyncQueuePool(_WaitTimingMixin, AsyncAdaptedQueuePool):
+    """记录连接获取等待时间的异步连接池"""
+    pass
+
+
+class SubsystemQuota:
+    """子系统的会话配额，避免某个子系统占满共享连接池
+
+    同步会话和异步会话共用同一个计数。阻塞等待只发生在工作线程中：
+    协程通过 acquire_async 在线程池中等待，不会阻塞事件循环。
+    """
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self._semaphore = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.waits = 0
+        self.total_wait_ms = 0.0
+        self.timeouts = 0
+
+    def _acquired(self, start: float):
+        with self._lock:
+            self.in_use += 1
+            self.total_wait_ms += (time.perf_counter() - start) * 1000
+
+    def _timeout(self) -> exc.TimeoutError:
+        with self._lock:
+            self.timeouts += 1
+        return exc.TimeoutError(f"子系统 {self.name} 的数据库会话配额（{self.limit}）已用尽，等待超时")
+
+    def acquire(self, timeout: float):
+        """阻塞等待配额，只能在工作线程中调用"""
+        start = time.perf_counter()
+        if not self._semaphore.acquire(blocking=False):
+            with self._lock:
+                self.waits += 1
+            if not self._semaphore.acquire(timeout=timeout):
+                raise self._timeout()
+        self._acquired(start)
+
+    async def acquire_async(self, timeout: float):
+        """在协程中等待配额，等待放到线程池中进行"""
+        start = time.perf_counter()
+        if self._semaphore.acquire(blocking=False):
+            self._acquired(start)
+            return
+        with self._lock:
+            self.waits += 1
+        waiter = asyncio.ensure_future(asyncio.to_thread(self._semaphore.acquire, True, timeout))
+        try:
+            acquired = await asyncio.shield(waiter)
+        except asyncio.CancelledError:
+            # 调用方被取消时线程仍在等待，拿到的配额需要归还
+            waiter.add_done_callback(
+                lambda done: self._semaphore.release() if not done.cancelled() and done.result() else None
+            )
+            raise
+        if not acquired:
+            raise self._timeout()
+        self._acquired(start)
+
+    def release(self):
+        with self._lock:
+            self.in_use -= 1
+        self._semaphore.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "in_use": self.in_use,
+            "waits": self.waits,
+            "total_wait_ms": round(self.total_wait_ms, 2),
+            "timeouts": self.timeouts
+        }
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+# 使用异步连接池的子系统（API请求、测试结果写入器），其余子系统使用同步连接池
+ASYNC_SUBSYSTEMS = ("api", "result_writer")
+
+# 各子系统的会话配额，未配置的子系统不限制
+_quotas: Dict[str, SubsystemQuota] = {
+    name: SubsystemQuota(name, limit) for name, limit in settings.db_subsystem_quotas.items()
+}
+
+
+class QuotaSession(Session):
+    """按子系统计算配额的会话，创建时占用配额，关闭时释放
+
+    配额以会话为单位计算，每个会话同一时间最多占用一个连接。
+    同步会话只能在工作线程中创建（协程中通过 asyncio.to_thread 执行数据库操作），
+    配额用尽时阻塞等待；在事件循环线程中创建会直接报错，避免等待配额时阻塞整个事件循环。
+    """
+
+    def __init__(self, *args, subsystem: str = "api", **kwargs):
+        self.subsystem = subsystem
+        self._quota: Optional[SubsystemQuota] = _quotas.get(subsystem)
+        if self._quota is not None:
+            if _on_event_loop():
+                self._quota = None
+                raise RuntimeError(f"子系统 {subsystem} 的同步数据库会话不能在事件循环线程中创建，请通过 asyncio.to_thread 执行")
+            self._quota.acquire(settings.db_pool_timeout)
+        try:
+            super().__init__(*args, **kwargs)
+        except Exception:
+            self._release_quota()
+            raise
+
+    def _release_quota(self):
+        if self._quota is not None:
+            quota, self._quota = self._quota, None
+            quota.release()
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self._release_quota()
+
+
+# 创建数据库引擎（工作流、RAG等后台子系统共享同一个同步连接池）
 engine = create_engine(
     settings.database_url,
+    poolclass=InstrumentedQueuePool,
     pool_size=settings.db_pool_size,
     max_overflow=settings.db_max_overflow,
     pool_timeout=settings.db_pool_timeout,
     pool_recycle=settings.db_pool_recycle,
     pool_pre_ping=settings.db_pool_pre_ping,
-    echo=True  # 启用SQL日志
+    echo=settings.sql_echo  # 逐条SQL日志仅用于本地调试，默认关闭
 )
 
+# API请求使用的异步引擎，查询等待期间不阻塞事件循环
+async_engine = create_async_engine(
+    settings.async_database_url,
+    poolclass=InstrumentedAsyncQueuePool,
+    pool_size=settings.db_async_pool_size,
+    max_overflow=settings.db_async_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+    pool_recycle=settings.db_pool_recycle,
+    pool_pre_ping=settings.db_pool_pre_ping,
+    echo=settings.sql_echo
+)
+
+# 抽样统计查询耗时，记录慢查询
+query_stats.attach(engine)
+query_stats.attach(async_engine.sync_engine)
+
+
+def session_factory(subsystem: str, **kwargs) -> sessionmaker:
+    """创建绑定共享引擎的会话工厂，subsystem 决定使用哪个配额"""
+    return sessionmaker(bind=engine, class_=QuotaSession, subsystem=subsystem, **kwargs)
+
+
 # 创建会话工厂
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = session_factory("api", autocommit=False, autoflush=False)
+
+# 异步会话工厂：提交后不过期对象，避免在序列化响应时触发隐式的延迟加载
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
 
 # 创建基础模型类
 Base = declarative_base()
@@ -34,7 +229,68 @@ def get_db():
     finally:
         db.close()
 
+@asynccontextmanager
+async def async_session(subsystem: str = "api") -> AsyncIterator[AsyncSession]:
+    """按子系统配额打开异步会话，等待配额时不阻塞事件循环"""
+    quota = _quotas.get(subsystem)
+    if quota is not None:
+        await quota.acquire_async(settings.db_pool_timeout)
+    try:
+        async with AsyncSessionLocal() as db:
+            yield db
+    finally:
+        if quota is not None:
+            quota.release()
+
+# 依赖注入：获取异步数据库会话
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """获取异步数据库会话（受 api 子系统配额限制）"""
+    async with async_session("api") as db:
+        yield db
+
 # 创建所有表
 def create_tables():
     """创建所有数据库表"""
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    Base.metadata.create_all(bind=engine)
+
+def _pool_snapshot(pool, max_overflow: int) -> Dict[str, Any]:
+    wait_stats = dict(getattr(pool, "wait_stats", {}))
+    if wait_stats.get("checkouts"):
+        wait_stats["avg_wait_ms"] = round(wait_stats["total_wait_ms"] / wait_stats["checkouts"], 3)
+    return {
+        "pool_size": pool.size(),
+        "max_overflow": max_overflow,
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "wait": wait_stats
+    }
+
+def pool_capacity() -> Dict[str, Dict[str, int]]:
+    """两个连接池的最大连接数与其上子系统配额之和，配额之和超过最大连接数时会在连接池上排队"""
+    quota_totals = {"sync": 0, "async": 0}
+    for name, quota in _quotas.items():
+        quota_totals["async" if name in ASYNC_SUBSYSTEMS else "sync"] += quota.limit
+    return {
+        "sync": {
+            "max_connections": settings.db_pool_size + settings.db_max_overflow,
+            "quota_total": quota_totals["sync"]
+        },
+        "async": {
+            "max_connections": settings.db_async_pool_size + settings.db_async_max_overflow,
+            "quota_total": quota_totals["async"]
+        }
+    }
+
+def get_pool_stats() -> Dict[str, Any]:
+    """获取连接池和子系统配额的使用情况"""
+    capacity = pool_capacity()
+    return {
+        **_pool_snapshot(engine.pool, settings.db_max_overflow),
+        "async": _pool_snapshot(async_engine.pool, settings.db_async_max_overflow),
+        "capacity": {
+            **capacity,
+            "total_max_connections": sum(pool["max_connections"] for pool in capacity.values())
+        },
+        "subsystems": {name: quota.get_stats() for name, quota in _quotas.items()}
+    }
@@ -67,8 +67,8 @@ def setup_logging():
         prefix="[SQL] "
     )
     
-    # 确保SQL日志级别正确
-    sql_logger.setLevel(logging.INFO)
+    # 默认只记录慢查询（WARNING），开启 sql_echo 时记录每条SQL
+    sql_logger.setLevel(logging.INFO if settings.sql_echo else logging.WARNING)
     
     # 测试执行日志器
     test_logger = setup_colored_logger(
@@ -0,0 +1,38 @@
+"""
+数据库迁移
+基于 Alembic 管理表结构，替代启动时的 create_all
+"""
+
+import os
+import logging
+from typing import List
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import MetaData
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def alembic_config() -> Config:
+    """获取 Alembic 配置（与当前工作目录无关）"""
+    config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "migrations"))
+    return config
+
+
+def target_metadata() -> List[MetaData]:
+    """迁移管理的全部表结构：业务模型、RAG知识库、工作流引擎各自的 Base"""
+    from core.database import Base
+    import models.database_models  # noqa: F401 注册业务模型
+    from services.ai.rag_engine import Base as RAGBase
+    from services.ai.workflow_engine import Base as WorkflowBase
+    return [Base.metadata, RAGBase.metadata, WorkflowBase.metadata]
+
+
+def run_migrations(revision: str = "head"):
+    """将数据库升级到指定版本"""
+    command.upgrade(alembic_config(), revision)
+    logger.info(f"数据库迁移完成: {revision}")
@@ -0,0 +1,193 @@
+"""
+SQL查询统计
+替代逐条SQL日志：按语句指纹抽样统计耗时分布，超过阈值的慢查询单独记录
+"""
+
+import re
+import time
+import random
+import threading
+from bisect import bisect_left
+from collections import deque
+from functools import lru_cache
+from typing import Dict, Any, List, Optional
+import logging
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from config.settings import settings
+
+# 慢查询写入SQL日志（sql.log），普通查询不再逐条记录
+logger = logging.getLogger("sqlalchemy.engine")
+
+# 耗时直方图的桶上界（毫秒）
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+_FINGERPRINT_RULES = [
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"%\(\w+\)s|%s"), "?"),
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)"), "(?+)"),
+    (re.compile(r"\s+"), " "),
+]
+
+@lru_cache(maxsize=2048)
+def fingerprint(statement: str) -> str:
+    """将SQL语句归一化为指纹：字面量和参数占位符替换为?，IN列表折叠，空白合并"""
+    result = statement
+    for pattern, replacement in _FINGERPRINT_RULES:
+        result = pattern.sub(replacement, result)
+    return result.strip()[:500]
+
+class _StatementStats:
+    """单个语句指纹的统计"""
+
+    __slots__ = ('count', 'total_ms', 'max_ms', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def add(self, elapsed_ms: float):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.buckets[bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+
+    def percentile(self, q: float) -> float:
+        """按直方图估算分位数（返回所在桶的上界）"""
+        target = self.count * q
+        seen = 0
+        for index, bucket in enumerate(self.buckets):
+            seen += bucket
+            if seen >= target:
+                return LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+class QueryStats:
+    """SQL查询统计器"""
+
+    def __init__(
+        self,
+        sample_rate: float = 0.1,
+        slow_query_ms: float = 500,
+        max_fingerprints: int = 500,
+        slow_log_size: int = 100
+    ):
+        self.sample_rate = sample_rate
+        self.slow_query_ms = slow_query_ms
+        self.max_fingerprints = max_fingerprints
+        self._statements: Dict[str, _StatementStats] = {}
+        self._slow_queries: deque = deque(maxlen=slow_log_size)
+        self._lock = threading.Lock()
+        self._dropped = 0
+        self._started_at = time.time()
+
+    @classmethod
+    def from_settings(cls) -> "QueryStats":
+        """根据配置创建统计器"""
+        return cls(
+            sample_rate=settings.sql_sample_rate,
+            slow_query_ms=settings.sql_slow_query_ms,
+            max_fingerprints=settings.sql_stats_max_fingerprints
+        )
+
+    def attach(self, engine: Engine):
+        """为引擎注册计时事件"""
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # 计时对所有语句生效（开销很小），慢查询不受抽样影响
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        start_times = conn.info.get("query_start_time")
+        if not start_times:
+            return
+        elapsed_ms = (time.perf_counter() - start_times.pop()) * 1000
+
+        if elapsed_ms >= self.slow_query_ms:
+            self._record_slow(statement, elapsed_ms, executemany)
+        elif self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return
+        self._record(statement, elapsed_ms)
+
+    def _record(self, statement: str, elapsed_ms: float):
+        key = fingerprint(statement)
+        with self._lock:
+            stats = self._statements.get(key)
+            if stats is None:
+                if len(self._statements) >= self.max_fingerprints:
+                    self._dropped += 1
+                    return
+                stats = self._statements[key] = _StatementStats()
+            stats.add(elapsed_ms)
+
+    def _record_slow(self, statement: str, elapsed_ms: float, executemany: bool):
+        entry = {
+            'fingerprint': fingerprint(statement),
+            'elapsed_ms': round(elapsed_ms, 2),
+            'executemany': executemany,
+            'at': time.time()
+        }
+        with self._lock:
+            self._slow_queries.append(entry)
+        logger.warning(f"慢查询: {elapsed_ms:.1f}ms - {entry['fingerprint'][:200]}")
+
+    def top(self, limit: int = 20, order_by: str = "total_ms") -> List[Dict[str, Any]]:
+        """按指定指标返回前N个语句指纹的统计
+
+        order_by 可选 total_ms / count / max_ms / p95_ms。慢查询总会被统计，其余语句按
+        sample_rate 抽样，estimated_count 为按抽样率换算的估计执行次数。
+        """
+        with self._lock:
+            items = [(key, stats) for key, stats in self._statements.items()]
+            rows = []
+            for key, stats in items:
+                rows.append({
+                    'fingerprint': key,
+                    'count': stats.count,
+                    'estimated_count': round(stats.count / self.sample_rate) if self.sample_rate else stats.count,
+                    'total_ms': round(stats.total_ms, 2),
+                    'avg_ms': round(stats.total_ms / stats.count, 2),
+                    'max_ms': round(stats.max_ms, 2),
+                    'p50_ms': stats.percentile(0.5),
+                    'p95_ms': stats.percentile(0.95),
+                    'p99_ms': stats.percentile(0.99)
+                })
+        if order_by not in ('total_ms', 'count', 'max_ms', 'p95_ms'):
+            order_by = 'total_ms'
+        rows.sort(key=lambda row: row[order_by], reverse=True)
+        return rows[:limit]
+
+    def slow_queries(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """最近的慢查询，最新的在前"""
+        with self._lock:
+            entries = list(self._slow_queries)
+        entries.reverse()
+        return entries[:limit] if limit else entries
+
+    def reset(self):
+        """清空统计"""
+        with self._lock:
+            self._statements.clear()
+            self._slow_queries.clear()
+            self._dropped = 0
+            self._started_at = time.time()
+
+    def get_summary(self) -> Dict[str, Any]:
+        """统计概况"""
+        return {
+            'sample_rate': self.sample_rate,
+            'slow_query_ms': self.slow_query_ms,
+            'fingerprints': len(self._statements),
+            'dropped_fingerprints': self._dropped,
+            'slow_queries': len(self._slow_queries),
+            'since': self._started_at
+        }
+
+# 全局实例
+query_stats = QueryStats.from_settings()
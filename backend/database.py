@@ -1,51 +1,11 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, Boolean, ForeignKey, JSON, event
+from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, ForeignKey, JSON
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import relationship
 from datetime import datetime
-import os
-import logging
-import time
-from dotenv import load_dotenv
+from core.database import engine, session_factory
 
-# 加载环境变量
-load_dotenv()
-
-# MySQL数据库连接配置
-MYSQL_USER = os.getenv("MYSQL_USER", "root")
-MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD", "password")
-MYSQL_HOST = os.getenv("MYSQL_HOST", "localhost")
-MYSQL_PORT = os.getenv("MYSQL_PORT", "3306")
-MYSQL_DATABASE = os.getenv("MYSQL_DATABASE", "test_system")
-
-SQLALCHEMY_DATABASE_URL = f"mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DATABASE}"
-
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    pool_pre_ping=True,
-    pool_recycle=300,
-    pool_size=int(os.getenv("DB_POOL_SIZE", "10")),
-    max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "20")),
-    echo=True  # 启用SQL语句日志
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, expire_on_commit=False)
-
-# 配置SQL执行日志
-sql_logger = logging.getLogger("sqlalchemy.engine")
-
-@event.listens_for(engine, "before_cursor_execute")
-def receive_before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
-    """SQL执行前的日志记录"""
-    context._query_start_time = time.time()
-
-@event.listens_for(engine, "after_cursor_execute")
-def receive_after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
-    """SQL执行后的日志记录"""
-    total = time.time() - context._query_start_time
-    sql_logger.info(f"SQL执行耗时: {total:.3f}s - 参数: {parameters}")
-    
-    # 记录慢查询（超过0.5秒）
-    if total > 0.5:
-        sql_logger.warning(f"慢查询检测: {total:.3f}s - SQL: {statement[:100]}...")
+# 与 core.database 共享同一个引擎和连接池，会话受 legacy 子系统配额限制
+SessionLocal = session_factory("legacy", autocommit=False, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
@@ -1,11 +1,12 @@
+import asyncio
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 import time
 import uuid
 from config.settings import settings
 from core.logging import setup_logging
-from core.database import create_tables
-from api.v1 import projects, testcases, tests, versions, requirements, rules, ai
+from core.migrations import run_migrations
+from api.v1 import projects, testcases, tests, versions, requirements, rules, ai, system
 
 # 设置日志
 main_logger, request_logger, _, _ = setup_logging()
@@ -25,6 +26,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=settings.cors_methods,
     allow_headers=settings.cors_headers,
+    # 分页游标通过响应头返回，需要暴露给跨域的前端读取
+    expose_headers=["X-Next-Cursor"],
 )
 
 # 请求日志中间件
@@ -92,21 +95,53 @@ try:
     app.include_router(requirements.router, prefix="/api/v1", tags=["requirements"])
     app.include_router(rules.router, prefix="/api/v1/rules", tags=["rules"])
     app.include_router(ai.router, prefix="/api/v1/ai", tags=["ai"])
+    app.include_router(system.router, prefix="/api/v1", tags=["system"])
     main_logger.info("API路由注册成功")
 except Exception as e:
     main_logger.error(f"API路由注册失败: {str(e)}")
 
-# 启动时创建数据库表
+# 启动时执行数据库迁移
 @app.on_event("startup")
 async def startup_event():
     """应用启动时的初始化操作"""
+    if settings.db_auto_migrate:
+        # 迁移失败时中止启动，避免在表结构不完整的数据库上接收请求、写入测试结果
+        try:
+            await asyncio.to_thread(run_migrations)
+            main_logger.info("数据库迁移执行成功")
+        except Exception as e:
+            main_logger.error(f"数据库迁移失败，停止启动: {str(e)}")
+            raise
+    
+    from services.result_writer import result_writer
+    await result_writer.start()
+    
+    main_logger.info(f"{settings.app_name} 启动成功")
+
+# 关闭时释放资源
+@app.on_event("shutdown")
+async def shutdown_event():
+    """应用关闭时的清理操作"""
     try:
-        create_tables()
-        main_logger.info("数据库表创建/验证成功")
+        from services.ai.llm_client import llm_client
+        await llm_client.close()
+        main_logger.info("大模型连接池已关闭")
     except Exception as e:
-        main_logger.error(f"数据库初始化失败: {str(e)}")
+        main_logger.error(f"关闭大模型连接池失败: {str(e)}")
     
-    main_logger.info(f"{settings.app_name} 启动成功")
+    # 先写完缓冲的测试结果，再关闭数据库连接池
+    try:
+        from services.result_writer import result_writer
+        await result_writer.stop()
+    except Exception as e:
+        main_logger.error(f"写入剩余测试结果失败: {str(e)}")
+    
+    try:
+        from core.database import async_engine
+        await async_engine.dispose()
+        main_logger.info("数据库异步连接池已关闭")
+    except Exception as e:
+        main_logger.error(f"关闭数据库异步连接池失败: {str(e)}")
 
 if __name__ == "__main__":
     import uvicorn
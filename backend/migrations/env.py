@@ -0,0 +1,36 @@
+"""Alembic 运行环境：复用应用的数据库配置和共享引擎"""
+
+from alembic import context
+
+from config.settings import settings
+from core.migrations import target_metadata
+
+config = context.config
+
+
+def run_migrations_offline() -> None:
+    """离线模式：只输出SQL，不连接数据库"""
+    context.configure(
+        url=settings.database_url,
+        target_metadata=target_metadata(),
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    """在线模式：使用应用的共享引擎执行迁移"""
+    from core.database import engine
+
+    with engine.connect() as connection:
+        context.configure(connection=connection, target_metadata=target_metadata())
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
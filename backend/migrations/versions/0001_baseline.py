@@ -0,0 +1,368 @@
+"""基线：启用迁移前的表结构
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-19
+
+固定为启用 Alembic 时的表结构（业务模型、RAG知识库、工作流引擎），之后的结构变更
+（组合索引、分区、响应外置存储等）全部由后续迁移完成，不随模型变化。
+启用迁移前由 create_all 建出的数据库升级时，已存在的表保持不变，只补建缺少的表。
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+# revision identifiers, used by Alembic.
+revision = '0001_baseline'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# 按外键依赖排序，回退时逆序删除
+TABLES = [
+    'projects',
+    'rule_templates',
+    'test_result_rollups',
+    'versions',
+    'batch_test_tasks',
+    'requirements',
+    'rule_definitions',
+    'test_data',
+    'test_reports',
+    'testcases',
+    'assertion_rules',
+    'test_results',
+    'testcase_rules',
+    'version_requirements',
+    'document_embeddings',
+    'knowledge_documents',
+    'workflow_definitions',
+    'workflow_executions',
+    'workflow_variable_blobs',
+]
+
+
+def upgrade() -> None:
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'projects' not in existing:
+        op.create_table(
+            'projects',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.Column('description', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_projects_id', 'projects', ['id'])
+
+    if 'rule_templates' not in existing:
+        op.create_table(
+            'rule_templates',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.Column('category', sa.String(length=50), nullable=False),
+            sa.Column('protocol', sa.String(length=20), nullable=False),
+            sa.Column('description', sa.Text(), nullable=True),
+            sa.Column('is_enabled', sa.Boolean(), nullable=True),
+            sa.Column('priority', sa.Integer(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_rule_templates_id', 'rule_templates', ['id'])
+
+    if 'test_result_rollups' not in existing:
+        op.create_table(
+            'test_result_rollups',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('project_id', sa.Integer(), nullable=False),
+            sa.Column('testcase_id', sa.Integer(), nullable=False),
+            sa.Column('granularity', sa.String(length=10), nullable=False),
+            sa.Column('bucket_start', sa.DateTime(), nullable=False),
+            sa.Column('total', sa.Integer(), nullable=True),
+            sa.Column('passed', sa.Integer(), nullable=True),
+            sa.Column('failed', sa.Integer(), nullable=True),
+            sa.Column('error', sa.Integer(), nullable=True),
+            sa.Column('other', sa.Integer(), nullable=True),
+            sa.Column('duration_count', sa.Integer(), nullable=True),
+            sa.Column('duration_sum', sa.BigInteger(), nullable=True),
+            sa.Column('duration_max', sa.Integer(), nullable=True),
+            sa.Column('latency_buckets', sa.JSON(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('project_id', 'testcase_id', 'granularity', 'bucket_start', name='uq_test_result_rollup'),
+        )
+        op.create_index('ix_test_result_rollups_id', 'test_result_rollups', ['id'])
+
+    if 'versions' not in existing:
+        op.create_table(
+            'versions',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('version_number', sa.String(length=50), nullable=False),
+            sa.Column('description', sa.Text(), nullable=True),
+            sa.Column('changes', sa.JSON(), nullable=True),
+            sa.Column('status', sa.String(length=20), nullable=True),
+            sa.Column('release_date', sa.DateTime(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('created_by', sa.String(length=100), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_versions_id', 'versions', ['id'])
+
+    if 'batch_test_tasks' not in existing:
+        op.create_table(
+            'batch_test_tasks',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('task_id', sa.String(length=50), nullable=False),
+            sa.Column('project_id', sa.Integer(), nullable=True),
+            sa.Column('testcase_ids', sa.Text(), nullable=True),
+            sa.Column('status', sa.String(length=20), nullable=True),
+            sa.Column('total_tests', sa.Integer(), nullable=True),
+            sa.Column('passed_tests', sa.Integer(), nullable=True),
+            sa.Column('failed_tests', sa.Integer(), nullable=True),
+            sa.Column('error_tests', sa.Integer(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('completed_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['project_id'], ['projects.id']),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('task_id'),
+        )
+        op.create_index('ix_batch_test_tasks_id', 'batch_test_tasks', ['id'])
+
+    if 'requirements' not in existing:
+        op.create_table(
+            'requirements',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('title', sa.String(length=200), nullable=False),
+            sa.Column('description', sa.Text(), nullable=False),
+            sa.Column('priority', sa.String(length=20), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=False),
+            sa.Column('type', sa.String(length=20), nullable=False),
+            sa.Column('project_id', sa.Integer(), nullable=False),
+            sa.Column('assigned_to', sa.String(length=100), nullable=True),
+            sa.Column('reporter', sa.String(length=100), nullable=True),
+            sa.Column('due_date', sa.DateTime(), nullable=True),
+            sa.Column('estimated_hours', sa.Integer(), nullable=True),
+            sa.Column('actual_hours', sa.Integer(), nullable=True),
+            sa.Column('acceptance_criteria', sa.Text(), nullable=True),
+            sa.Column('business_value', sa.Text(), nullable=True),
+            sa.Column('tags', sa.JSON(), nullable=True),
+            sa.Column('attachments', sa.JSON(), nullable=True),
+            sa.Column('comments', sa.JSON(), nullable=True),
+            sa.Column('linked_test_cases', sa.JSON(), nullable=True),
+            sa.Column('linked_functional_test_cases', sa.Integer(), nullable=True),
+            sa.Column('linked_interface_test_cases', sa.Integer(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['project_id'], ['projects.id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_requirements_id', 'requirements', ['id'])
+
+    if 'rule_definitions' not in existing:
+        op.create_table(
+            'rule_definitions',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('template_id', sa.Integer(), nullable=False),
+            sa.Column('rule_type', sa.String(length=50), nullable=False),
+            sa.Column('rule_config', sa.JSON(), nullable=True),
+            sa.Column('execution_order', sa.Integer(), nullable=True),
+            sa.Column('is_required', sa.Boolean(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['template_id'], ['rule_templates.id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_rule_definitions_id', 'rule_definitions', ['id'])
+
+    if 'test_data' not in existing:
+        op.create_table(
+            'test_data',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.Column('data_type', sa.String(length=50), nullable=True),
+            sa.Column('content', sa.JSON(), nullable=True),
+            sa.Column('project_id', sa.Integer(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['project_id'], ['projects.id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_test_data_id', 'test_data', ['id'])
+
+    if 'test_reports' not in existing:
+        op.create_table(
+            'test_reports',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('version_id', sa.Integer(), nullable=True),
+            sa.Column('project_id', sa.Integer(), nullable=True),
+            sa.Column('total_tests', sa.Integer(), nullable=True),
+            sa.Column('passed_tests', sa.Integer(), nullable=True),
+            sa.Column('failed_tests', sa.Integer(), nullable=True),
+            sa.Column('error_tests', sa.Integer(), nullable=True),
+            sa.Column('summary', sa.JSON(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['project_id'], ['projects.id']),
+            sa.ForeignKeyConstraint(['version_id'], ['versions.id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_test_reports_id', 'test_reports', ['id'])
+
+    if 'testcases' not in existing:
+        op.create_table(
+            'testcases',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.Column('description', sa.Text(), nullable=True),
+            sa.Column('protocol', sa.String(length=20), nullable=False),
+            sa.Column('config', sa.JSON(), nullable=True),
+            sa.Column('project_id', sa.Integer(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['project_id'], ['projects.id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_testcases_id', 'testcases', ['id'])
+
+    if 'assertion_rules' not in existing:
+        op.create_table(
+            'assertion_rules',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('rule_definition_id', sa.Integer(), nullable=False),
+            sa.Column('assertion_type', sa.String(length=50), nullable=False),
+            sa.Column('field_path', sa.String(length=200), nullable=True),
+            sa.Column('operator', sa.String(length=20), nullable=True),
+            sa.Column('expected_value', sa.Text(), nullable=True),
+            sa.Column('error_message', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['rule_definition_id'], ['rule_definitions.id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_assertion_rules_id', 'assertion_rules', ['id'])
+
+    if 'test_results' not in existing:
+        op.create_table(
+            'test_results',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('testcase_id', sa.Integer(), nullable=True),
+            sa.Column('status', sa.String(length=20), nullable=False),
+            sa.Column('response_data', sa.JSON(), nullable=True),
+            sa.Column('execution_time', sa.Integer(), nullable=True),
+            sa.Column('error_message', sa.Text(), nullable=True),
+            sa.Column('executed_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['testcase_id'], ['testcases.id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_test_results_id', 'test_results', ['id'])
+
+    if 'testcase_rules' not in existing:
+        op.create_table(
+            'testcase_rules',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('testcase_id', sa.Integer(), nullable=False),
+            sa.Column('rule_template_id', sa.Integer(), nullable=False),
+            sa.Column('is_active', sa.Boolean(), nullable=True),
+            sa.Column('custom_config', sa.JSON(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['rule_template_id'], ['rule_templates.id']),
+            sa.ForeignKeyConstraint(['testcase_id'], ['testcases.id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_testcase_rules_id', 'testcase_rules', ['id'])
+
+    if 'version_requirements' not in existing:
+        op.create_table(
+            'version_requirements',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('version_id', sa.Integer(), nullable=False),
+            sa.Column('requirement_id', sa.Integer(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['requirement_id'], ['requirements.id']),
+            sa.ForeignKeyConstraint(['version_id'], ['versions.id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_version_requirements_id', 'version_requirements', ['id'])
+
+    if 'document_embeddings' not in existing:
+        op.create_table(
+            'document_embeddings',
+            sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column('doc_id', sa.String(length=100), nullable=False),
+            sa.Column('chunk_index', sa.Integer(), nullable=False),
+            sa.Column('chunk_content', sa.Text(), nullable=False),
+            sa.Column('embedding', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+        )
+
+    if 'knowledge_documents' not in existing:
+        op.create_table(
+            'knowledge_documents',
+            sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column('doc_id', sa.String(length=100), nullable=False),
+            sa.Column('title', sa.String(length=500), nullable=False),
+            sa.Column('content', sa.Text(), nullable=False),
+            sa.Column('source', sa.String(length=200), nullable=False),
+            sa.Column('category', sa.String(length=100), nullable=False),
+            sa.Column('doc_metadata', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('doc_id'),
+        )
+
+    if 'workflow_definitions' not in existing:
+        op.create_table(
+            'workflow_definitions',
+            sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column('workflow_id', sa.String(length=100), nullable=False),
+            sa.Column('name', sa.String(length=200), nullable=False),
+            sa.Column('description', sa.Text(), nullable=True),
+            sa.Column('definition', sa.Text(), nullable=False),
+            sa.Column('version', sa.String(length=20), nullable=True),
+            sa.Column('active', sa.Boolean(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('workflow_id'),
+        )
+
+    if 'workflow_executions' not in existing:
+        op.create_table(
+            'workflow_executions',
+            sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column('execution_id', sa.String(length=100), nullable=False),
+            sa.Column('workflow_id', sa.String(length=100), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=True),
+            sa.Column('context', sa.Text(), nullable=True),
+            sa.Column('current_node', sa.String(length=100), nullable=True),
+            sa.Column('error_message', sa.Text(), nullable=True),
+            sa.Column('start_time', sa.DateTime(), nullable=True),
+            sa.Column('end_time', sa.DateTime(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('execution_id'),
+        )
+
+    if 'workflow_variable_blobs' not in existing:
+        op.create_table(
+            'workflow_variable_blobs',
+            sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column('execution_id', sa.String(length=100), nullable=False),
+            sa.Column('var_key', sa.String(length=200), nullable=False),
+            sa.Column('value', sa.Text().with_variant(mysql.LONGTEXT(), 'mysql'), nullable=False),
+            sa.Column('size', sa.Integer(), nullable=False),
+            sa.Column('digest', sa.String(length=64), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('execution_id', 'var_key', name='uq_workflow_variable_blob'),
+        )
+
+
+def downgrade() -> None:
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+    for table in reversed(TABLES):
+        if table in existing:
+            op.drop_table(table)
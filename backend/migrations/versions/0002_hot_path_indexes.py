@@ -0,0 +1,52 @@
+"""为高频查询路径添加组合索引
+
+Revision ID: 0002_hot_path_indexes
+Revises: 0001_baseline
+Create Date: 2026-10-19
+
+- testcases (project_id, protocol)：按项目/协议查询用例
+- test_results (testcase_id, executed_at)：用例执行历史按时间倒序
+- requirements (project_id, status, priority)：需求列表筛选
+- version_requirements (version_id, requirement_id)：版本需求关联
+- document_embeddings (doc_id)：按文档查询向量片段
+- test_result_rollups (project_id, granularity, bucket_start)：趋势查询
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0002_hot_path_indexes'
+down_revision = '0001_baseline'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('testcases', 'ix_testcases_project_protocol', ['project_id', 'protocol']),
+    ('test_results', 'ix_test_results_testcase_executed', ['testcase_id', 'executed_at']),
+    ('requirements', 'ix_requirements_project_status_priority', ['project_id', 'status', 'priority']),
+    ('version_requirements', 'ix_version_requirements_version_requirement', ['version_id', 'requirement_id']),
+    ('document_embeddings', 'ix_document_embeddings_doc_id', ['doc_id']),
+    ('test_result_rollups', 'ix_test_result_rollups_project_granularity_bucket', ['project_id', 'granularity', 'bucket_start']),
+]
+
+
+def _existing_indexes(inspector, table: str):
+    return {index['name'] for index in inspector.get_indexes(table)}
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+    for table, name, columns in INDEXES:
+        # 启用迁移前手动建过的索引跳过
+        if table not in tables or name in _existing_indexes(inspector, table):
+            continue
+        op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+    for table, name, _ in reversed(INDEXES):
+        if table in tables and name in _existing_indexes(inspector, table):
+            op.drop_index(name, table_name=table)
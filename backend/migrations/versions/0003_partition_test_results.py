@@ -0,0 +1,91 @@
+"""test_results 按执行时间月度分区（仅 MySQL）
+
+Revision ID: 0003_partition_test_results
+Revises: 0002_hot_path_indexes
+Create Date: 2026-10-19
+
+MySQL 分区表要求分区列包含在每个唯一键中，且不支持外键：
+- executed_at 改为非空（历史空值以当前时间补齐），主键改为 (id, executed_at)
+- 删除 testcase_id 外键（用例与结果的关联由应用维护）
+- 按 TO_DAYS(executed_at) 划分月度范围分区：最早结果所在月到未来若干月，pmax 兜底
+
+分区会重建整张表，数据量大时应在维护窗口执行（可设置 DB_AUTO_MIGRATE=false 后手动升级）。
+之后的分区预建与过期分区归档由 services/result_retention.py 负责。
+其他数据库不做修改，保留期清理按批删除。
+"""
+from datetime import datetime, date
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0003_partition_test_results'
+down_revision = '0002_hot_path_indexes'
+branch_labels = None
+depends_on = None
+
+TABLE = 'test_results'
+# 迁移时预建的未来月份数，之后的分区由 services/result_retention.py 按配置维护
+MONTHS_AHEAD = 3
+
+# 以下分区工具与 services/result_retention.py 相同，迁移中固定一份，不随应用代码变化
+
+
+def month_start(value: datetime) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_clause(first_month: date, last_month: date) -> str:
+    definitions = []
+    month = first_month
+    while month <= last_month:
+        definitions.append(
+            f"PARTITION p{month:%Y%m} VALUES LESS THAN (TO_DAYS('{add_months(month, 1).isoformat()}'))"
+        )
+        month = add_months(month, 1)
+    definitions.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+    return ",\n    ".join(definitions)
+
+
+def _is_partitioned(bind) -> bool:
+    return bool(bind.execute(sa.text(
+        "SELECT COUNT(*) FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL"
+    ), {"table": TABLE}).scalar())
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != "mysql" or _is_partitioned(bind):
+        return
+
+    op.execute(f"UPDATE {TABLE} SET executed_at = UTC_TIMESTAMP() WHERE executed_at IS NULL")
+    for foreign_key in sa.inspect(bind).get_foreign_keys(TABLE):
+        op.drop_constraint(foreign_key["name"], TABLE, type_="foreignkey")
+    # id 上已有普通索引 ix_test_results_id，去掉主键后自增列仍有索引可用
+    op.execute(
+        f"ALTER TABLE {TABLE} "
+        "MODIFY executed_at DATETIME NOT NULL, "
+        "DROP PRIMARY KEY, ADD PRIMARY KEY (id, executed_at)"
+    )
+
+    oldest = bind.execute(sa.text(f"SELECT MIN(executed_at) FROM {TABLE}")).scalar()
+    current = month_start(datetime.utcnow())
+    first = month_start(oldest) if oldest else current
+    last = add_months(current, MONTHS_AHEAD)
+    op.execute(f"ALTER TABLE {TABLE} PARTITION BY RANGE (TO_DAYS(executed_at)) (\n    {partition_clause(first, last)}\n)")
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != "mysql" or not _is_partitioned(bind):
+        return
+
+    op.execute(f"ALTER TABLE {TABLE} REMOVE PARTITIONING")
+    op.execute(f"ALTER TABLE {TABLE} DROP PRIMARY KEY, ADD PRIMARY KEY (id)")
+    op.create_foreign_key(None, TABLE, "testcases", ["testcase_id"], ["id"])
@@ -0,0 +1,56 @@
+"""测试结果大响应外置存储
+
+Revision ID: 0004_test_result_blobs
+Revises: 0003_partition_test_results
+Create Date: 2026-10-19
+
+- 新建 test_result_blobs：按 SHA-256 去重的压缩响应内容
+- test_results 增加 response_digest / response_size / response_preview 列
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.mysql import LONGBLOB
+
+# revision identifiers, used by Alembic.
+revision = '0004_test_result_blobs'
+down_revision = '0003_partition_test_results'
+branch_labels = None
+depends_on = None
+
+RESULT_COLUMNS = [
+    ('response_digest', sa.String(64)),
+    ('response_size', sa.Integer()),
+    ('response_preview', sa.Text()),
+]
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    # 已存在的对象跳过，升级中断后可以重新执行
+    if 'test_result_blobs' not in inspector.get_table_names():
+        op.create_table(
+            'test_result_blobs',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('digest', sa.String(64), nullable=False),
+            sa.Column('codec', sa.String(10), nullable=False),
+            sa.Column('size', sa.Integer(), nullable=False),
+            sa.Column('compressed_size', sa.Integer(), nullable=False),
+            sa.Column('content', sa.LargeBinary().with_variant(LONGBLOB, 'mysql'), nullable=False),
+            sa.Column('created_at', sa.DateTime()),
+            sa.UniqueConstraint('digest'),
+        )
+        op.create_index('ix_test_result_blobs_id', 'test_result_blobs', ['id'])
+
+    existing = {column['name'] for column in inspector.get_columns('test_results')}
+    for name, type_ in RESULT_COLUMNS:
+        if name not in existing:
+            op.add_column('test_results', sa.Column(name, type_))
+    if 'ix_test_results_response_digest' not in {index['name'] for index in inspector.get_indexes('test_results')}:
+        op.create_index('ix_test_results_response_digest', 'test_results', ['response_digest'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_test_results_response_digest', table_name='test_results')
+    for name, _ in reversed(RESULT_COLUMNS):
+        op.drop_column('test_results', name)
+    op.drop_table('test_result_blobs')
@@ -0,0 +1,40 @@
+"""工作流定义内容摘要
+
+Revision ID: 0005_workflow_definition_digest
+Revises: 0004_test_result_blobs
+Create Date: 2026-10-19
+
+- workflow_definitions 增加 definition_digest 列（定义正文的 SHA-256），用于判断已解析的工作流图是否过期
+- 回填已有定义的摘要
+"""
+import hashlib
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0005_workflow_definition_digest'
+down_revision = '0004_test_result_blobs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    # 已存在的列跳过，升级中断后可以重新执行
+    if 'definition_digest' not in {column['name'] for column in inspector.get_columns('workflow_definitions')}:
+        op.add_column('workflow_definitions', sa.Column('definition_digest', sa.String(64)))
+
+    rows = bind.execute(sa.text(
+        "SELECT id, definition FROM workflow_definitions WHERE definition_digest IS NULL"
+    )).all()
+    for row in rows:
+        bind.execute(
+            sa.text("UPDATE workflow_definitions SET definition_digest = :digest WHERE id = :id"),
+            {"digest": hashlib.sha256(row.definition.encode("utf-8")).hexdigest(), "id": row.id}
+        )
+
+
+def downgrade() -> None:
+    op.drop_column('workflow_definitions', 'definition_digest')
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, ForeignKey, JSON
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Text, Boolean, ForeignKey, JSON, UniqueConstraint, Index, LargeBinary
+from sqlalchemy.dialects.mysql import LONGBLOB
 from sqlalchemy.orm import relationship
 from core.database import Base
 from datetime import datetime
@@ -18,6 +19,9 @@ class Project(Base):
 # 测试用例表
 class TestCase(Base):
     __tablename__ = "testcases"
+    __table_args__ = (
+        Index('ix_testcases_project_protocol', 'project_id', 'protocol'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(100), nullable=False)
@@ -34,20 +38,66 @@ class TestCase(Base):
 # 测试结果表
 class TestResult(Base):
     __tablename__ = "test_results"
+    __table_args__ = (
+        Index('ix_test_results_testcase_executed', 'testcase_id', 'executed_at'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     testcase_id = Column(Integer, ForeignKey("testcases.id"))
     status = Column(String(20), nullable=False)  # success, fail, error
-    response_data = Column(JSON)
+    response_data = Column(JSON)  # 超过阈值的响应存入 test_result_blobs，此处为空
+    response_digest = Column(String(64), index=True)  # 外置响应的 SHA-256，对应 TestResultBlob.digest
+    response_size = Column(Integer)  # 外置响应序列化后的字节数
+    response_preview = Column(Text)  # 外置响应的截断预览
     execution_time = Column(Integer)  # 毫秒
     error_message = Column(Text)
-    executed_at = Column(DateTime, default=datetime.utcnow)
+    # MySQL 上按 executed_at 月度分区，主键为 (id, executed_at)，且不带外键约束（见迁移 0003）
+    executed_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     
     testcase = relationship("TestCase", back_populates="test_results")
 
+# 测试结果汇总表（按项目、用例、小时/天增量维护）
+class TestResultRollup(Base):
+    __tablename__ = "test_result_rollups"
+    __table_args__ = (
+        UniqueConstraint('project_id', 'testcase_id', 'granularity', 'bucket_start', name='uq_test_result_rollup'),
+        Index('ix_test_result_rollups_project_granularity_bucket', 'project_id', 'granularity', 'bucket_start'),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, nullable=False)
+    testcase_id = Column(Integer, nullable=False)
+    granularity = Column(String(10), nullable=False)  # hour, day
+    bucket_start = Column(DateTime, nullable=False)
+    total = Column(Integer, default=0)
+    passed = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    error = Column(Integer, default=0)
+    other = Column(Integer, default=0)
+    duration_count = Column(Integer, default=0)  # 有耗时记录的结果数
+    duration_sum = Column(BigInteger, default=0)  # 毫秒
+    duration_max = Column(Integer, default=0)
+    latency_buckets = Column(JSON)  # 耗时直方图，各桶计数
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# 测试结果响应内容表（按内容哈希去重，压缩存储）
+class TestResultBlob(Base):
+    __tablename__ = "test_result_blobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    digest = Column(String(64), nullable=False, unique=True)  # 未压缩内容的 SHA-256
+    codec = Column(String(10), nullable=False)  # zstd, zlib
+    size = Column(Integer, nullable=False)  # 原始字节数
+    compressed_size = Column(Integer, nullable=False)
+    content = Column(LargeBinary().with_variant(LONGBLOB, 'mysql'), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 # 版本需求关联表
 class VersionRequirement(Base):
     __tablename__ = "version_requirements"
+    __table_args__ = (
+        Index('ix_version_requirements_version_requirement', 'version_id', 'requirement_id'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     version_id = Column(Integer, ForeignKey("versions.id"), nullable=False)
@@ -106,6 +156,9 @@ class TestData(Base):
 # 需求管理表
 class Requirement(Base):
     __tablename__ = "requirements"
+    __table_args__ = (
+        Index('ix_requirements_project_status_priority', 'project_id', 'status', 'priority'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(200), nullable=False)
@@ -46,6 +46,7 @@ class HttpTestRequest(BaseModel):
     timeout: int = Field(default=30, ge=1, le=300)
     verify_ssl: bool = True
     follow_redirects: bool = True
+    testcase_id: Optional[int] = None  # 指定后执行结果会保存为该用例的测试结果
 
 class HttpTestResponse(BaseModel):
     status_code: int
@@ -62,6 +63,7 @@ class TcpTestRequest(BaseModel):
     data: str
     timeout: int = Field(default=30, ge=1, le=300)
     encoding: str = "utf-8"
+    testcase_id: Optional[int] = None  # 指定后执行结果会保存为该用例的测试结果
 
 class TcpTestResponse(BaseModel):
     success: bool
@@ -81,6 +83,7 @@ class MqTestRequest(BaseModel):
     mq_type: str = Field(..., pattern="^(rabbitmq|activemq|kafka)$")
     username: str = "guest"
     password: str = "guest"
+    testcase_id: Optional[int] = None  # 指定后执行结果会保存为该用例的测试结果
 
 class MqTestResponse(BaseModel):
     success: bool
@@ -121,6 +124,9 @@ class TestResultResponse(ORMModel):
     testcase_id: int
     status: str
     response_data: Optional[Dict[str, Any]]
+    response_digest: Optional[str] = None
+    response_size: Optional[int] = None
+    response_preview: Optional[str] = None
     execution_time: Optional[int]
     error_message: Optional[str]
     executed_at: datetime
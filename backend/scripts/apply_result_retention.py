@@ -0,0 +1,31 @@
+"""
+测试结果保留期清理
+
+归档并删除超过保留期的测试结果，分区表同时预建未来的月度分区，适合由定时任务每天执行。
+
+用法（在 backend 目录下执行）：
+    python scripts/apply_result_retention.py
+    python scripts/apply_result_retention.py --retention-months 12
+"""
+
+import os
+import sys
+import json
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import settings
+from services.result_retention import result_retention
+
+
+def main():
+    parser = argparse.ArgumentParser(description="测试结果保留期清理")
+    parser.add_argument("--retention-months", type=int, default=settings.test_result_retention_months,
+                        help="数据库中保留的月数，0 表示不删除")
+    args = parser.parse_args()
+    print(json.dumps(result_retention.apply_retention(args.retention_months), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
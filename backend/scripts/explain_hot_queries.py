@@ -0,0 +1,124 @@
+"""
+高频查询执行计划对比
+
+输出各高频查询的执行计划（EXPLAIN）和多次执行的耗时中位数，
+--compare 时先回退到基线版本测一次（其后的迁移会一并回退），再升级到最新版本测一次，
+便于确认组合索引是否生效。
+
+用法（在 backend 目录下执行）：
+    python scripts/explain_hot_queries.py
+    python scripts/explain_hot_queries.py --compare --runs 20
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, text
+from alembic import command
+
+from core.database import engine
+from core.migrations import alembic_config
+from models.database_models import TestCase, TestResult, Requirement, VersionRequirement, TestResultRollup
+from services.ai.rag_engine import DocumentEmbedding
+
+BASELINE_REVISION = "0001_baseline"
+
+
+def hot_queries(project_id: int, testcase_id: int, version_id: int, doc_id: str):
+    """与接口实际执行的查询保持一致"""
+    since = datetime.utcnow() - timedelta(days=30)
+    return {
+        "用例列表(项目+协议)": select(TestCase).where(
+            TestCase.project_id == project_id, TestCase.protocol == "http"
+        ),
+        # 只查询基线版本已有的列（不含 0004 增加的响应存储列），回退到基线后同样可以执行
+        "用例执行历史": select(
+            TestResult.id, TestResult.testcase_id, TestResult.status, TestResult.response_data,
+            TestResult.execution_time, TestResult.error_message, TestResult.executed_at
+        ).where(
+            TestResult.testcase_id == testcase_id
+        ).order_by(TestResult.executed_at.desc()).limit(20),
+        "需求筛选(项目+状态+优先级)": select(Requirement).where(
+            Requirement.project_id == project_id,
+            Requirement.status == "open",
+            Requirement.priority == "high"
+        ),
+        "版本需求关联": select(VersionRequirement.requirement_id).where(
+            VersionRequirement.version_id == version_id
+        ),
+        "趋势查询": select(TestResultRollup).where(
+            TestResultRollup.project_id == project_id,
+            TestResultRollup.granularity == "day",
+            TestResultRollup.bucket_start >= since
+        ).order_by(TestResultRollup.bucket_start),
+        "文档向量片段": select(DocumentEmbedding).where(DocumentEmbedding.doc_id == doc_id),
+    }
+
+
+def _explain_sql(sql: str) -> str:
+    if engine.dialect.name == "sqlite":
+        return f"EXPLAIN QUERY PLAN {sql}"
+    return f"EXPLAIN {sql}"
+
+
+def measure(queries, runs: int):
+    """返回 {查询名: (执行计划行, 耗时中位数ms)}"""
+    report = {}
+    # 迁移后重建连接，避免复用的连接沿用旧的表结构缓存
+    engine.dispose()
+    with engine.connect() as conn:
+        for name, query in queries.items():
+            sql = str(query.compile(engine, compile_kwargs={"literal_binds": True}))
+            plan = [tuple(row) for row in conn.execute(text(_explain_sql(sql)))]
+            timings = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                conn.execute(query).fetchall()
+                timings.append((time.perf_counter() - start) * 1000)
+            report[name] = (plan, statistics.median(timings))
+    return report
+
+
+def print_report(title: str, report):
+    print(f"\n===== {title} =====")
+    for name, (plan, median_ms) in report.items():
+        print(f"\n[{name}] 耗时中位数 {median_ms:.3f} ms")
+        for row in plan:
+            print("   ", row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="高频查询执行计划对比")
+    parser.add_argument("--compare", action="store_true", help="对比添加组合索引前后的执行计划")
+    parser.add_argument("--runs", type=int, default=10, help="每个查询的执行次数")
+    parser.add_argument("--project-id", type=int, default=1)
+    parser.add_argument("--testcase-id", type=int, default=1)
+    parser.add_argument("--version-id", type=int, default=1)
+    parser.add_argument("--doc-id", default="doc_1")
+    args = parser.parse_args()
+
+    queries = hot_queries(args.project_id, args.testcase_id, args.version_id, args.doc_id)
+    config = alembic_config()
+
+    if args.compare:
+        command.downgrade(config, BASELINE_REVISION)
+        before = measure(queries, args.runs)
+        command.upgrade(config, "head")
+        after = measure(queries, args.runs)
+        print_report("添加索引前", before)
+        print_report("添加索引后", after)
+        print("\n===== 耗时对比 =====")
+        for name in queries:
+            print(f"{name}: {before[name][1]:.3f} ms -> {after[name][1]:.3f} ms")
+    else:
+        print_report("当前版本", measure(queries, args.runs))
+
+
+if __name__ == "__main__":
+    main()
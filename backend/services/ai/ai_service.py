@@ -5,13 +5,18 @@ AI服务统一接口
 
 import json
 import asyncio
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, AsyncIterator
 import logging
 from datetime import datetime
 
+from config.settings import settings
 from .llm_client import llm_client
 from .rag_engine import rag_engine
 from .workflow_engine import workflow_engine
+from .workflow_events import workflow_events
+from .token_budget import fit_json, chunk_by_tokens
+from .json_extractor import extract_json, try_extract_json, IncrementalJSONExtractor, JSONExtractionError
+from .result_aggregator import aggregate_test_results
 from ..ai_generator import AITestCaseGenerator
 
 logger = logging.getLogger(__name__)
@@ -31,15 +36,7 @@ class AIService:
         """根据需求生成测试用例"""
         try:
             # 构建需求对象
-            from models.database_models import Requirement
-            requirement = Requirement(
-                title=requirement_data.get('title', ''),
-                description=requirement_data.get('description', ''),
-                priority=requirement_data.get('priority', 'medium'),
-                type=requirement_data.get('type', 'functional'),
-                acceptance_criteria=requirement_data.get('acceptance_criteria', ''),
-                business_value=requirement_data.get('business_value', '')
-            )
+            requirement = self._build_requirement(requirement_data)
             
             # 如果启用RAG，先获取相关知识
             context = ""
@@ -55,20 +52,24 @@ class AIService:
                 result = await llm_client.text_completion(
                     prompt=enhanced_prompt,
                     provider=provider,
-                    max_tokens=2000
+                    max_tokens=2000,
+                    json_mode=True,
+                    temperature=0,
+                    endpoint='generate_test_case'
                 )
                 
                 if result.get('success'):
                     try:
-                        test_case = json.loads(result['content'])
+                        test_case = extract_json(result['content'], expect=dict)
                         return {
                             'success': True,
                             'test_case': test_case,
-                            'provider': provider,
+                            'provider': result.get('provider', provider),
                             'used_rag': True,
-                            'context_sources': len(context.split('【')) - 1 if context else 0
+                            'context_sources': len(context.split('【')) - 1 if context else 0,
+                            'usage': result.get('usage', {})
                         }
-                    except json.JSONDecodeError:
+                    except JSONExtractionError:
                         logger.warning("AI返回的不是有效JSON，使用备用生成器")
                         # 使用备用生成器
                         return await self._fallback_generation(requirement, provider)
@@ -94,6 +95,90 @@ class AIService:
                 'error': str(e)
             }
     
+    async def stream_test_case_from_requirement(
+        self,
+        requirement_data: Dict[str, Any],
+        provider: str = "glm",
+        use_rag: bool = True
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """流式生成测试用例
+        
+        依次产出 context、delta（增量文本）和 done 事件；输出中的JSON对象一闭合就产出
+        test_case 事件。模型调用失败或结果不是有效JSON时，done 事件携带备用生成器的结果。
+        """
+        requirement = self._build_requirement(requirement_data)
+        
+        context = ""
+        if use_rag:
+            context = await rag_engine.get_context_for_query(
+                f"{requirement.title} {requirement.description}",
+                max_context_length=1500
+            )
+        yield {
+            'type': 'context',
+            'data': {
+                'used_rag': bool(context),
+                'context_sources': len(context.split('【')) - 1 if context else 0
+            }
+        }
+        
+        if context:
+            prompt = self._build_rag_enhanced_prompt(requirement, context)
+        else:
+            prompt = self.test_case_generator._build_requirement_prompt(requirement)
+        
+        extractor = IncrementalJSONExtractor(expect=dict)
+        # provider 可能是 auto，实际生成内容的提供商由路由器写入
+        served: Dict[str, Any] = {}
+        try:
+            async for chunk in llm_client.stream_text_completion(
+                prompt=prompt,
+                provider=provider,
+                max_tokens=2000,
+                json_mode=True,
+                temperature=0,
+                endpoint='stream_test_case',
+                served=served
+            ):
+                yield {'type': 'delta', 'data': {'content': chunk}}
+                for value in extractor.feed(chunk):
+                    if value is extractor.result:
+                        yield {'type': 'test_case', 'data': value}
+        except Exception as e:
+            logger.error(f"AI流式生成失败: {e}")
+            yield {'type': 'error', 'data': {'error': str(e)}}
+            yield {'type': 'done', 'data': await self._fallback_generation(requirement, provider)}
+            return
+        
+        try:
+            test_case = extractor.finish()
+        except JSONExtractionError:
+            logger.warning("AI返回的不是有效JSON，使用备用生成器")
+            yield {'type': 'done', 'data': await self._fallback_generation(requirement, provider)}
+            return
+        
+        yield {
+            'type': 'done',
+            'data': {
+                'success': True,
+                'test_case': test_case,
+                'provider': served.get('provider', provider),
+                'used_rag': bool(context)
+            }
+        }
+    
+    def _build_requirement(self, requirement_data: Dict[str, Any]):
+        """根据请求数据构建需求对象"""
+        from models.database_models import Requirement
+        return Requirement(
+            title=requirement_data.get('title', ''),
+            description=requirement_data.get('description', ''),
+            priority=requirement_data.get('priority', 'medium'),
+            type=requirement_data.get('type', 'functional'),
+            acceptance_criteria=requirement_data.get('acceptance_criteria', ''),
+            business_value=requirement_data.get('business_value', '')
+        )
+    
     def _build_rag_enhanced_prompt(self, requirement, context: str) -> str:
         """构建RAG增强的提示词"""
         return f"""
@@ -163,15 +248,78 @@ class AIService:
         test_results: List[Dict[str, Any]],
         provider: str = "glm"
     ) -> Dict[str, Any]:
-        """分析测试结果"""
+        """分析测试结果
+        
+        先在本地按状态、用例和错误特征聚合，只把聚合数据交给大模型。聚合数据超出token预算时
+        按失败模式分片并发分析（map），再将各分片结论汇总为最终分析（reduce）。
+        """
         try:
-            # 构建分析提示词
-            results_text = json.dumps(test_results, ensure_ascii=False, indent=2)
-            prompt = f"""
+            aggregated = aggregate_test_results(test_results)
+            budget = settings.LLM_ANALYSIS_INPUT_TOKENS
+            aggregated_text, input_info = fit_json(aggregated, budget)
+            
+            if not input_info['truncated'] or not aggregated['failure_modes']:
+                prompt = self._build_analysis_prompt(f"测试结果聚合数据：\n{aggregated_text}")
+                shard_count = 0
+                map_results = []
+            else:
+                shards = chunk_by_tokens(aggregated['failure_modes'], budget)
+                shard_count = min(len(shards), settings.LLM_ANALYSIS_MAX_SHARDS)
+                map_results = await asyncio.gather(*[
+                    self._analyze_shard(aggregated['overview'], shard, index, shard_count, provider)
+                    for index, shard in enumerate(shards[:shard_count], start=1)
+                ])
+                findings = [item['finding'] for item in map_results if item['success']]
+                if not findings:
+                    return {
+                        'success': False,
+                        'error': map_results[0].get('error') if map_results else '没有可分析的失败模式'
+                    }
+                
+                omitted = sum(len(shard) for shard in shards[shard_count:])
+                prompt = self._build_reduce_prompt(aggregated, findings, omitted, budget)
+                input_info = {'truncated': True, 'shards': shard_count, 'omitted_failure_modes': omitted}
+            
+            result = await llm_client.text_completion(
+                prompt=prompt,
+                provider=provider,
+                max_tokens=2000,
+                json_mode=True,
+                temperature=0,
+                endpoint='analyze_test_results'
+            )
+            
+            if result.get('success'):
+                response = {
+                    'success': True,
+                    'provider': result.get('provider', provider),
+                    'usage': self._merge_usage([result] + [item['result'] for item in map_results]),
+                    'input': input_info,
+                    'aggregation': {**aggregated['overview'], 'shards': shard_count}
+                }
+                analysis = try_extract_json(result['content'], expect=dict)
+                if analysis is None:
+                    return {**response, 'analysis': {'summary': result['content']}, 'raw_response': True}
+                return {**response, 'analysis': analysis}
+            else:
+                return {
+                    'success': False,
+                    'error': result.get('error')
+                }
+                
+        except Exception as e:
+            logger.error(f"分析测试结果失败: {e}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    def _build_analysis_prompt(self, data_section: str) -> str:
+        """构建测试结果分析提示词"""
+        return f"""
 作为测试分析专家，请分析以下测试结果并提供洞察：
 
-测试结果数据：
-{results_text}
+{data_section}
 
 请提供以下分析：
 1. 总体测试概况
@@ -190,40 +338,77 @@ class AIService:
   "trends": "趋势分析"
 }}
 """
-            
-            result = await llm_client.text_completion(
-                prompt=prompt,
-                provider=provider,
-                max_tokens=2000
-            )
-            
-            if result.get('success'):
-                try:
-                    analysis = json.loads(result['content'])
-                    return {
-                        'success': True,
-                        'analysis': analysis,
-                        'provider': provider
-                    }
-                except json.JSONDecodeError:
-                    return {
-                        'success': True,
-                        'analysis': {'summary': result['content']},
-                        'provider': provider,
-                        'raw_response': True
-                    }
-            else:
-                return {
-                    'success': False,
-                    'error': result.get('error')
-                }
-                
-        except Exception as e:
-            logger.error(f"分析测试结果失败: {e}")
-            return {
-                'success': False,
-                'error': str(e)
-            }
+    
+    async def _analyze_shard(
+        self,
+        overview: Dict[str, Any],
+        failure_modes: List[Dict[str, Any]],
+        index: int,
+        total: int,
+        provider: str
+    ) -> Dict[str, Any]:
+        """分析一组失败模式（map阶段）"""
+        prompt = f"""
+作为测试分析专家，以下是一次测试执行中按错误特征分组的第{index}/{total}组失败模式。
+
+测试概况：
+{json.dumps(overview, ensure_ascii=False)}
+
+失败模式（signature 为归一化后的错误特征，count 为出现次数）：
+{json.dumps(failure_modes, ensure_ascii=False)}
+
+请分析这组失败模式的根因和风险，以JSON格式返回：
+{{
+  "failure_analysis": "失败原因分析",
+  "root_causes": ["根因1", "根因2"],
+  "risk_assessment": "风险评估",
+  "recommendations": ["改进建议1", "改进建议2"]
+}}
+"""
+        result = await llm_client.text_completion(
+            prompt=prompt,
+            provider=provider,
+            max_tokens=1000,
+            json_mode=True,
+            temperature=0,
+            endpoint='analyze_test_results.map'
+        )
+        if not result.get('success'):
+            logger.warning(f"第{index}组失败模式分析失败: {result.get('error')}")
+            return {'success': False, 'error': result.get('error'), 'result': result}
+        
+        finding = try_extract_json(result['content'], expect=dict) or {'failure_analysis': result['content']}
+        finding['failure_modes'] = len(failure_modes)
+        finding['failures'] = sum(mode['count'] for mode in failure_modes)
+        return {'success': True, 'finding': finding, 'result': result}
+    
+    def _build_reduce_prompt(
+        self,
+        aggregated: Dict[str, Any],
+        findings: List[Dict[str, Any]],
+        omitted: int,
+        budget: int
+    ) -> str:
+        """构建汇总各分片结论的提示词（reduce阶段）"""
+        findings_text, _ = fit_json(findings, budget // 2)
+        testcases_text, _ = fit_json(aggregated['failing_testcases'], budget // 4)
+        omitted_note = f"另有{omitted}种低频失败模式未单独分析。\n" if omitted else ""
+        return self._build_analysis_prompt(
+            f"测试概况：\n{json.dumps(aggregated['overview'], ensure_ascii=False)}\n\n"
+            f"失败最多的用例：\n{testcases_text}\n\n"
+            f"各组失败模式的分析结论：\n{findings_text}\n{omitted_note}"
+            f"请综合以上分组结论给出整体分析。"
+        )
+    
+    @staticmethod
+    def _merge_usage(results: List[Dict[str, Any]]) -> Dict[str, int]:
+        """合并多次调用的token用量"""
+        usage = {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+        for result in results:
+            for key, value in (result.get('usage') or {}).items():
+                if key in usage:
+                    usage[key] += value
+        return usage
     
     async def generate_test_report(
         self, 
@@ -232,11 +417,12 @@ class AIService:
     ) -> Dict[str, Any]:
         """生成测试报告"""
         try:
+            execution_text, input_info = fit_json(execution_data, settings.LLM_ANALYSIS_INPUT_TOKENS)
             prompt = f"""
 作为测试报告专家，请根据以下测试执行数据生成专业的测试报告：
 
 执行数据：
-{json.dumps(execution_data, ensure_ascii=False, indent=2)}
+{execution_text}
 
 请生成包含以下内容的测试报告：
 1. 执行概况
@@ -259,22 +445,29 @@ class AIService:
             result = await llm_client.text_completion(
                 prompt=prompt,
                 provider=provider,
-                max_tokens=2000
+                max_tokens=2000,
+                json_mode=True,
+                temperature=0,
+                endpoint='generate_test_report'
             )
             
             if result.get('success'):
                 try:
-                    report = json.loads(result['content'])
+                    report = extract_json(result['content'], expect=dict)
                     return {
                         'success': True,
                         'report': report,
-                        'provider': provider
+                        'provider': result.get('provider', provider),
+                        'usage': result.get('usage', {}),
+                        'input': input_info
                     }
-                except json.JSONDecodeError:
+                except JSONExtractionError:
                     return {
                         'success': True,
                         'report': {'summary': result['content']},
-                        'provider': provider,
+                        'provider': result.get('provider', provider),
+                        'usage': result.get('usage', {}),
+                        'input': input_info,
                         'raw_response': True
                     }
             else:
@@ -456,6 +649,33 @@ class AIService:
         """获取工作流执行状态"""
         return workflow_engine.get_execution_status(execution_id)
     
+    def get_workflow_variable(self, execution_id: str, key: str) -> Dict[str, Any]:
+        """获取工作流执行变量"""
+        return workflow_engine.get_execution_variable(execution_id, key)
+    
+    async def stream_workflow_events(
+        self,
+        execution_id: str,
+        last_event_id: Optional[int] = None
+    ) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """订阅工作流执行事件
+        
+        当前进程没有该执行的事件时（已过期或在其他进程执行），
+        推送一次数据库中的状态快照后结束。
+        """
+        if not workflow_events.has_channel(execution_id):
+            status = await asyncio.to_thread(workflow_engine.get_execution_status, execution_id)
+            yield {
+                'id': 0,
+                'type': 'error' if 'error' in status else 'snapshot',
+                'execution_id': execution_id,
+                'data': status
+            }
+            return
+        
+        async for event in workflow_events.subscribe(execution_id, last_event_id):
+            yield event
+    
     def get_ai_status(self) -> Dict[str, Any]:
         """获取AI服务状态"""
         try:
@@ -483,7 +703,8 @@ class AIService:
                 },
                 'workflows': {
                     'count': len(workflows),
-                    'list': workflows
+                    'list': workflows,
+                    'cache': workflow_engine.get_cache_stats()
                 },
                 'timestamp': datetime.utcnow().isoformat()
             }
@@ -0,0 +1,187 @@
+"""
+批量测试用例生成
+将多个需求合并到一个提示词中并发调用大模型，按条目解析结果，只重试失败的条目
+"""
+
+import time
+import asyncio
+from typing import Dict, Any, List, Optional
+import logging
+
+from config.settings import settings
+from models.database_models import Requirement
+from .llm_client import llm_client
+from .json_extractor import try_extract_json
+from ..ai_generator import ai_generator
+
+logger = logging.getLogger(__name__)
+
+class BatchTestCaseGenerator:
+    """批量测试用例生成器"""
+
+    def _build_batch_prompt(self, requirements: List[Requirement]) -> str:
+        """构建多需求提示词，每个需求以序号标识，要求按序号返回"""
+        items = []
+        for index, requirement in enumerate(requirements, start=1):
+            items.append(f"""【需求{index}】
+- 标题：{requirement.title}
+- 描述：{requirement.description}
+- 优先级：{requirement.priority}
+- 类型：{requirement.type}
+- 验收标准：{requirement.acceptance_criteria}
+- 业务价值：{requirement.business_value}""")
+
+        return f"""
+作为专业的软件测试工程师，请为以下{len(requirements)}个需求分别生成一个详细的功能测试用例：
+
+{chr(10).join(items)}
+
+请返回JSON对象，test_cases 中每个需求对应一个元素，index 为需求序号：
+{{
+  "test_cases": [
+    {{
+      "index": 1,
+      "test_case": {{
+        "title": "测试用例标题",
+        "description": "测试用例描述",
+        "preconditions": "前置条件",
+        "test_steps": [
+          {{
+            "step": 1,
+            "action": "操作步骤",
+            "expected": "预期结果"
+          }}
+        ],
+        "test_data": "测试数据",
+        "priority": "高/中/低",
+        "expected_result": "预期结果",
+        "notes": "注意事项"
+      }}
+    }}
+  ]
+}}
+
+请确保测试步骤详细且可执行，覆盖正常流程和异常流程，并基于验收标准设计测试点。
+只返回JSON，不要包含其他文字。
+"""
+
+    def _parse_batch_result(self, content: str, size: int) -> Dict[int, Dict[str, Any]]:
+        """解析批量结果，返回 {序号: 测试用例}，缺失或格式错误的条目不包含在内"""
+        data = try_extract_json(content)
+        if isinstance(data, dict):
+            data = data.get('test_cases') or data.get('items') or []
+        if not isinstance(data, list):
+            return {}
+
+        parsed = {}
+        for position, item in enumerate(data, start=1):
+            if not isinstance(item, dict):
+                continue
+            test_case = item.get('test_case')
+            index = item.get('index', position)
+            if isinstance(index, str) and index.isdigit():
+                index = int(index)
+            if isinstance(test_case, dict) and isinstance(index, int) and 1 <= index <= size:
+                parsed[index] = test_case
+        return parsed
+
+    async def _generate_batch(
+        self,
+        requirements: List[Requirement],
+        provider: str,
+        semaphore: asyncio.Semaphore,
+        stats: Dict[str, Any]
+    ) -> Dict[int, Dict[str, Any]]:
+        """生成一批需求的测试用例，返回 {需求ID: 结果}"""
+        async with semaphore:
+            result = await llm_client.text_completion(
+                prompt=self._build_batch_prompt(requirements),
+                provider=provider,
+                max_tokens=settings.LLM_BATCH_ITEM_MAX_TOKENS * len(requirements),
+                json_mode=True,
+                temperature=0,
+                endpoint='batch_generation'
+            )
+        stats['llm_calls'] += 1
+
+        if not result.get('success'):
+            logger.warning(f"批量生成失败（{len(requirements)}个需求）: {result.get('error')}")
+            return {}
+
+        parsed = self._parse_batch_result(result['content'], len(requirements))
+        return {
+            requirements[index - 1].id: {
+                'testcase': test_case,
+                'source': 'llm',
+                'provider': result.get('provider', provider)
+            }
+            for index, test_case in parsed.items()
+        }
+
+    async def generate_for_requirements(
+        self,
+        requirements: List[Requirement],
+        provider: str = "glm",
+        batch_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        model: str = "glm-4.6"
+    ) -> Dict[str, Any]:
+        """为多个需求生成测试用例
+
+        需求按 batch_size 分组并发调用大模型（并发数受 concurrency 和提供商限流共同约束），
+        解析失败或缺失的条目逐个重试，重试后仍失败的条目使用备用生成器（model 指定其模型）。
+        返回结果与输入需求顺序一致。
+        """
+        batch_size = max(1, batch_size or settings.LLM_BATCH_SIZE)
+        semaphore = asyncio.Semaphore(max(1, concurrency or settings.LLM_BATCH_CONCURRENCY))
+        stats = {
+            'total': len(requirements),
+            'llm_calls': 0,
+            'retried': 0,
+            'fallback': 0
+        }
+        start = time.monotonic()
+        results: Dict[int, Dict[str, Any]] = {}
+
+        pending = list(requirements)
+        if llm_client.get_available_providers():
+            # 第一轮按批生成，之后只对失败的条目逐个重试
+            for attempt in range(settings.LLM_BATCH_MAX_RETRIES + 1):
+                if not pending:
+                    break
+                size = batch_size if attempt == 0 else 1
+                if attempt:
+                    stats['retried'] += len(pending)
+                batches = [pending[i:i + size] for i in range(0, len(pending), size)]
+                for batch_result in await asyncio.gather(*[
+                    self._generate_batch(batch, provider, semaphore, stats) for batch in batches
+                ]):
+                    results.update(batch_result)
+                pending = [requirement for requirement in pending if requirement.id not in results]
+
+        # 大模型不可用或多次失败的条目使用备用生成器
+        for requirement in pending:
+            results[requirement.id] = {
+                'testcase': await ai_generator.generate_test_case_from_requirement(requirement, model),
+                'source': 'fallback',
+                'provider': None
+            }
+        stats['fallback'] = len(pending)
+        stats['duration_seconds'] = round(time.monotonic() - start, 3)
+
+        logger.info(f"批量生成测试用例完成: {stats}")
+        return {
+            'success': True,
+            'results': [
+                {
+                    'requirement_id': requirement.id,
+                    'requirement_title': requirement.title,
+                    **results[requirement.id]
+                }
+                for requirement in requirements
+            ],
+            'stats': stats
+        }
+
+# 全局实例
+batch_generator = BatchTestCaseGenerator()
@@ -0,0 +1,267 @@
+"""
+条件表达式编译器
+将工作流决策条件一次性解析为闭包，仅支持白名单内的运算符和函数
+"""
+
+import ast
+import operator
+from functools import lru_cache
+from typing import Dict, Any, Callable, Mapping
+import logging
+
+logger = logging.getLogger(__name__)
+
+Evaluator = Callable[[Mapping[str, Any]], Any]
+
+class ConditionError(ValueError):
+    """条件表达式错误"""
+    pass
+
+# 白名单运算符
+_BIN_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+}
+
+_UNARY_OPS = {
+    ast.Not: operator.not_,
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+}
+
+_COMPARE_OPS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.In: lambda a, b: a in b,
+    ast.NotIn: lambda a, b: a not in b,
+    ast.Is: operator.is_,
+    ast.IsNot: operator.is_not,
+}
+
+# 白名单函数
+_FUNCTIONS = {
+    'len': len,
+    'str': lambda value='': _to_text(value),
+    'int': int,
+    'float': float,
+    'bool': bool,
+    'abs': abs,
+    'min': min,
+    'max': max,
+    'lower': lambda value: _to_text(value).lower(),
+    'upper': lambda value: _to_text(value).upper(),
+}
+
+# JSON风格的字面量
+_LITERAL_NAMES = {
+    'true': True,
+    'false': False,
+    'null': None,
+}
+
+# 字符串/列表运算结果的最大长度，避免构造超大对象
+_MAX_RESULT_LEN = 100000
+
+_SEQUENCE_TYPES = (str, list, tuple)
+
+def _check_length(length: int):
+    if length > _MAX_RESULT_LEN:
+        raise ConditionError("运算结果长度超出限制")
+
+def _to_text(value: Any) -> str:
+    # 容器转成字符串的长度无法在构造前限制（嵌套重复的元素会被逐个展开），只允许标量
+    if isinstance(value, (list, tuple, dict, set)):
+        raise ConditionError("str/lower/upper 不支持列表或字典参数")
+    return str(value)
+
+def _safe_mul(a: Any, b: Any) -> Any:
+    if isinstance(a, _SEQUENCE_TYPES) or isinstance(b, _SEQUENCE_TYPES):
+        seq, count = (a, b) if isinstance(a, _SEQUENCE_TYPES) else (b, a)
+        if not isinstance(count, int) or isinstance(count, bool):
+            raise ConditionError("重复次数必须是整数")
+        # 按结果长度限制，链式重复时每一步都会检查
+        _check_length(len(seq) * max(count, 0))
+    return a * b
+
+def _safe_add(a: Any, b: Any) -> Any:
+    if isinstance(a, _SEQUENCE_TYPES) and isinstance(b, _SEQUENCE_TYPES):
+        _check_length(len(a) + len(b))
+    return a + b
+
+def _safe_mod(a: Any, b: Any) -> Any:
+    # 字符串格式化可以通过宽度参数构造超大字符串，不允许使用
+    if isinstance(a, str):
+        raise ConditionError("不支持字符串格式化")
+    return a % b
+
+# 可能构造超大对象的运算替换为带长度检查的版本
+_GUARDED_OPS = {
+    operator.mul: _safe_mul,
+    operator.add: _safe_add,
+    operator.mod: _safe_mod,
+}
+
+class CompiledCondition:
+    """已编译的条件表达式"""
+
+    __slots__ = ('source', '_evaluator')
+
+    def __init__(self, source: str, evaluator: Evaluator):
+        self.source = source
+        self._evaluator = evaluator
+
+    def __call__(self, variables: Mapping[str, Any]) -> bool:
+        return bool(self._evaluator(variables))
+
+    def __repr__(self) -> str:
+        return f"CompiledCondition({self.source!r})"
+
+class _Compiler:
+    """AST到闭包的编译器"""
+
+    def compile(self, node: ast.AST) -> Evaluator:
+        method = getattr(self, f"_compile_{type(node).__name__}", None)
+        if method is None:
+            raise ConditionError(f"不支持的表达式语法: {type(node).__name__}")
+        return method(node)
+
+    def _compile_Expression(self, node: ast.Expression) -> Evaluator:
+        return self.compile(node.body)
+
+    def _compile_Constant(self, node: ast.Constant) -> Evaluator:
+        if not isinstance(node.value, (str, int, float, bool, type(None))):
+            raise ConditionError(f"不支持的常量类型: {type(node.value).__name__}")
+        value = node.value
+        return lambda variables: value
+
+    def _compile_Name(self, node: ast.Name) -> Evaluator:
+        name = node.id
+        if name in _LITERAL_NAMES:
+            value = _LITERAL_NAMES[name]
+            return lambda variables: value
+
+        def lookup(variables):
+            try:
+                return variables[name]
+            except KeyError:
+                raise ConditionError(f"未定义的变量: {name}")
+        return lookup
+
+    def _compile_List(self, node: ast.List) -> Evaluator:
+        items = [self.compile(elt) for elt in node.elts]
+        return lambda variables: [item(variables) for item in items]
+
+    def _compile_Tuple(self, node: ast.Tuple) -> Evaluator:
+        items = [self.compile(elt) for elt in node.elts]
+        return lambda variables: tuple(item(variables) for item in items)
+
+    def _compile_Subscript(self, node: ast.Subscript) -> Evaluator:
+        if isinstance(node.slice, ast.Slice):
+            raise ConditionError("不支持切片操作")
+        target = self.compile(node.value)
+        key = self.compile(node.slice)
+
+        def subscript(variables):
+            container = target(variables)
+            if not isinstance(container, (dict, list, tuple, str)):
+                raise ConditionError(f"不支持下标访问的类型: {type(container).__name__}")
+            return container[key(variables)]
+        return subscript
+
+    def _compile_BoolOp(self, node: ast.BoolOp) -> Evaluator:
+        values = [self.compile(value) for value in node.values]
+        if isinstance(node.op, ast.And):
+            def and_(variables):
+                result = True
+                for value in values:
+                    result = value(variables)
+                    if not result:
+                        return result
+                return result
+            return and_
+
+        def or_(variables):
+            result = False
+            for value in values:
+                result = value(variables)
+                if result:
+                    return result
+            return result
+        return or_
+
+    def _compile_UnaryOp(self, node: ast.UnaryOp) -> Evaluator:
+        op = _UNARY_OPS.get(type(node.op))
+        if op is None:
+            raise ConditionError(f"不支持的运算符: {type(node.op).__name__}")
+        operand = self.compile(node.operand)
+        return lambda variables: op(operand(variables))
+
+    def _compile_BinOp(self, node: ast.BinOp) -> Evaluator:
+        op = _BIN_OPS.get(type(node.op))
+        if op is None:
+            raise ConditionError(f"不支持的运算符: {type(node.op).__name__}")
+        op = _GUARDED_OPS.get(op, op)
+        left = self.compile(node.left)
+        right = self.compile(node.right)
+        return lambda variables: op(left(variables), right(variables))
+
+    def _compile_Compare(self, node: ast.Compare) -> Evaluator:
+        left = self.compile(node.left)
+        pairs = []
+        for op_node, comparator in zip(node.ops, node.comparators):
+            op = _COMPARE_OPS.get(type(op_node))
+            if op is None:
+                raise ConditionError(f"不支持的比较运算符: {type(op_node).__name__}")
+            pairs.append((op, self.compile(comparator)))
+
+        def compare(variables):
+            current = left(variables)
+            for op, comparator in pairs:
+                right = comparator(variables)
+                if not op(current, right):
+                    return False
+                current = right
+            return True
+        return compare
+
+    def _compile_Call(self, node: ast.Call) -> Evaluator:
+        if not isinstance(node.func, ast.Name) or node.func.id not in _FUNCTIONS:
+            raise ConditionError("仅支持调用白名单函数: " + ", ".join(sorted(_FUNCTIONS)))
+        if node.keywords:
+            raise ConditionError("不支持关键字参数")
+        func = _FUNCTIONS[node.func.id]
+        args = [self.compile(arg) for arg in node.args]
+
+        def call(variables):
+            result = func(*[arg(variables) for arg in args])
+            if isinstance(result, _SEQUENCE_TYPES):
+                _check_length(len(result))
+            return result
+        return call
+
+@lru_cache(maxsize=1024)
+def compile_condition(expression: str) -> CompiledCondition:
+    """编译条件表达式，结果按表达式文本缓存"""
+    source = (expression or '').strip()
+    if not source:
+        logger.warning("条件表达式为空，将始终返回False")
+        return CompiledCondition(source, lambda variables: False)
+
+    try:
+        tree = ast.parse(source, mode='eval')
+    except SyntaxError as e:
+        raise ConditionError(f"条件表达式语法错误: {e.msg}") from e
+
+    return CompiledCondition(source, _Compiler().compile(tree))
+
+def evaluate_condition(expression: str, variables: Dict[str, Any]) -> bool:
+    """编译并评估条件表达式"""
+    return compile_condition(expression)(variables)
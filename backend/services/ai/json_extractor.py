@@ -0,0 +1,179 @@
+"""
+结构化输出解析
+从大模型返回的文本中提取JSON：兼容markdown代码块、前后说明文字，并支持流式输出的增量解析
+"""
+
+import re
+import json
+from typing import Any, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# markdown代码块（```json ... ``` 或 ``` ... ```）
+_FENCE_PATTERN = re.compile(r"```[ \t]*(?:json|JSON)?[ \t]*\n?(.*?)```", re.S)
+
+_OPENERS = {'{': '}', '[': ']'}
+
+class JSONExtractionError(ValueError):
+    """无法从文本中提取JSON"""
+    pass
+
+def _scan_balanced(text: str, start: int) -> Optional[int]:
+    """从start处的括号开始扫描，返回匹配的闭括号位置（忽略字符串内的括号），未闭合时返回None"""
+    stack = []
+    in_string = False
+    escape = False
+    for index in range(start, len(text)):
+        char = text[index]
+        if in_string:
+            if escape:
+                escape = False
+            elif char == '\\':
+                escape = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in _OPENERS:
+            stack.append(_OPENERS[char])
+        elif char in '}]':
+            if not stack or stack.pop() != char:
+                return None
+            if not stack:
+                return index
+    return None
+
+def _iter_candidates(text: str):
+    """按优先级产出可能是JSON的片段：全文、代码块内容、括号平衡的片段"""
+    stripped = text.strip()
+    yield stripped
+    for match in _FENCE_PATTERN.finditer(text):
+        yield match.group(1).strip()
+
+    index = 0
+    while True:
+        positions = [pos for pos in (text.find('{', index), text.find('[', index)) if pos != -1]
+        if not positions:
+            return
+        start = min(positions)
+        end = _scan_balanced(text, start)
+        if end is not None:
+            yield text[start:end + 1]
+        index = start + 1
+
+def extract_json(text: str, expect: Optional[type] = None) -> Any:
+    """从大模型输出中提取第一个有效的JSON值
+
+    expect 为 dict 或 list 时只接受对应类型的值。无法提取时抛出 JSONExtractionError。
+    """
+    if not text:
+        raise JSONExtractionError("输出为空")
+
+    for candidate in _iter_candidates(text):
+        if not candidate or candidate[0] not in '{[':
+            continue
+        try:
+            value = json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+        if expect is None or isinstance(value, expect):
+            return value
+
+    raise JSONExtractionError(f"无法从输出中提取JSON: {text[:100]!r}")
+
+def try_extract_json(text: str, expect: Optional[type] = None) -> Optional[Any]:
+    """提取JSON，失败时返回None"""
+    try:
+        return extract_json(text, expect)
+    except JSONExtractionError:
+        return None
+
+class IncrementalJSONExtractor:
+    """流式输出的增量JSON解析器
+
+    逐段喂入文本，跟踪顶层括号的嵌套深度，顶层值一闭合就立即解析，
+    无需等待整个流结束，也不会对已扫描的内容重复扫描。
+    """
+
+    def __init__(self, expect: Optional[type] = None):
+        self.expect = expect
+        self._text = ''
+        self._pos = 0
+        self._start: Optional[int] = None
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self.values: List[Any] = []
+
+    @property
+    def text(self) -> str:
+        """已接收的全部文本"""
+        return self._text
+
+    @property
+    def result(self) -> Optional[Any]:
+        """第一个解析出的JSON值"""
+        return self.values[0] if self.values else None
+
+    def feed(self, chunk: str) -> List[Any]:
+        """喂入一段文本，返回本次新解析出的JSON值"""
+        self._text += chunk
+        found = []
+        text = self._text
+        while self._pos < len(text):
+            char = text[self._pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif self._start is None:
+                if char in _OPENERS:
+                    self._start = self._pos
+                    self._stack = [_OPENERS[char]]
+            elif char == '"':
+                self._in_string = True
+            elif char in _OPENERS:
+                self._stack.append(_OPENERS[char])
+            elif char in '}]':
+                if self._stack and self._stack[-1] == char:
+                    self._stack.pop()
+                    if not self._stack:
+                        value = self._parse(text[self._start:self._pos + 1])
+                        if value is not None:
+                            found.append(value)
+                            self._start = None
+                        else:
+                            self._restart()
+                else:
+                    self._restart()
+            self._pos += 1
+        self.values.extend(found)
+        return found
+
+    def _restart(self):
+        """当前片段括号不匹配或不是有效JSON，放弃它并从其起始位置之后重新寻找"""
+        self._pos = self._start
+        self._start = None
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+
+    def _parse(self, candidate: str) -> Optional[Any]:
+        try:
+            value = json.loads(candidate)
+        except json.JSONDecodeError:
+            return None
+        if self.expect is not None and not isinstance(value, self.expect):
+            return None
+        return value
+
+    def finish(self) -> Any:
+        """流结束后获取结果：优先使用增量解析结果，否则对全文做一次完整提取"""
+        if self.result is not None:
+            return self.result
+        return extract_json(self._text, self.expect)
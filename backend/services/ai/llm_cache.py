@@ -0,0 +1,189 @@
+"""
+大模型响应缓存
+按(提供商, 模型, 消息, 温度, 最大token数)精确匹配，内存LRU + SQLite磁盘两级存储
+"""
+
+import json
+import time
+import asyncio
+import hashlib
+import sqlite3
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Tuple, Iterator
+import logging
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+class LLMResponseCache:
+    """大模型响应缓存"""
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        max_entries: int = 1000,
+        ttl: int = 86400,
+        db_path: Optional[str] = None,
+        cache_nonzero_temperature: bool = False
+    ):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path or None
+        self.cache_nonzero_temperature = cache_nonzero_temperature
+        self._memory: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._db_ready = False
+        self._stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'bypassed': 0,
+            'stores': 0
+        }
+
+    @classmethod
+    def from_settings(cls) -> "LLMResponseCache":
+        """根据配置创建缓存"""
+        return cls(
+            enabled=settings.LLM_CACHE_ENABLED,
+            max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+            ttl=settings.LLM_CACHE_TTL,
+            db_path=settings.LLM_CACHE_DB_PATH,
+            cache_nonzero_temperature=settings.LLM_CACHE_NONZERO_TEMPERATURE
+        )
+
+    @staticmethod
+    def make_key(kind: str, provider: str, payload: Any, params: Dict[str, Any]) -> str:
+        """生成缓存键
+
+        payload 为消息列表或提示词，params 为模型、温度、最大token数等调用参数。
+        """
+        raw = json.dumps(
+            [kind, provider, payload, params],
+            ensure_ascii=False,
+            sort_keys=True,
+            default=str
+        )
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def should_cache(self, temperature: float, cache: Optional[bool] = None) -> bool:
+        """判断本次调用是否走缓存
+
+        cache 为 True/False 时强制使用/跳过缓存；为 None 时只缓存温度为0的确定性调用，
+        除非开启了 LLM_CACHE_NONZERO_TEMPERATURE。
+        """
+        if not self.enabled:
+            return False
+        if cache is not None:
+            use_cache = cache
+        else:
+            use_cache = not temperature or self.cache_nonzero_temperature
+        if not use_cache:
+            self._stats['bypassed'] += 1
+        return use_cache
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取缓存"""
+        entry = self._memory.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.time():
+                self._memory.move_to_end(key)
+                self._stats['memory_hits'] += 1
+                return value
+            del self._memory[key]
+
+        if self.db_path:
+            try:
+                entry = await asyncio.to_thread(self._disk_get, key)
+            except Exception as e:
+                logger.error(f"读取磁盘缓存失败: {e}")
+                entry = None
+            if entry is not None:
+                self._memory_set(key, entry[1], entry[0])
+                self._stats['disk_hits'] += 1
+                return entry[1]
+
+        self._stats['misses'] += 1
+        return None
+
+    async def set(self, key: str, value: Dict[str, Any]):
+        """写入缓存"""
+        expires_at = time.time() + self.ttl
+        self._memory_set(key, value, expires_at)
+        self._stats['stores'] += 1
+
+        if self.db_path:
+            try:
+                await asyncio.to_thread(self._disk_set, key, value, expires_at)
+            except Exception as e:
+                logger.error(f"写入磁盘缓存失败: {e}")
+
+    def clear(self):
+        """清空缓存"""
+        self._memory.clear()
+        if self.db_path:
+            try:
+                with self._connect() as conn:
+                    conn.execute("DELETE FROM llm_cache")
+            except Exception as e:
+                logger.error(f"清空磁盘缓存失败: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存命中统计"""
+        hits = self._stats['memory_hits'] + self._stats['disk_hits']
+        lookups = hits + self._stats['misses']
+        return {
+            'enabled': self.enabled,
+            'memory_entries': len(self._memory),
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+            'disk_enabled': bool(self.db_path),
+            **self._stats,
+            'hits': hits,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0
+        }
+
+    def _memory_set(self, key: str, value: Dict[str, Any], expires_at: float):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """打开SQLite连接，退出时提交并关闭"""
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        try:
+            if not self._db_ready:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_cache ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_expires ON llm_cache (expires_at)")
+                self._db_ready = True
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _disk_get(self, key: str) -> Optional[Tuple[float, Dict[str, Any]]]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, expires_at FROM llm_cache WHERE key = ? AND expires_at > ?",
+                (key, time.time())
+            ).fetchone()
+        if row is None:
+            return None
+        return row[1], json.loads(row[0])
+
+    def _disk_set(self, key: str, value: Dict[str, Any], expires_at: float):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False, default=str), expires_at)
+            )
+            # 顺带清理过期条目
+            conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),))
@@ -3,19 +3,105 @@
 支持多种AI模型的统一调用接口
 """
 
+import re
 import json
+import math
+import random
+import string
+import hashlib
+import time
 import asyncio
 import aiohttp
-from typing import Dict, Any, List, Optional
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, AsyncIterator, Mapping, Tuple
 from abc import ABC, abstractmethod
 import logging
 from config.settings import settings
+from .llm_cache import LLMResponseCache
+from .rate_limiter import ProviderLimiter
+from .llm_router import LLMRouter
+from .token_budget import estimate_tokens, estimate_prompt_tokens, truncate_text, normalize_usage, token_usage
 
 logger = logging.getLogger(__name__)
 
+# 提供商未指定温度时使用的默认值
+DEFAULT_TEMPERATURE = 0.7
+
+# 提供商未指定最大token数时使用的默认值
+DEFAULT_MAX_TOKENS = 2000
+
+# 可重试的HTTP状态码（限流和服务端错误）
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+
+class LLMProviderError(Exception):
+    """大模型提供商调用错误"""
+
+    def __init__(self, message: str, status: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+def _parse_retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """解析Retry-After响应头（秒数或HTTP日期），返回需要等待的秒数"""
+    value = headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+def _estimate_request_tokens(payload: Any, params: Dict[str, Any]) -> int:
+    """估算一次调用消耗的token数（提示词 + 最大生成长度），用于token限流预留"""
+    return estimate_prompt_tokens(payload) + params.get("max_tokens", DEFAULT_MAX_TOKENS)
+
+async def _iter_sse_data(response: aiohttp.ClientResponse) -> AsyncIterator[str]:
+    """逐行解析SSE响应，产出每条消息的data字段"""
+    async for raw_line in response.content:
+        line = raw_line.decode('utf-8').strip()
+        if not line.startswith('data:'):
+            continue
+        data = line[5:].strip()
+        if data == '[DONE]':
+            return
+        yield data
+
 class BaseLLMProvider(ABC):
     """大模型提供商基类"""
     
+    # 提供商独占的连接池会话，首次请求时创建
+    _session: Optional[aiohttp.ClientSession] = None
+    
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """获取长连接会话（连接复用、限制连接数、设置连接/读取超时）"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=settings.LLM_POOL_LIMIT,
+                keepalive_timeout=settings.LLM_KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=300
+            )
+            timeout = aiohttp.ClientTimeout(
+                total=None,
+                connect=settings.LLM_CONNECT_TIMEOUT,
+                sock_read=settings.LLM_READ_TIMEOUT
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self._session
+    
+    async def close(self):
+        """关闭连接池"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+    
     @abstractmethod
     async def chat_completion(self, messages: List[Dict], **kwargs) -> Dict[str, Any]:
         """聊天完成接口"""
@@ -25,6 +111,46 @@ class BaseLLMProvider(ABC):
     async def text_completion(self, prompt: str, **kwargs) -> Dict[str, Any]:
         """文本完成接口"""
         pass
+    
+    async def stream_chat_completion(self, messages: List[Dict], **kwargs) -> AsyncIterator[str]:
+        """流式聊天完成接口，逐段产出生成的文本
+        
+        默认实现等待完整结果后一次性产出，支持流式的提供商应覆盖此方法。
+        """
+        result = await self.chat_completion(messages, **kwargs)
+        if not result.get("success"):
+            raise LLMProviderError(
+                result.get("error", "Unknown error"), result.get("status"), result.get("retry_after")
+            )
+        yield result["content"]
+    
+    async def stream_text_completion(self, prompt: str, **kwargs) -> AsyncIterator[str]:
+        """流式文本完成接口"""
+        messages = [{"role": "user", "content": prompt}]
+        async for chunk in self.stream_chat_completion(messages, **kwargs):
+            yield chunk
+    
+    async def _stream_openai_compatible(
+        self,
+        url: str,
+        data: Dict[str, Any],
+        provider_name: str
+    ) -> AsyncIterator[str]:
+        """解析OpenAI兼容接口的流式响应（choices[0].delta.content）"""
+        session = await self._get_session()
+        async with session.post(url, json={**data, "stream": True}, headers=self.headers) as response:
+            if response.status != 200:
+                error_text = await response.text()
+                logger.error(f"{provider_name} API流式调用失败: {error_text}")
+                raise LLMProviderError(error_text, response.status, _parse_retry_after(response.headers))
+            
+            async for payload in _iter_sse_data(response):
+                chunk = json.loads(payload)
+                choices = chunk.get("choices") or []
+                if choices:
+                    content = (choices[0].get("delta") or {}).get("content")
+                    if content:
+                        yield content
 
 class OpenAIProvider(BaseLLMProvider):
     """OpenAI模型提供商"""
@@ -46,21 +172,41 @@ class OpenAIProvider(BaseLLMProvider):
             "temperature": kwargs.get("temperature", 0.7),
             "max_tokens": kwargs.get("max_tokens", 2000)
         }
+        if kwargs.get("json_mode"):
+            data["response_format"] = {"type": "json_object"}
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=data, headers=self.headers) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    return {
-                        "success": True,
-                        "content": result["choices"][0]["message"]["content"],
-                        "usage": result.get("usage", {}),
-                        "model": result["model"]
-                    }
-                else:
-                    error_text = await response.text()
-                    logger.error(f"OpenAI API调用失败: {error_text}")
-                    return {"success": False, "error": error_text}
+        session = await self._get_session()
+        async with session.post(url, json=data, headers=self.headers) as response:
+            if response.status == 200:
+                result = await response.json()
+                return {
+                    "success": True,
+                    "content": result["choices"][0]["message"]["content"],
+                    "usage": result.get("usage", {}),
+                    "model": result["model"]
+                }
+            else:
+                error_text = await response.text()
+                logger.error(f"OpenAI API调用失败: {error_text}")
+                return {
+                    "success": False,
+                    "error": error_text,
+                    "status": response.status,
+                    "retry_after": _parse_retry_after(response.headers)
+                }
+    
+    async def stream_chat_completion(self, messages: List[Dict], **kwargs) -> AsyncIterator[str]:
+        """OpenAI流式聊天完成"""
+        data = {
+            "model": kwargs.get("model", "gpt-3.5-turbo"),
+            "messages": messages,
+            "temperature": kwargs.get("temperature", 0.7),
+            "max_tokens": kwargs.get("max_tokens", 2000)
+        }
+        if kwargs.get("json_mode"):
+            data["response_format"] = {"type": "json_object"}
+        async for chunk in self._stream_openai_compatible(f"{self.base_url}/chat/completions", data, "OpenAI"):
+            yield chunk
     
     async def text_completion(self, prompt: str, **kwargs) -> Dict[str, Any]:
         """OpenAI文本完成"""
@@ -72,20 +218,25 @@ class OpenAIProvider(BaseLLMProvider):
             "max_tokens": kwargs.get("max_tokens", 2000)
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=data, headers=self.headers) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    return {
-                        "success": True,
-                        "content": result["choices"][0]["text"],
-                        "usage": result.get("usage", {}),
-                        "model": result["model"]
-                    }
-                else:
-                    error_text = await response.text()
-                    logger.error(f"OpenAI API调用失败: {error_text}")
-                    return {"success": False, "error": error_text}
+        session = await self._get_session()
+        async with session.post(url, json=data, headers=self.headers) as response:
+            if response.status == 200:
+                result = await response.json()
+                return {
+                    "success": True,
+                    "content": result["choices"][0]["text"],
+                    "usage": result.get("usage", {}),
+                    "model": result["model"]
+                }
+            else:
+                error_text = await response.text()
+                logger.error(f"OpenAI API调用失败: {error_text}")
+                return {
+                    "success": False,
+                    "error": error_text,
+                    "status": response.status,
+                    "retry_after": _parse_retry_after(response.headers)
+                }
 
 class GLMProvider(BaseLLMProvider):
     """智谱GLM模型提供商"""
@@ -107,21 +258,41 @@ class GLMProvider(BaseLLMProvider):
             "temperature": kwargs.get("temperature", 0.7),
             "max_tokens": kwargs.get("max_tokens", 2000)
         }
+        if kwargs.get("json_mode"):
+            data["response_format"] = {"type": "json_object"}
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=data, headers=self.headers) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    return {
-                        "success": True,
-                        "content": result["choices"][0]["message"]["content"],
-                        "usage": result.get("usage", {}),
-                        "model": result["model"]
-                    }
-                else:
-                    error_text = await response.text()
-                    logger.error(f"GLM API调用失败: {error_text}")
-                    return {"success": False, "error": error_text}
+        session = await self._get_session()
+        async with session.post(url, json=data, headers=self.headers) as response:
+            if response.status == 200:
+                result = await response.json()
+                return {
+                    "success": True,
+                    "content": result["choices"][0]["message"]["content"],
+                    "usage": result.get("usage", {}),
+                    "model": result["model"]
+                }
+            else:
+                error_text = await response.text()
+                logger.error(f"GLM API调用失败: {error_text}")
+                return {
+                    "success": False,
+                    "error": error_text,
+                    "status": response.status,
+                    "retry_after": _parse_retry_after(response.headers)
+                }
+    
+    async def stream_chat_completion(self, messages: List[Dict], **kwargs) -> AsyncIterator[str]:
+        """GLM流式聊天完成"""
+        data = {
+            "model": kwargs.get("model", "glm-4"),
+            "messages": messages,
+            "temperature": kwargs.get("temperature", 0.7),
+            "max_tokens": kwargs.get("max_tokens", 2000)
+        }
+        if kwargs.get("json_mode"):
+            data["response_format"] = {"type": "json_object"}
+        async for chunk in self._stream_openai_compatible(f"{self.base_url}/chat/completions", data, "GLM"):
+            yield chunk
     
     async def text_completion(self, prompt: str, **kwargs) -> Dict[str, Any]:
         """GLM文本完成"""
@@ -151,32 +322,221 @@ class TongyiProvider(BaseLLMProvider):
                 "max_tokens": kwargs.get("max_tokens", 2000)
             }
         }
+        if kwargs.get("json_mode"):
+            data["parameters"]["response_format"] = {"type": "json_object"}
+        
+        session = await self._get_session()
+        async with session.post(self.base_url, json=data, headers=self.headers) as response:
+            if response.status == 200:
+                result = await response.json()
+                return {
+                    "success": True,
+                    "content": result["output"]["choices"][0]["message"]["content"],
+                    "usage": result.get("usage", {}),
+                    "model": result["output"]["model"]
+                }
+            else:
+                error_text = await response.text()
+                logger.error(f"通义千问API调用失败: {error_text}")
+                return {
+                    "success": False,
+                    "error": error_text,
+                    "status": response.status,
+                    "retry_after": _parse_retry_after(response.headers)
+                }
+    
+    async def stream_chat_completion(self, messages: List[Dict], **kwargs) -> AsyncIterator[str]:
+        """通义千问流式聊天完成（增量输出模式）"""
+        data = {
+            "model": kwargs.get("model", "qwen-turbo"),
+            "input": {
+                "messages": messages
+            },
+            "parameters": {
+                "temperature": kwargs.get("temperature", 0.7),
+                "max_tokens": kwargs.get("max_tokens", 2000),
+                "result_format": "message",
+                "incremental_output": True
+            }
+        }
+        if kwargs.get("json_mode"):
+            data["parameters"]["response_format"] = {"type": "json_object"}
+        headers = {**self.headers, "X-DashScope-SSE": "enable"}
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(self.base_url, json=data, headers=self.headers) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    return {
-                        "success": True,
-                        "content": result["output"]["choices"][0]["message"]["content"],
-                        "usage": result.get("usage", {}),
-                        "model": result["output"]["model"]
-                    }
-                else:
-                    error_text = await response.text()
-                    logger.error(f"通义千问API调用失败: {error_text}")
-                    return {"success": False, "error": error_text}
+        session = await self._get_session()
+        async with session.post(self.base_url, json=data, headers=headers) as response:
+            if response.status != 200:
+                error_text = await response.text()
+                logger.error(f"通义千问API流式调用失败: {error_text}")
+                raise LLMProviderError(error_text, response.status, _parse_retry_after(response.headers))
+            
+            async for payload in _iter_sse_data(response):
+                chunk = json.loads(payload)
+                choices = (chunk.get("output") or {}).get("choices") or []
+                if choices:
+                    content = (choices[0].get("message") or {}).get("content")
+                    if content:
+                        yield content
     
     async def text_completion(self, prompt: str, **kwargs) -> Dict[str, Any]:
         """通义千问文本完成"""
         messages = [{"role": "user", "content": prompt}]
         return await self.chat_completion(messages, **kwargs)
 
+class MockProvider(BaseLLMProvider):
+    """离线模拟提供商，用于压测工作流、缓存和限流
+    
+    不访问网络，按配置的分布模拟响应延迟、流式输出速率以及错误/限流比例。
+    同一提示词总是得到相同内容；设置随机种子后延迟和错误序列也可复现。
+    """
+    
+    # 批量生成提示词中的需求标记
+    _BATCH_ITEM_PATTERN = re.compile(r"【需求(\d+)】")
+    
+    def __init__(
+        self,
+        latency_ms: float = 300,
+        latency_distribution: str = "lognormal",
+        latency_sigma: float = 0.5,
+        tokens_per_second: float = 50,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        retry_after: float = 1.0,
+        response_template: str = "",
+        seed: Optional[int] = None
+    ):
+        self.latency_ms = latency_ms
+        self.latency_distribution = latency_distribution
+        self.latency_sigma = latency_sigma
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.response_template = string.Template(response_template) if response_template else None
+        self._random = random.Random(seed)
+    
+    @classmethod
+    def from_settings(cls) -> "MockProvider":
+        """根据配置创建模拟提供商"""
+        return cls(
+            latency_ms=settings.LLM_MOCK_LATENCY_MS,
+            latency_distribution=settings.LLM_MOCK_LATENCY_DISTRIBUTION,
+            latency_sigma=settings.LLM_MOCK_LATENCY_SIGMA,
+            tokens_per_second=settings.LLM_MOCK_TOKENS_PER_SECOND,
+            error_rate=settings.LLM_MOCK_ERROR_RATE,
+            rate_limit_rate=settings.LLM_MOCK_RATE_LIMIT_RATE,
+            retry_after=settings.LLM_MOCK_RETRY_AFTER,
+            response_template=settings.LLM_MOCK_RESPONSE_TEMPLATE,
+            seed=settings.LLM_MOCK_SEED
+        )
+    
+    def _sample_latency(self) -> float:
+        """按配置的分布采样一次响应延迟（秒）"""
+        mean = self.latency_ms / 1000
+        if mean <= 0:
+            return 0.0
+        if self.latency_distribution == "constant":
+            return mean
+        if self.latency_distribution == "uniform":
+            return self._random.uniform(0, 2 * mean)
+        if self.latency_distribution == "exponential":
+            return self._random.expovariate(1 / mean)
+        # 对数正态分布：均值为 mean，sigma 越大长尾越明显
+        mu = math.log(mean) - self.latency_sigma ** 2 / 2
+        return self._random.lognormvariate(mu, self.latency_sigma)
+    
+    def _sample_error(self) -> Optional[Dict[str, Any]]:
+        """按配置的比例模拟限流或服务端错误"""
+        roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            return {"success": False, "error": "模拟限流", "status": 429, "retry_after": self.retry_after}
+        if roll < self.rate_limit_rate + self.error_rate:
+            return {"success": False, "error": "模拟服务端错误", "status": 500, "retry_after": None}
+        return None
+    
+    def _render(self, messages: List[Dict]) -> str:
+        """根据提示词生成确定性的内容"""
+        prompt = "".join(str(message.get("content", "")) for message in messages)
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8]
+        if self.response_template:
+            return self.response_template.safe_substitute(digest=digest, prompt=prompt, prompt_preview=prompt[:100])
+        
+        def test_case(suffix: str) -> Dict[str, Any]:
+            return {
+                "title": f"模拟测试用例{suffix}",
+                "description": f"由模拟提供商生成（{digest}）",
+                "preconditions": "系统正常运行",
+                "test_steps": [{"step": 1, "action": "执行主要功能", "expected": "功能按预期工作"}],
+                "test_data": "模拟测试数据",
+                "priority": "中",
+                "expected_result": "测试通过",
+                "notes": "mock"
+            }
+        
+        # 批量生成提示词按需求序号返回多条用例，便于压测批量解析
+        indexes = [int(index) for index in self._BATCH_ITEM_PATTERN.findall(prompt)]
+        if indexes:
+            content = {"test_cases": [{"index": index, "test_case": test_case(f"-{index}")} for index in indexes]}
+        else:
+            content = test_case("")
+        return json.dumps(content, ensure_ascii=False)
+    
+    def _usage(self, messages: List[Dict], content: str) -> Dict[str, int]:
+        prompt_tokens = estimate_prompt_tokens(messages)
+        completion_tokens = estimate_tokens(content)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+    
+    async def chat_completion(self, messages: List[Dict], **kwargs) -> Dict[str, Any]:
+        """模拟聊天完成：等待采样的延迟加上按输出速率计算的生成时间"""
+        await asyncio.sleep(self._sample_latency())
+        error = self._sample_error()
+        if error:
+            return error
+        
+        content = self._render(messages)
+        usage = self._usage(messages, content)
+        if self.tokens_per_second > 0:
+            await asyncio.sleep(usage["completion_tokens"] / self.tokens_per_second)
+        return {
+            "success": True,
+            "content": content,
+            "usage": usage,
+            "model": kwargs.get("model", "mock")
+        }
+    
+    async def stream_chat_completion(self, messages: List[Dict], **kwargs) -> AsyncIterator[str]:
+        """模拟流式聊天完成：首段延迟后按输出速率逐段产出"""
+        await asyncio.sleep(self._sample_latency())
+        error = self._sample_error()
+        if error:
+            raise LLMProviderError(error["error"], error["status"], error["retry_after"])
+        
+        content = self._render(messages)
+        # 每段约4个字符
+        for index in range(0, len(content), 4):
+            piece = content[index:index + 4]
+            if self.tokens_per_second > 0:
+                await asyncio.sleep(estimate_tokens(piece) / self.tokens_per_second)
+            yield piece
+    
+    async def text_completion(self, prompt: str, **kwargs) -> Dict[str, Any]:
+        """模拟文本完成"""
+        messages = [{"role": "user", "content": prompt}]
+        return await self.chat_completion(messages, **kwargs)
+
 class LLMClient:
     """大模型统一客户端"""
     
-    def __init__(self):
+    def __init__(self, cache: Optional[LLMResponseCache] = None):
         self.providers = {}
+        self.cache = cache if cache is not None else LLMResponseCache.from_settings()
+        self.limiters: Dict[str, ProviderLimiter] = {}
+        self._retry_stats = {"retries": 0, "gave_up": 0}
+        self.router = LLMRouter(self)
         self._init_providers()
     
     def _init_providers(self):
@@ -196,46 +556,316 @@ class LLMClient:
         if hasattr(settings, 'TONGYI_API_KEY') and settings.TONGYI_API_KEY:
             self.providers['tongyi'] = TongyiProvider(api_key=settings.TONGYI_API_KEY)
         
+        # 离线模拟提供商（压测用）
+        if settings.LLM_MOCK_ENABLED:
+            self.providers['mock'] = MockProvider.from_settings()
+        
+        # 每个提供商独立限流
+        self.limiters = {name: ProviderLimiter.from_settings(name) for name in self.providers}
+        
         logger.info(f"已初始化的大模型提供商: {list(self.providers.keys())}")
     
+    async def close(self):
+        """关闭所有提供商的连接池"""
+        for name, provider in self.providers.items():
+            try:
+                await provider.close()
+            except Exception as e:
+                logger.error(f"关闭模型提供商连接失败: {name} - {e}")
+    
     async def chat_completion(
         self, 
         messages: List[Dict], 
         provider: str = "glm",
+        cache: Optional[bool] = None,
+        endpoint: str = "default",
         **kwargs
     ) -> Dict[str, Any]:
-        """统一聊天完成接口"""
-        if provider not in self.providers:
-            return {
-                "success": False, 
-                "error": f"不支持的模型提供商: {provider}，可用提供商: {list(self.providers.keys())}"
-            }
+        """统一聊天完成接口
         
-        try:
-            return await self.providers[provider].chat_completion(messages, **kwargs)
-        except Exception as e:
-            logger.error(f"聊天完成调用失败: {e}")
-            return {"success": False, "error": str(e)}
+        provider: 首选提供商，失败时按 LLM_FAILOVER_ORDER 故障转移；auto 表示按近期表现自动选择。
+                  实际使用的提供商见返回结果中的 provider 字段
+        cache: True/False 强制使用/跳过响应缓存，None 按温度自动判断
+        endpoint: 调用方标识，用于按接口统计token用量
+        """
+        messages, estimated, truncated = self._fit_prompt(messages)
+        result = await self.router.complete("chat", provider, messages, kwargs, cache)
+        self._record_usage(endpoint, result, estimated, truncated)
+        return result
     
     async def text_completion(
         self, 
         prompt: str, 
         provider: str = "glm",
+        cache: Optional[bool] = None,
+        endpoint: str = "default",
         **kwargs
     ) -> Dict[str, Any]:
         """统一文本完成接口"""
-        if provider not in self.providers:
-            return {
-                "success": False, 
-                "error": f"不支持的模型提供商: {provider}，可用提供商: {list(self.providers.keys())}"
-            }
+        prompt, estimated, truncated = self._fit_prompt(prompt)
+        result = await self.router.complete("text", provider, prompt, kwargs, cache)
+        self._record_usage(endpoint, result, estimated, truncated)
+        return result
+    
+    def _fit_prompt(self, payload: Any) -> Tuple[Any, int, bool]:
+        """将超出 LLM_MAX_PROMPT_TOKENS 的提示词裁剪到预算内
+        
+        文本提示词保留首尾截去中间；消息列表只裁剪最长的一条消息。
+        返回 (提示词, 估算token数, 是否裁剪)。
+        """
+        budget = settings.LLM_MAX_PROMPT_TOKENS
+        estimated = estimate_prompt_tokens(payload)
+        if not budget or estimated <= budget:
+            return payload, estimated, False
         
+        if isinstance(payload, str):
+            payload = truncate_text(payload, budget)
+        else:
+            payload = [dict(message) for message in payload]
+            longest = max(payload, key=lambda message: len(str(message.get("content", ""))))
+            content = str(longest.get("content", ""))
+            longest["content"] = truncate_text(content, max(1, estimate_tokens(content) - (estimated - budget)))
+        
+        logger.warning(f"提示词约{estimated}个token，超出预算{budget}，已裁剪")
+        return payload, estimate_prompt_tokens(payload), True
+    
+    @staticmethod
+    def _record_usage(endpoint: str, result: Dict[str, Any], estimated: int, truncated: bool):
+        """记录成功调用的token用量"""
+        if result.get("success"):
+            token_usage.record(
+                endpoint,
+                result.get("provider"),
+                result.get("usage") or {},
+                estimated,
+                cached=result.get("cached", False),
+                truncated=truncated
+            )
+    
+    async def _complete(
+        self,
+        kind: str,
+        provider: str,
+        payload: Any,
+        params: Dict[str, Any],
+        cache: Optional[bool]
+    ) -> Dict[str, Any]:
+        """先查响应缓存，未命中时调用提供商并缓存成功结果"""
+        use_cache = self.cache.should_cache(params.get("temperature", DEFAULT_TEMPERATURE), cache)
+        if use_cache:
+            key = self.cache.make_key(kind, provider, payload, params)
+            cached = await self.cache.get(key)
+            if cached is not None:
+                return {**cached, "cached": True}
+        
+        result = await self._call_provider(kind, provider, payload, params)
+        
+        if use_cache and result.get("success"):
+            await self.cache.set(key, result)
+        return result
+    
+    async def _call_provider(
+        self,
+        kind: str,
+        provider: str,
+        payload: Any,
+        params: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """调用提供商接口
+        
+        调用前按提供商限流排队；遇到429/5xx或网络错误时指数退避重试，优先遵循Retry-After。
+        """
+        limiter = self.limiters[provider]
+        estimated_tokens = _estimate_request_tokens(payload, params)
+        attempt = 0
+        while True:
+            async with limiter.slot(estimated_tokens):
+                # 从限流器放行后开始计时，每次尝试单独计入提供商延迟
+                start = time.monotonic()
+                result = None
+                try:
+                    result = await self._call_provider_once(kind, provider, payload, params)
+                finally:
+                    # 归还多预留的token；对冲请求中落败的一方被取消时没有结果，预留的token全部归还
+                    limiter.tokens.refund(estimated_tokens - (self._used_tokens(result) if result else 0))
+                latency = time.monotonic() - start
+            self.router.record_attempt(provider, bool(result.get("success")), latency)
+            
+            if result.get("success"):
+                return result
+            retryable = result.get("status") in RETRYABLE_STATUS or result.get("retryable", False)
+            delay = self._retry_delay(limiter, result.get("status"), result.get("retry_after"), retryable, attempt)
+            if delay is None:
+                return result
+            attempt += 1
+            logger.warning(f"{provider} 调用失败（状态码: {result.get('status')}），{delay:.1f}秒后第{attempt}次重试")
+            await asyncio.sleep(delay)
+    
+    async def _call_provider_once(
+        self,
+        kind: str,
+        provider: str,
+        payload: Any,
+        params: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """单次调用提供商接口"""
         try:
-            return await self.providers[provider].text_completion(prompt, **kwargs)
+            if kind == "chat":
+                result = await self.providers[provider].chat_completion(payload, **params)
+            else:
+                result = await self.providers[provider].text_completion(payload, **params)
+            if result.get("success"):
+                result["usage"] = normalize_usage(result.get("usage"))
+            return result
+        except (asyncio.TimeoutError, aiohttp.ClientConnectionError) as e:
+            logger.error(f"{'聊天' if kind == 'chat' else '文本'}完成调用网络错误: {e!r}")
+            return {"success": False, "error": str(e) or type(e).__name__, "retryable": True}
         except Exception as e:
-            logger.error(f"文本完成调用失败: {e}")
+            logger.error(f"{'聊天' if kind == 'chat' else '文本'}完成调用失败: {e}")
             return {"success": False, "error": str(e)}
     
+    @staticmethod
+    def _used_tokens(result: Dict[str, Any]) -> int:
+        """从调用结果中读取实际消耗的token数，失败的调用按0计"""
+        if not result.get("success"):
+            return 0
+        return (result.get("usage") or {}).get("total_tokens", 0)
+    
+    def _retry_delay(
+        self,
+        limiter: ProviderLimiter,
+        status: Optional[int],
+        retry_after: Optional[float],
+        retryable: bool,
+        attempt: int
+    ) -> Optional[float]:
+        """计算下次重试前的等待秒数，不再重试时返回None"""
+        if not retryable:
+            return None
+        if attempt >= settings.LLM_MAX_RETRIES:
+            self._retry_stats["gave_up"] += 1
+            return None
+        
+        if retry_after is not None:
+            delay = min(retry_after, settings.LLM_RETRY_MAX_DELAY)
+        else:
+            # 指数退避加随机抖动，避免所有等待者同时重试
+            delay = min(settings.LLM_RETRY_MAX_DELAY, settings.LLM_RETRY_BASE_DELAY * 2 ** attempt)
+            delay *= random.uniform(0.5, 1.0)
+        
+        # 被限流时暂停该提供商的所有新请求，而不是只让当前请求等待
+        if status == 429:
+            limiter.block_for(delay)
+        self._retry_stats["retries"] += 1
+        return delay
+    
+    async def stream_chat_completion(
+        self,
+        messages: List[Dict],
+        provider: str = "glm",
+        cache: Optional[bool] = None,
+        endpoint: str = "default",
+        served: Optional[Dict[str, Any]] = None,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """统一流式聊天完成接口，逐段产出生成的文本，失败时抛出LLMProviderError
+        
+        产出第一段内容前失败时按候选顺序故障转移到其他提供商。
+        流式接口不返回用量，生成的token数按输出文本估算。
+        served 不为空时写入实际产出内容的提供商（provider 字段）。
+        """
+        messages, estimated, truncated = self._fit_prompt(messages)
+        chunks = []
+        # 故障转移后实际提供流式内容的提供商由路由器写入
+        served = {} if served is None else served
+        async for chunk in self.router.stream(provider, messages, kwargs, cache, served):
+            chunks.append(chunk)
+            yield chunk
+        
+        completion = estimate_tokens("".join(chunks))
+        self._record_usage(endpoint, {
+            "success": True,
+            "provider": served.get("provider", provider),
+            "usage": {"prompt_tokens": estimated, "completion_tokens": completion, "total_tokens": estimated + completion}
+        }, estimated, truncated)
+    
+    async def _stream_provider(
+        self,
+        provider: str,
+        messages: List[Dict],
+        kwargs: Dict[str, Any],
+        cache: Optional[bool]
+    ) -> AsyncIterator[str]:
+        """调用指定提供商的流式接口
+        
+        命中响应缓存时一次性产出缓存内容；流式结果完整结束后写入缓存。
+        """
+        use_cache = self.cache.should_cache(kwargs.get("temperature", DEFAULT_TEMPERATURE), cache)
+        if use_cache:
+            key = self.cache.make_key("chat", provider, messages, kwargs)
+            cached = await self.cache.get(key)
+            if cached is not None:
+                yield cached["content"]
+                return
+        
+        limiter = self.limiters[provider]
+        estimated_tokens = _estimate_request_tokens(messages, kwargs)
+        chunks = []
+        attempt = 0
+        while True:
+            try:
+                async with limiter.slot(estimated_tokens):
+                    try:
+                        async for chunk in self.providers[provider].stream_chat_completion(messages, **kwargs):
+                            chunks.append(chunk)
+                            yield chunk
+                    finally:
+                        # 归还多预留的token：产出内容前失败时全部归还，否则按已产出内容估算用量
+                        used = estimate_prompt_tokens(messages) + estimate_tokens("".join(chunks)) if chunks else 0
+                        limiter.tokens.refund(estimated_tokens - used)
+                break
+            except (LLMProviderError, asyncio.TimeoutError, aiohttp.ClientConnectionError) as e:
+                # 已经产出部分内容时无法透明重试
+                if chunks:
+                    raise
+                status = getattr(e, "status", None)
+                retryable = not isinstance(e, LLMProviderError) or status in RETRYABLE_STATUS
+                delay = self._retry_delay(limiter, status, getattr(e, "retry_after", None), retryable, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                logger.warning(f"{provider} 流式调用失败（状态码: {status}），{delay:.1f}秒后第{attempt}次重试")
+                await asyncio.sleep(delay)
+        
+        if use_cache:
+            # 与非流式调用共用缓存键，流式接口不返回用量，按文本估算后写入，命中时用量统计不为空
+            content = "".join(chunks)
+            prompt_tokens = estimate_prompt_tokens(messages)
+            completion_tokens = estimate_tokens(content)
+            await self.cache.set(key, {
+                "success": True,
+                "content": content,
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens
+                },
+                "model": kwargs.get("model")
+            })
+    
+    async def stream_text_completion(
+        self,
+        prompt: str,
+        provider: str = "glm",
+        cache: Optional[bool] = None,
+        served: Optional[Dict[str, Any]] = None,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """统一流式文本完成接口"""
+        messages = [{"role": "user", "content": prompt}]
+        async for chunk in self.stream_chat_completion(messages, provider=provider, cache=cache, served=served, **kwargs):
+            yield chunk
+    
     def get_available_providers(self) -> List[str]:
         """获取可用的模型提供商列表"""
         return list(self.providers.keys())
@@ -246,11 +876,23 @@ class LLMClient:
             return False
         
         try:
-            result = await self.text_completion("测试连接", provider=provider, max_tokens=10)
+            # 连接测试必须真实访问该提供商，不能使用缓存结果或故障转移
+            result = await self._complete("text", provider, "测试连接", {"max_tokens": 10}, False)
             return result.get("success", False)
         except Exception as e:
             logger.error(f"测试连接失败: {e}")
             return False
 
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取客户端运行指标"""
+        return {
+            "providers": self.get_available_providers(),
+            "cache": self.cache.get_stats(),
+            "rate_limits": {name: limiter.get_stats() for name, limiter in self.limiters.items()},
+            "retries": dict(self._retry_stats),
+            "routing": self.router.get_stats(),
+            "tokens": token_usage.get_stats()
+        }
+
 # 全局实例
 llm_client = LLMClient()
\ No newline at end of file
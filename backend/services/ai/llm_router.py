@@ -0,0 +1,280 @@
+"""
+大模型多提供商路由
+按近期延迟/错误率选择提供商，支持对冲请求（超过p95延迟后向第二个提供商发送副本）和按顺序故障转移
+"""
+
+import time
+import asyncio
+from collections import deque
+from typing import Dict, Any, List, Optional, AsyncIterator, Deque, TYPE_CHECKING
+import logging
+
+from config.settings import settings
+
+if TYPE_CHECKING:
+    from .llm_client import LLMClient
+
+logger = logging.getLogger(__name__)
+
+# 自动选择提供商
+AUTO_PROVIDER = "auto"
+
+# 离线模拟提供商，只在按名称指定或列入 LLM_FAILOVER_ORDER 时参与路由
+MOCK_PROVIDER = "mock"
+
+class ProviderHealth:
+    """单个提供商的近期表现"""
+
+    def __init__(self, alpha: float, window: int = 200):
+        self.alpha = alpha
+        self.latency_ewma: Optional[float] = None
+        self.error_ewma = 0.0
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.unavailable_until = 0.0
+        self.calls = 0
+        self.failures = 0
+
+    def record(self, success: bool, latency: Optional[float] = None):
+        """记录一次调用结果，latency 为完整调用耗时（流式调用不计入延迟统计）"""
+        self.calls += 1
+        self.error_ewma = self.alpha * (0.0 if success else 1.0) + (1 - self.alpha) * self.error_ewma
+        if success:
+            self.consecutive_failures = 0
+            if latency is None:
+                return
+            self.latencies.append(latency)
+            if self.latency_ewma is None:
+                self.latency_ewma = latency
+            else:
+                self.latency_ewma = self.alpha * latency + (1 - self.alpha) * self.latency_ewma
+            return
+
+        self.failures += 1
+        self.consecutive_failures += 1
+        # 连续失败达到阈值后暂时跳过该提供商
+        if self.consecutive_failures >= settings.LLM_ROUTER_FAILURE_THRESHOLD:
+            self.unavailable_until = time.monotonic() + settings.LLM_ROUTER_COOLDOWN
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self.unavailable_until
+
+    def p95(self) -> Optional[float]:
+        """近期成功调用的p95延迟，样本不足时返回None"""
+        if len(self.latencies) < settings.LLM_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def score(self) -> float:
+        """路由评分，越小越优先；没有样本的提供商评分为0，保证能被探测到"""
+        if self.latency_ewma is None:
+            return 0.0
+        return self.latency_ewma * (1 + 10 * self.error_ewma)
+
+    def get_stats(self) -> Dict[str, Any]:
+        p95 = self.p95()
+        return {
+            'calls': self.calls,
+            'failures': self.failures,
+            'latency_ewma': round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+            'error_ewma': round(self.error_ewma, 4),
+            'p95': round(p95, 3) if p95 is not None else None,
+            'available': self.available
+        }
+
+class LLMRouter:
+    """多提供商路由器"""
+
+    def __init__(self, client: "LLMClient"):
+        self.client = client
+        self.health: Dict[str, ProviderHealth] = {}
+        self._stats = {
+            'hedged': 0,
+            'hedge_wins': 0,
+            'failovers': 0
+        }
+
+    def _get_health(self, provider: str) -> ProviderHealth:
+        if provider not in self.health:
+            self.health[provider] = ProviderHealth(settings.LLM_ROUTER_EWMA_ALPHA)
+        return self.health[provider]
+
+    def candidates(self, provider: str) -> List[str]:
+        """按调用顺序返回候选提供商
+
+        指定了可用提供商时排在第一位，其余按 LLM_FAILOVER_ORDER 排列，
+        未列出的提供商按评分排在最后；provider 为 auto 时全部按评分排序。
+        模拟提供商不会被自动选中，也不作为转移或对冲的目标，除非列在 LLM_FAILOVER_ORDER 中。
+        暂时不可用的提供商排到末尾，作为最后的尝试。
+        """
+        available = self.client.get_available_providers()
+        routable = [
+            name for name in available
+            if name != MOCK_PROVIDER or name in settings.LLM_FAILOVER_ORDER
+        ]
+        ranked = sorted(routable, key=lambda name: self._get_health(name).score())
+
+        if provider == AUTO_PROVIDER:
+            ordered = ranked
+        else:
+            ordered = [provider] if provider in available else []
+            ordered += [name for name in settings.LLM_FAILOVER_ORDER if name in routable and name not in ordered]
+            ordered += [name for name in ranked if name not in ordered]
+
+        healthy = [name for name in ordered if self._get_health(name).available]
+        return healthy + [name for name in ordered if name not in healthy]
+
+    @staticmethod
+    def _params_for(name: str, requested: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """模型名称只对请求的提供商有效，转移到其他提供商时使用其默认模型"""
+        if name == requested or "model" not in params:
+            return params
+        return {key: value for key, value in params.items() if key != "model"}
+
+    def record_attempt(self, provider: str, success: bool, latency: Optional[float] = None):
+        """记录一次真实的提供商请求
+
+        latency 只包含请求本身的耗时，不含限流排队和重试退避，避免本地限流拉高提供商的延迟评分。
+        """
+        self._get_health(provider).record(success, latency)
+
+    async def _provider_call(
+        self,
+        kind: str,
+        name: str,
+        payload: Any,
+        params: Dict[str, Any],
+        cache: Optional[bool]
+    ) -> Dict[str, Any]:
+        # 延迟和成功率由 LLMClient 在每次实际请求时通过 record_attempt 记录，缓存命中不计入
+        result = await self.client._complete(kind, name, payload, params, cache)
+        return {**result, "provider": name}
+
+    async def complete(
+        self,
+        kind: str,
+        provider: str,
+        payload: Any,
+        params: Dict[str, Any],
+        cache: Optional[bool]
+    ) -> Dict[str, Any]:
+        """路由一次非流式调用
+
+        首选提供商超过其p95延迟仍未返回时，向下一个候选发送对冲请求并采用先返回的成功结果；
+        调用失败时按候选顺序故障转移，全部失败时返回最后一个错误。
+        """
+        candidates = self.candidates(provider)
+        if not candidates:
+            return {
+                "success": False,
+                "error": f"不支持的模型提供商: {provider}，可用提供商: {self.client.get_available_providers()}"
+            }
+
+        remaining = iter(candidates)
+        pending: Dict[asyncio.Task, str] = {}
+        hedged = False
+        last_result: Dict[str, Any] = {"success": False, "error": "所有模型提供商调用失败"}
+
+        def launch() -> Optional[str]:
+            name = next(remaining, None)
+            if name is not None:
+                task = asyncio.create_task(
+                    self._provider_call(kind, name, payload, self._params_for(name, provider, params), cache)
+                )
+                pending[task] = name
+            return name
+
+        first = primary = launch()
+        try:
+            while pending:
+                timeout = None
+                if settings.LLM_HEDGE_ENABLED and not hedged and len(candidates) > 1:
+                    p95 = self._get_health(primary).p95()
+                    if p95 is not None:
+                        timeout = max(p95, settings.LLM_HEDGE_MIN_DELAY)
+
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # 首选提供商超过p95仍未返回，发送对冲请求
+                    hedged = True
+                    name = launch()
+                    if name is not None:
+                        self._stats['hedged'] += 1
+                        logger.info(f"{primary} 超过p95延迟 {timeout:.2f}秒未返回，向 {name} 发送对冲请求")
+                    continue
+
+                for task in done:
+                    name = pending.pop(task)
+                    result = task.result()
+                    if result.get("success"):
+                        if name != first:
+                            self._stats['hedge_wins' if hedged else 'failovers'] += 1
+                        return result
+                    logger.warning(f"{name} 调用失败: {result.get('error')}")
+                    last_result = result
+
+                if not pending:
+                    name = launch()
+                    if name is not None:
+                        primary = name
+                        logger.info(f"故障转移到提供商: {name}")
+            return last_result
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def stream(
+        self,
+        provider: str,
+        messages: List[Dict],
+        params: Dict[str, Any],
+        cache: Optional[bool],
+        served: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[str]:
+        """路由一次流式调用，仅在产出第一段内容前故障转移
+
+        served 不为空时写入实际产出内容的提供商（provider 字段）。
+        """
+        candidates = self.candidates(provider)
+        if not candidates:
+            from .llm_client import LLMProviderError
+            raise LLMProviderError(
+                f"不支持的模型提供商: {provider}，可用提供商: {self.client.get_available_providers()}"
+            )
+
+        last_error: Optional[Exception] = None
+        for index, name in enumerate(candidates):
+            if index:
+                self._stats['failovers'] += 1
+                logger.info(f"流式调用故障转移到提供商: {name}")
+            health = self._get_health(name)
+            started = False
+            try:
+                async for chunk in self.client._stream_provider(
+                    name, messages, self._params_for(name, provider, params), cache
+                ):
+                    if not started:
+                        health.record(True)
+                        started = True
+                        if served is not None:
+                            served["provider"] = name
+                    yield chunk
+                return
+            except Exception as e:
+                if started:
+                    raise
+                health.record(False)
+                logger.warning(f"{name} 流式调用失败: {e}")
+                last_error = e
+        raise last_error
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取路由统计"""
+        return {
+            **self._stats,
+            'failover_order': list(settings.LLM_FAILOVER_ORDER),
+            'hedge_enabled': settings.LLM_HEDGE_ENABLED,
+            'providers': {name: health.get_stats() for name, health in self.health.items()}
+        }
@@ -6,12 +6,12 @@ RAG知识库引擎
 import json
 import asyncio
 import hashlib
+import threading
 from typing import List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass
 import logging
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Float, text
+from sqlalchemy import Column, Integer, String, Text, DateTime, Float, Index, text
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 from datetime import datetime
 import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
@@ -20,6 +20,7 @@ import jieba
 import re
 
 from config.settings import settings
+from core.database import engine as shared_engine, session_factory
 
 logger = logging.getLogger(__name__)
 Base = declarative_base()
@@ -51,6 +52,9 @@ class KnowledgeDocument(Base):
 class DocumentEmbedding(Base):
     """文档向量表"""
     __tablename__ = "document_embeddings"
+    __table_args__ = (
+        Index('ix_document_embeddings_doc_id', 'doc_id'),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     doc_id = Column(String(100), nullable=False)
@@ -63,15 +67,18 @@ class RAGEngine:
     """RAG知识库引擎"""
     
     def __init__(self):
-        self.engine = create_engine(settings.database_url)
-        Base.metadata.create_all(self.engine)
-        self.SessionLocal = sessionmaker(bind=self.engine)
+        # 使用全局共享的引擎和连接池，会话受 rag 子系统配额限制
+        # 表结构由数据库迁移（migrations/）创建
+        self.engine = shared_engine
+        self.SessionLocal = session_factory("rag")
         self.vectorizer = TfidfVectorizer(
             max_features=1000,
             stop_words=None,
             ngram_range=(1, 2)
         )
         self._fit_vectorizer = False
+        # 数据库操作在线程池中执行，向量化器的训练和使用需要互斥
+        self._vectorizer_lock = threading.Lock()
         self.document_cache = {}
         self._ensure_metadata_column()
 
@@ -151,46 +158,14 @@ class RAGEngine:
         """添加文档到知识库"""
         try:
             doc_id = self._generate_doc_id(title, content)
-            metadata = metadata or {}
             
-            # 检查文档是否已存在
-            with self.SessionLocal() as session:
-                existing_doc = session.query(KnowledgeDocument).filter(
-                    KnowledgeDocument.doc_id == doc_id
-                ).first()
-                
-                if existing_doc:
-                    logger.info(f"文档已存在: {doc_id}")
-                    return doc_id
-                
-                # 创建文档记录
-                doc = KnowledgeDocument(
-                    doc_id=doc_id,
-                    title=title,
-                    content=content,
-                    source=source,
-                    category=category,
-                    doc_metadata=json.dumps(metadata, ensure_ascii=False)
-                )
-                session.add(doc)
-                session.commit()
-                
-                # 文档分块并存储向量
-                chunks = self._chunk_document(content)
-                for i, chunk in enumerate(chunks):
-                    # 预处理文本
-                    processed_text = self._preprocess_text(chunk)
-                    
-                    # 存储文档块
-                    embedding_doc = DocumentEmbedding(
-                        doc_id=doc_id,
-                        chunk_index=i,
-                        chunk_content=chunk,
-                        embedding=""  # 后续会更新
-                    )
-                    session.add(embedding_doc)
-                
-                session.commit()
+            # 数据库操作放到线程池中执行，等待 rag 子系统配额时不阻塞事件循环
+            created = await asyncio.to_thread(
+                self._store_document, doc_id, title, content, source, category, metadata or {}
+            )
+            if not created:
+                logger.info(f"文档已存在: {doc_id}")
+                return doc_id
             
             # 更新向量化器
             await self._update_vectorizer()
@@ -202,31 +177,80 @@ class RAGEngine:
             logger.error(f"添加文档失败: {e}")
             raise
     
+    def _store_document(
+        self,
+        doc_id: str,
+        title: str,
+        content: str,
+        source: str,
+        category: str,
+        metadata: Dict[str, Any]
+    ) -> bool:
+        """保存文档及其分块，文档已存在时返回 False"""
+        with self.SessionLocal() as session:
+            # 检查文档是否已存在
+            existing_doc = session.query(KnowledgeDocument).filter(
+                KnowledgeDocument.doc_id == doc_id
+            ).first()
+            
+            if existing_doc:
+                return False
+            
+            # 创建文档记录
+            doc = KnowledgeDocument(
+                doc_id=doc_id,
+                title=title,
+                content=content,
+                source=source,
+                category=category,
+                doc_metadata=json.dumps(metadata, ensure_ascii=False)
+            )
+            session.add(doc)
+            session.commit()
+            
+            # 文档分块并存储向量
+            chunks = self._chunk_document(content)
+            for i, chunk in enumerate(chunks):
+                # 存储文档块
+                embedding_doc = DocumentEmbedding(
+                    doc_id=doc_id,
+                    chunk_index=i,
+                    chunk_content=chunk,
+                    embedding=""  # 后续会更新
+                )
+                session.add(embedding_doc)
+            
+            session.commit()
+        return True
+    
     async def _update_vectorizer(self):
         """更新向量化器"""
         try:
-            with self.SessionLocal() as session:
-                # 获取所有文档块
-                chunks = session.query(DocumentEmbedding.chunk_content).all()
-                texts = [self._preprocess_text(chunk[0]) for chunk in chunks]
-                
-                if texts:
-                    # 训练向量化器
+            await asyncio.to_thread(self._refit_vectorizer)
+        except Exception as e:
+            logger.error(f"更新向量化器失败: {e}")
+    
+    def _refit_vectorizer(self):
+        with self.SessionLocal() as session:
+            # 获取所有文档块
+            chunks = session.query(DocumentEmbedding.chunk_content).all()
+            texts = [self._preprocess_text(chunk[0]) for chunk in chunks]
+            
+            if texts:
+                # 训练向量化器
+                with self._vectorizer_lock:
                     self.vectorizer.fit(texts)
                     self._fit_vectorizer = True
                     
                     # 更新所有文档块的向量
                     embeddings = self.vectorizer.transform(texts).toarray()
-                    
-                    for i, embedding in enumerate(embeddings):
-                        chunk = chunks[i]
-                        chunk.embedding = json.dumps(embedding.tolist())
-                    
-                    session.commit()
-                    logger.info(f"更新了 {len(texts)} 个文档块的向量")
-                    
-        except Exception as e:
-            logger.error(f"更新向量化器失败: {e}")
+                
+                for i, embedding in enumerate(embeddings):
+                    chunk = chunks[i]
+                    chunk.embedding = json.dumps(embedding.tolist())
+                
+                session.commit()
+                logger.info(f"更新了 {len(texts)} 个文档块的向量")
     
     async def search(
         self, 
@@ -236,72 +260,76 @@ class RAGEngine:
     ) -> List[Dict[str, Any]]:
         """搜索相关文档"""
         try:
-            if not self._fit_vectorizer:
-                logger.warning("向量化器未训练，无法进行搜索")
-                return []
-            
-            # 预处理查询
-            processed_query = self._preprocess_text(query)
-            query_vector = self.vectorizer.transform([processed_query]).toarray()[0]
-            
-            with self.SessionLocal() as session:
-                # 获取所有文档块
-                chunks = session.query(DocumentEmbedding).all()
-                if category:
-                    # 过滤分类
-                    doc_ids = session.query(KnowledgeDocument.doc_id).filter(
-                        KnowledgeDocument.category == category
-                    ).all()
-                    doc_ids = [doc_id[0] for doc_id in doc_ids]
-                    chunks = [chunk for chunk in chunks if chunk.doc_id in doc_ids]
-                
-                # 计算相似度
-                results = []
-                for chunk in chunks:
-                    if chunk.embedding:
-                        chunk_vector = np.array(json.loads(chunk.embedding))
-                        similarity = cosine_similarity([query_vector], [chunk_vector])[0][0]
-                        
-                        results.append({
-                            'doc_id': chunk.doc_id,
-                            'chunk_index': chunk.chunk_index,
-                            'content': chunk.chunk_content,
-                            'similarity': float(similarity)
-                        })
-                
-                # 按相似度排序
-                results.sort(key=lambda x: x['similarity'], reverse=True)
-                
-                # 获取文档详细信息
-                top_results = results[:top_k]
-                doc_ids = list(set([result['doc_id'] for result in top_results]))
-                documents = session.query(KnowledgeDocument).filter(
-                    KnowledgeDocument.doc_id.in_(doc_ids)
-                ).all()
-                
-                doc_map = {doc.doc_id: doc for doc in documents}
-                
-                # 组装最终结果
-                final_results = []
-                for result in top_results:
-                    doc = doc_map.get(result['doc_id'])
-                    if doc:
-                        final_results.append({
-                            'doc_id': result['doc_id'],
-                            'title': doc.title,
-                            'content': result['content'],
-                            'source': doc.source,
-                            'category': doc.category,
-                            'metadata': json.loads(doc.doc_metadata) if doc.doc_metadata else {},
-                            'similarity': result['similarity']
-                        })
-                
-                return final_results
-                
+            # 向量计算和数据库查询放到线程池中执行，不阻塞事件循环
+            return await asyncio.to_thread(self._search, query, top_k, category)
         except Exception as e:
             logger.error(f"搜索失败: {e}")
             return []
     
+    def _search(self, query: str, top_k: int, category: Optional[str]) -> List[Dict[str, Any]]:
+        if not self._fit_vectorizer:
+            logger.warning("向量化器未训练，无法进行搜索")
+            return []
+        
+        # 预处理查询
+        processed_query = self._preprocess_text(query)
+        with self._vectorizer_lock:
+            query_vector = self.vectorizer.transform([processed_query]).toarray()[0]
+        
+        with self.SessionLocal() as session:
+            # 获取所有文档块
+            chunks = session.query(DocumentEmbedding).all()
+            if category:
+                # 过滤分类
+                doc_ids = session.query(KnowledgeDocument.doc_id).filter(
+                    KnowledgeDocument.category == category
+                ).all()
+                doc_ids = [doc_id[0] for doc_id in doc_ids]
+                chunks = [chunk for chunk in chunks if chunk.doc_id in doc_ids]
+            
+            # 计算相似度
+            results = []
+            for chunk in chunks:
+                if chunk.embedding:
+                    chunk_vector = np.array(json.loads(chunk.embedding))
+                    similarity = cosine_similarity([query_vector], [chunk_vector])[0][0]
+                    
+                    results.append({
+                        'doc_id': chunk.doc_id,
+                        'chunk_index': chunk.chunk_index,
+                        'content': chunk.chunk_content,
+                        'similarity': float(similarity)
+                    })
+            
+            # 按相似度排序
+            results.sort(key=lambda x: x['similarity'], reverse=True)
+            
+            # 获取文档详细信息
+            top_results = results[:top_k]
+            doc_ids = list(set([result['doc_id'] for result in top_results]))
+            documents = session.query(KnowledgeDocument).filter(
+                KnowledgeDocument.doc_id.in_(doc_ids)
+            ).all()
+            
+            doc_map = {doc.doc_id: doc for doc in documents}
+            
+            # 组装最终结果
+            final_results = []
+            for result in top_results:
+                doc = doc_map.get(result['doc_id'])
+                if doc:
+                    final_results.append({
+                        'doc_id': result['doc_id'],
+                        'title': doc.title,
+                        'content': result['content'],
+                        'source': doc.source,
+                        'category': doc.category,
+                        'metadata': json.loads(doc.doc_metadata) if doc.doc_metadata else {},
+                        'similarity': result['similarity']
+                    })
+            
+            return final_results
+    
     async def get_context_for_query(self, query: str, max_context_length: int = 2000) -> str:
         """为查询获取上下文"""
         search_results = await self.search(query, top_k=3)
@@ -0,0 +1,147 @@
+"""
+大模型调用限流器
+按提供商限制每分钟请求数、每分钟token数和并发数，超限的调用排队等待
+"""
+
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Dict, Any, AsyncIterator
+import logging
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """令牌桶，按分钟速率匀速补充"""
+
+    def __init__(self, rate_per_minute: int, capacity: int = None):
+        self.rate_per_minute = rate_per_minute
+        self.capacity = capacity or rate_per_minute
+        self.tokens = float(self.capacity)
+        self._fill_rate = rate_per_minute / 60.0
+        self._updated = time.monotonic()
+        # 锁保证等待者按先来先得的顺序获取令牌
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self._fill_rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1) -> float:
+        """获取令牌，返回等待的秒数"""
+        if self.rate_per_minute <= 0:
+            return 0.0
+
+        # 单次请求超过桶容量时按容量计，避免永远等待
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) / self._fill_rate
+                await asyncio.sleep(delay)
+                waited += delay
+
+    def refund(self, amount: float):
+        """归还多预留的令牌"""
+        if self.rate_per_minute <= 0 or amount <= 0:
+            return
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    @property
+    def available(self) -> float:
+        self._refill()
+        return self.tokens
+
+class ProviderLimiter:
+    """单个提供商的限流器（请求数/分钟、token数/分钟、并发数）"""
+
+    def __init__(self, name: str, rpm: int, tpm: int, max_concurrency: int):
+        self.name = name
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency > 0 else None
+        self._blocked_until = 0.0
+        self.waiting = 0
+        self.active = 0
+        self._stats = {
+            'requests': 0,
+            'throttled': 0,
+            'total_wait_seconds': 0.0,
+            'backoffs': 0
+        }
+
+    @classmethod
+    def from_settings(cls, name: str) -> "ProviderLimiter":
+        """根据配置创建限流器，LLM_RATE_LIMITS 中的提供商配置覆盖默认值"""
+        overrides = settings.LLM_RATE_LIMITS.get(name, {})
+        return cls(
+            name=name,
+            rpm=overrides.get('rpm', settings.LLM_DEFAULT_RPM),
+            tpm=overrides.get('tpm', settings.LLM_DEFAULT_TPM),
+            max_concurrency=overrides.get('concurrency', settings.LLM_MAX_CONCURRENCY)
+        )
+
+    def block_for(self, seconds: float):
+        """暂停该提供商的所有新请求（收到429/Retry-After时调用）"""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        self._stats['backoffs'] += 1
+
+    @asynccontextmanager
+    async def slot(self, estimated_tokens: int = 0) -> AsyncIterator[None]:
+        """占用一个调用名额，名额不足时排队等待"""
+        self.waiting += 1
+        start = time.monotonic()
+        acquired = False
+        try:
+            if self._semaphore:
+                await self._semaphore.acquire()
+                acquired = True
+
+            blocked = self._blocked_until - time.monotonic()
+            if blocked > 0:
+                await asyncio.sleep(blocked)
+            await self.requests.acquire(1)
+            await self.tokens.acquire(estimated_tokens)
+        except BaseException:
+            if acquired:
+                self._semaphore.release()
+            raise
+        finally:
+            self.waiting -= 1
+
+        waited = time.monotonic() - start
+        self._stats['requests'] += 1
+        self._stats['total_wait_seconds'] += waited
+        if waited > 0.01:
+            self._stats['throttled'] += 1
+
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            if self._semaphore:
+                self._semaphore.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取限流器状态"""
+        return {
+            'queue_depth': self.waiting,
+            'active': self.active,
+            'max_concurrency': self.max_concurrency,
+            'rpm': self.requests.rate_per_minute,
+            'tpm': self.tokens.rate_per_minute,
+            'available_requests': round(self.requests.available, 2),
+            'available_tokens': round(self.tokens.available),
+            'blocked_for_seconds': round(max(0.0, self._blocked_until - time.monotonic()), 2),
+            **{k: round(v, 3) if isinstance(v, float) else v for k, v in self._stats.items()}
+        }
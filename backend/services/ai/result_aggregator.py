@@ -0,0 +1,164 @@
+"""
+测试结果聚合
+在本地按用例、状态和错误特征对测试结果分组计数，只将聚合后的数据交给大模型分析
+"""
+
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Any, List, Optional
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 视为通过的状态
+PASS_STATUSES = ('passed', 'success', 'pass')
+
+# 视为失败的状态（error 单独统计）
+FAIL_STATUSES = ('failed', 'fail', 'failure')
+
+# 错误特征归一化规则：将随执行变化的部分替换为占位符，使同类错误归为一组
+_SIGNATURE_RULES = [
+    (re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}', re.I), '<uuid>'),
+    (re.compile(r'\b0x[0-9a-f]+\b', re.I), '<hex>'),
+    (re.compile(r'\d{4}-\d{2}-\d{2}[ t]\d{2}:\d{2}:\d{2}(\.\d+)?', re.I), '<time>'),
+    (re.compile(r'https?://\S+'), '<url>'),
+    (re.compile(r'(["\']).*?\1'), '<str>'),
+    (re.compile(r'\d+(\.\d+)?'), '<n>'),
+    (re.compile(r'\s+'), ' '),
+]
+
+# 错误特征的最大长度
+_SIGNATURE_LENGTH = 160
+
+# 每个错误特征保留的用例示例数
+_SIGNATURE_EXAMPLES = 5
+
+def error_signature(message: Optional[str]) -> Optional[str]:
+    """将错误信息归一化为错误特征"""
+    if not message:
+        return None
+    signature = str(message).strip().splitlines()[0] if str(message).strip() else ''
+    for pattern, replacement in _SIGNATURE_RULES:
+        signature = pattern.sub(replacement, signature)
+    return signature.strip()[:_SIGNATURE_LENGTH] or None
+
+def normalize_status(status: Any) -> str:
+    """统一状态写法：不同来源的状态大小写不一，缺失时记为 unknown"""
+    return str(status or 'unknown').lower()
+
+def _field(result: Dict[str, Any], *names: str) -> Any:
+    for name in names:
+        value = result.get(name)
+        if value not in (None, ''):
+            return value
+    return None
+
+def _percentiles(values: List[float]) -> Dict[str, Any]:
+    if not values:
+        return {}
+    array = np.asarray(values, dtype=float)
+    p50, p90, p99 = np.percentile(array, [50, 90, 99])
+    return {
+        'count': int(array.size),
+        'mean': round(float(array.mean()), 2),
+        'p50': round(float(p50), 2),
+        'p90': round(float(p90), 2),
+        'p99': round(float(p99), 2),
+        'max': round(float(array.max()), 2)
+    }
+
+def aggregate_test_results(test_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """聚合测试结果
+
+    兼容不同来源的字段名：用例（testcase_id/testcase_name/name/title）、状态（status）、
+    错误信息（error_message/error）、耗时毫秒（execution_time/duration）。
+    返回总体概况、耗时分位数、按错误特征分组的失败模式，以及有失败记录的用例。
+    """
+    status_counts: Counter = Counter()
+    durations: List[float] = []
+    durations_by_status: Dict[str, List[float]] = defaultdict(list)
+    testcases: Dict[str, Dict[str, Any]] = {}
+    signatures: Dict[str, Dict[str, Any]] = {}
+
+    for result in test_results:
+        if not isinstance(result, dict):
+            continue
+        status = normalize_status(result.get('status'))
+        testcase = str(_field(result, 'testcase_name', 'name', 'title', 'testcase_id', 'id') or 'unknown')
+        duration = _field(result, 'execution_time', 'duration')
+        passed = status in PASS_STATUSES
+
+        status_counts[status] += 1
+        if isinstance(duration, (int, float)):
+            durations.append(duration)
+            durations_by_status[status].append(duration)
+
+        case = testcases.setdefault(testcase, {'testcase': testcase, 'runs': 0, 'failures': 0, 'statuses': Counter()})
+        case['runs'] += 1
+        case['statuses'][status] += 1
+        if passed:
+            continue
+        case['failures'] += 1
+
+        message = _field(result, 'error_message', 'error')
+        signature = error_signature(message) or f"<{status}: 无错误信息>"
+        group = signatures.setdefault(signature, {
+            'signature': signature,
+            'count': 0,
+            'statuses': Counter(),
+            'testcases': Counter(),
+            'example': str(message)[:300] if message else None
+        })
+        group['count'] += 1
+        group['statuses'][status] += 1
+        group['testcases'][testcase] += 1
+
+    total = sum(status_counts.values())
+    passed_total = sum(status_counts[status] for status in PASS_STATUSES)
+
+    failure_modes = sorted(signatures.values(), key=lambda group: group['count'], reverse=True)
+    failing_cases = sorted(
+        (case for case in testcases.values() if case['failures']),
+        key=lambda case: case['failures'],
+        reverse=True
+    )
+
+    return {
+        'overview': {
+            'total': total,
+            'status_counts': dict(status_counts),
+            'pass_rate': round(passed_total / total, 4) if total else 0.0,
+            'testcases': len(testcases),
+            'failing_testcases': len(failing_cases),
+            'failure_modes': len(failure_modes),
+            'duration_ms': _percentiles(durations),
+            'duration_ms_by_status': {
+                status: _percentiles(values) for status, values in durations_by_status.items()
+            }
+        },
+        'failure_modes': [
+            {
+                'signature': group['signature'],
+                'count': group['count'],
+                'statuses': dict(group['statuses']),
+                'affected_testcases': len(group['testcases']),
+                'top_testcases': [name for name, _ in group['testcases'].most_common(_SIGNATURE_EXAMPLES)],
+                'example': group['example']
+            }
+            for group in failure_modes
+        ],
+        'failing_testcases': [
+            {
+                'testcase': case['testcase'],
+                'runs': case['runs'],
+                'failures': case['failures'],
+                'failure_rate': round(case['failures'] / case['runs'], 4),
+                # 同一用例既有通过又有失败，可能是不稳定用例
+                'flaky': case['failures'] < case['runs'],
+                'statuses': dict(case['statuses'])
+            }
+            for case in failing_cases
+        ]
+    }
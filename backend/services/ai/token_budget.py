@@ -0,0 +1,198 @@
+"""
+Token估算与预算
+本地估算提示词token数，将超出预算的输入裁剪到限额内，并按接口/提供商统计token用量
+"""
+
+import json
+import math
+from collections import defaultdict
+from typing import Dict, Any, List, Tuple, Union
+import logging
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # 未安装tiktoken或无法加载编码表时使用启发式估算
+    _encoding = None
+
+logger = logging.getLogger(__name__)
+
+# 每条聊天消息的格式开销
+_MESSAGE_OVERHEAD = 4
+
+# 单个字符串字段在压缩阶段保留的最大字符数
+_MAX_FIELD_CHARS = 500
+
+def _is_cjk(char: str) -> bool:
+    code = ord(char)
+    return (
+        0x4E00 <= code <= 0x9FFF      # 中日韩统一表意文字
+        or 0x3400 <= code <= 0x4DBF   # 扩展A
+        or 0x3000 <= code <= 0x303F   # 中文标点
+        or 0xFF00 <= code <= 0xFFEF   # 全角字符
+    )
+
+def estimate_tokens(text: str) -> int:
+    """估算文本的token数
+
+    安装了tiktoken时使用cl100k_base编码精确计数；否则中文字符按每字1个token、
+    其余字符按每4个字符1个token估算（对主流模型的中文分词略偏保守）。
+    """
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    cjk = sum(1 for char in text if _is_cjk(char))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+def estimate_prompt_tokens(payload: Union[str, List[Dict[str, Any]]]) -> int:
+    """估算提示词或消息列表的token数"""
+    if isinstance(payload, str):
+        return estimate_tokens(payload)
+    return sum(estimate_tokens(str(message.get("content", ""))) + _MESSAGE_OVERHEAD for message in payload)
+
+def truncate_text(text: str, max_tokens: int) -> str:
+    """将文本裁剪到max_tokens以内，保留开头和结尾（提示词的说明和输出格式通常位于两端）"""
+    total = estimate_tokens(text)
+    if total <= max_tokens:
+        return text
+
+    # 按token比例换算保留的字符数（预留省略标记的空间），中英文密度不均时逐步收缩
+    marker = f"\n...（已省略约{total - max_tokens}个token）...\n"
+    keep_chars = int(len(text) * max(0, max_tokens - 20) / total)
+    while keep_chars > 0:
+        head = keep_chars * 2 // 3
+        tail = keep_chars - head
+        candidate = text[:head] + marker + (text[-tail:] if tail else "")
+        if estimate_tokens(candidate) <= max_tokens:
+            return candidate
+        keep_chars = int(keep_chars * 0.85)
+    return marker
+
+def _shorten(value: Any, max_chars: int) -> Any:
+    """递归截断过长的字符串字段"""
+    if isinstance(value, str) and len(value) > max_chars:
+        return value[:max_chars] + f"...（共{len(value)}字符）"
+    if isinstance(value, dict):
+        return {key: _shorten(item, max_chars) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_shorten(item, max_chars) for item in value]
+    return value
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+
+def fit_json(value: Any, max_tokens: int) -> Tuple[str, Dict[str, Any]]:
+    """将数据序列化为紧凑JSON并裁剪到预算内
+
+    依次尝试：紧凑序列化 → 截断过长字符串字段 → （列表）均匀抽样保留部分条目 → 文本截断。
+    返回 (JSON文本, 裁剪信息)。
+    """
+    text = _dumps(value)
+    info = {"original_tokens": estimate_tokens(text), "truncated": False}
+    if info["original_tokens"] <= max_tokens:
+        info["tokens"] = info["original_tokens"]
+        return text, info
+
+    info["truncated"] = True
+    value = _shorten(value, _MAX_FIELD_CHARS)
+    text = _dumps(value)
+
+    if isinstance(value, list) and value and estimate_tokens(text) > max_tokens:
+        info["original_items"] = len(value)
+        # 按平均条目大小估算可保留的条目数，再逐步收缩直到满足预算
+        keep = max(1, int(len(value) * max_tokens / estimate_tokens(text)))
+        while True:
+            step = len(value) / keep
+            sample = [value[int(i * step)] for i in range(keep)]
+            text = _dumps(sample)
+            if keep == 1 or estimate_tokens(text) <= max_tokens:
+                break
+            keep = max(1, int(keep * 0.8))
+        info["kept_items"] = keep
+
+    if estimate_tokens(text) > max_tokens:
+        text = truncate_text(text, max_tokens)
+
+    info["tokens"] = estimate_tokens(text)
+    logger.info(f"输入超出token预算，已裁剪: {info}")
+    return text, info
+
+def chunk_by_tokens(items: List[Any], max_tokens: int) -> List[List[Any]]:
+    """按token预算将条目依次装入分片，单个超出预算的条目独占一个分片"""
+    chunks: List[List[Any]] = []
+    current: List[Any] = []
+    current_tokens = 0
+    for item in items:
+        tokens = estimate_tokens(_dumps(item)) + 1
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append(current)
+            current, current_tokens = [], 0
+        current.append(item)
+        current_tokens += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+def normalize_usage(usage: Dict[str, Any]) -> Dict[str, int]:
+    """统一各提供商的用量字段（OpenAI/GLM: prompt/completion_tokens，通义: input/output_tokens）"""
+    usage = usage or {}
+    prompt = usage.get("prompt_tokens", usage.get("input_tokens", 0)) or 0
+    completion = usage.get("completion_tokens", usage.get("output_tokens", 0)) or 0
+    return {
+        "prompt_tokens": prompt,
+        "completion_tokens": completion,
+        "total_tokens": usage.get("total_tokens") or prompt + completion
+    }
+
+class TokenUsageTracker:
+    """按接口和提供商统计token用量"""
+
+    def __init__(self):
+        self._counters: Dict[Tuple[str, str], Dict[str, int]] = defaultdict(lambda: {
+            "calls": 0,
+            "cached_calls": 0,
+            "truncated_calls": 0,
+            "estimated_prompt_tokens": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "total_tokens": 0
+        })
+
+    def record(
+        self,
+        endpoint: str,
+        provider: str,
+        usage: Dict[str, int],
+        estimated_prompt_tokens: int,
+        cached: bool = False,
+        truncated: bool = False
+    ):
+        """记录一次调用的用量，缓存命中的调用不计入实际用量"""
+        counter = self._counters[(endpoint, provider or "unknown")]
+        counter["calls"] += 1
+        counter["estimated_prompt_tokens"] += estimated_prompt_tokens
+        if truncated:
+            counter["truncated_calls"] += 1
+        if cached:
+            counter["cached_calls"] += 1
+            return
+        for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+            counter[key] += usage.get(key, 0)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取用量统计"""
+        by_endpoint: Dict[str, Dict[str, Any]] = {}
+        totals = defaultdict(int)
+        for (endpoint, provider), counter in self._counters.items():
+            by_endpoint.setdefault(endpoint, {})[provider] = dict(counter)
+            for key, value in counter.items():
+                totals[key] += value
+        return {
+            "tokenizer": "tiktoken" if _encoding is not None else "heuristic",
+            "totals": dict(totals),
+            "endpoints": by_endpoint
+        }
+
+# 全局实例
+token_usage = TokenUsageTracker()
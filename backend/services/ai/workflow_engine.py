@@ -5,19 +5,25 @@ Workflow引擎
 
 import json
 import asyncio
+import hashlib
+import time
 import uuid
-from typing import Dict, Any, List, Optional, Callable, Union
+from collections import deque
+from typing import Dict, Any, List, Optional, Callable, Union, Deque
 from dataclasses import dataclass, field
 from enum import Enum
 from datetime import datetime
 import logging
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, UniqueConstraint
+from sqlalchemy.dialects.mysql import LONGTEXT
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 
 from config.settings import settings
+from core.database import engine as shared_engine, session_factory
 from .llm_client import llm_client
 from .rag_engine import rag_engine
+from .workflow_events import workflow_events
+from .condition_evaluator import compile_condition, CompiledCondition
 
 logger = logging.getLogger(__name__)
 Base = declarative_base()
@@ -38,27 +44,86 @@ class NodeType(Enum):
     DECISION = "decision"
     PARALLEL = "parallel"
     WAIT = "wait"
+    MAP = "map"
+
+class HistoryMode(Enum):
+    """上下文历史记录策略"""
+    FULL = "full"          # 记录完整变量值
+    SUMMARY = "summary"    # 仅记录类型、大小和摘要
+    NONE = "none"          # 不记录历史
+
+# 变量溢出存储后在上下文中保留的占位标记
+SPILLED_MARKER = "__spilled__"
+
+def _dump_value(value: Any) -> str:
+    """将变量值序列化为JSON字符串"""
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+def _summarize_value(payload: str, value: Any) -> Dict[str, Any]:
+    """生成变量值的摘要信息"""
+    data = payload.encode('utf-8')
+    return {
+        'type': type(value).__name__,
+        'size': len(data),
+        'digest': hashlib.sha256(data).hexdigest()[:16]
+    }
+
+def _definition_digest(text: str) -> str:
+    """工作流定义正文的SHA-256摘要"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
 
 @dataclass
 class WorkflowContext:
     """工作流上下文"""
     workflow_id: str
     variables: Dict[str, Any] = field(default_factory=dict)
-    history: List[Dict[str, Any]] = field(default_factory=list)
+    history: Deque[Dict[str, Any]] = field(default_factory=deque)
     current_node: Optional[str] = None
     status: TaskStatus = TaskStatus.PENDING
     start_time: Optional[datetime] = None
     end_time: Optional[datetime] = None
+    history_mode: HistoryMode = field(
+        default_factory=lambda: HistoryMode(settings.WORKFLOW_HISTORY_MODE)
+    )
+    history_limit: int = field(default_factory=lambda: settings.WORKFLOW_HISTORY_MAX_ENTRIES)
+    event_listener: Optional[Callable[[str, Dict[str, Any]], None]] = field(default=None, repr=False)
+    
+    def __post_init__(self):
+        # 历史记录使用环形缓冲区，超出容量时自动丢弃最早的记录
+        self.history = deque(self.history, maxlen=self.history_limit or None)
+    
+    def emit(self, event_type: str, data: Dict[str, Any]):
+        """向事件监听器推送事件"""
+        if self.event_listener:
+            try:
+                self.event_listener(event_type, data)
+            except Exception as e:
+                logger.error(f"推送工作流事件失败: {e}")
     
     def set_variable(self, key: str, value: Any):
         """设置变量"""
         self.variables[key] = value
-        self.history.append({
-            'timestamp': datetime.utcnow().isoformat(),
-            'action': 'set_variable',
-            'key': key,
-            'value': value
-        })
+        if self.history_mode == HistoryMode.NONE and not self.event_listener:
+            return
+        
+        summary = None
+        if self.history_mode != HistoryMode.FULL or self.event_listener:
+            summary = _summarize_value(_dump_value(value), value)
+        
+        if self.history_mode != HistoryMode.NONE:
+            entry = {
+                'timestamp': datetime.utcnow().isoformat(),
+                'action': 'set_variable',
+                'key': key
+            }
+            if self.history_mode == HistoryMode.FULL:
+                entry['value'] = value
+            else:
+                entry.update(summary)
+            self.history.append(entry)
+        
+        if self.event_listener:
+            self.emit('variable_set', {'key': key, **summary})
     
     def get_variable(self, key: str, default: Any = None) -> Any:
         """获取变量"""
@@ -73,6 +138,18 @@ class WorkflowNode:
     config: Dict[str, Any] = field(default_factory=dict)
     next_nodes: List[str] = field(default_factory=list)
     condition: Optional[str] = None
+    compiled_condition: Optional[CompiledCondition] = field(default=None, repr=False, compare=False)
+
+@dataclass
+class CompiledWorkflow:
+    """已解析的工作流图（节点、编译后的条件和任务实例）"""
+    workflow_id: str
+    definition_digest: Optional[str]
+    start_node: Optional[str]
+    nodes: Dict[str, WorkflowNode]
+    tasks: Dict[str, 'WorkflowTask']
+    subgraphs: Dict[str, 'CompiledWorkflow'] = field(default_factory=dict)  # MAP节点的子图
+    loaded_at: float = field(default_factory=time.monotonic)
 
 class WorkflowDefinition(Base):
     """工作流定义表"""
@@ -83,6 +160,7 @@ class WorkflowDefinition(Base):
     name = Column(String(200), nullable=False)
     description = Column(Text)
     definition = Column(Text, nullable=False)  # JSON格式的工作流定义
+    definition_digest = Column(String(64))  # 定义正文的SHA-256，判断已解析的工作流图是否过期
     version = Column(String(20), default="1.0")
     active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -103,6 +181,22 @@ class WorkflowExecution(Base):
     end_time = Column(DateTime)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class WorkflowVariableBlob(Base):
+    """工作流大变量存储表"""
+    __tablename__ = "workflow_variable_blobs"
+    __table_args__ = (
+        UniqueConstraint('execution_id', 'var_key', name='uq_workflow_variable_blob'),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    execution_id = Column(String(100), nullable=False)
+    var_key = Column(String(200), nullable=False)
+    value = Column(Text().with_variant(LONGTEXT, 'mysql'), nullable=False)  # JSON格式的变量值
+    size = Column(Integer, nullable=False)
+    digest = Column(String(64), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class WorkflowTask:
     """工作流任务基类"""
     
@@ -131,6 +225,7 @@ class LLMTask(WorkflowTask):
             prompt=prompt,
             provider=provider,
             model=model,
+            endpoint='workflow',
             **config.get('llm_params', {})
         )
         
@@ -193,48 +288,59 @@ class DecisionTask(WorkflowTask):
     
     async def execute(self, context: WorkflowContext) -> Dict[str, Any]:
         """执行决策任务"""
-        config = self.node.config
-        condition = config.get('condition', '')
-        
-        # 评估条件
+        # 条件在解析工作流定义时已编译，这里只做兜底编译
         try:
-            result = self._evaluate_condition(condition, context.variables)
-            context.set_variable(f"{self.node.id}_decision", result)
-            return {'success': True, 'decision': result}
+            condition = self.node.compiled_condition or compile_condition(
+                self.node.config.get('condition') or self.node.condition or ''
+            )
         except Exception as e:
-            logger.error(f"条件评估失败: {e}")
+            logger.error(f"条件编译失败: {e}")
             return {'success': False, 'error': str(e)}
-    
-    def _evaluate_condition(self, condition: str, variables: Dict[str, Any]) -> bool:
-        """评估条件表达式"""
-        # 简单的条件评估实现
-        # 在实际项目中可以使用更安全的表达式引擎
+        
+        # 评估条件
         try:
-            # 创建安全的执行环境
-            safe_vars = {k: v for k, v in variables.items() if isinstance(v, (str, int, float, bool))}
-            return eval(condition, {"__builtins__": {}}, safe_vars)
+            result = condition(context.variables)
         except Exception as e:
             logger.error(f"条件评估错误: {e}")
-            return False
+            result = False
+        
+        context.set_variable(f"{self.node.id}_decision", result)
+        return {'success': True, 'decision': result}
 
 class WorkflowEngine:
     """工作流引擎"""
     
     def __init__(self):
-        self.engine = create_engine(settings.database_url)
-        Base.metadata.create_all(self.engine)
-        self.SessionLocal = sessionmaker(bind=self.engine)
+        # 使用全局共享的引擎和连接池，会话受 workflow 子系统配额限制
+        # 表结构由数据库迁移（migrations/）创建
+        self.engine = shared_engine
+        self.SessionLocal = session_factory("workflow")
         self.task_registry = {
             NodeType.TASK: LLMTask,
             'llm': LLMTask,
             'rag': RAGTask,
             NodeType.DECISION: DecisionTask,
+            'decision': DecisionTask,
         }
         self.running_workflows = {}
+        self._workflow_cache: Dict[str, CompiledWorkflow] = {}
+        self._cache_stats = {'hits': 0, 'misses': 0, 'reloads': 0}
     
     def register_task(self, task_type: str, task_class: type):
-        """注册任务类型"""
+        """注册任务类型
+        
+        任务实例随工作流图缓存并在多次执行间复用，任务类不应在实例上保存执行状态。
+        """
         self.task_registry[task_type] = task_class
+        # 已缓存的任务实例可能使用了旧的任务类
+        self.invalidate_workflow_cache()
+    
+    def invalidate_workflow_cache(self, workflow_id: Optional[str] = None):
+        """清除工作流图缓存"""
+        if workflow_id is None:
+            self._workflow_cache.clear()
+        else:
+            self._workflow_cache.pop(workflow_id, None)
     
     async def create_workflow(
         self, 
@@ -245,34 +351,45 @@ class WorkflowEngine:
     ) -> bool:
         """创建工作流定义"""
         try:
-            with self.SessionLocal() as session:
-                # 检查是否已存在
-                existing = session.query(WorkflowDefinition).filter(
-                    WorkflowDefinition.workflow_id == workflow_id
-                ).first()
-                
-                if existing:
-                    # 更新现有工作流
-                    existing.definition = json.dumps(definition, ensure_ascii=False)
-                    existing.updated_at = datetime.utcnow()
-                else:
-                    # 创建新工作流
-                    workflow_def = WorkflowDefinition(
-                        workflow_id=workflow_id,
-                        name=name,
-                        description=description,
-                        definition=json.dumps(definition, ensure_ascii=False)
-                    )
-                    session.add(workflow_def)
-                
-                session.commit()
-                logger.info(f"创建工作流成功: {workflow_id}")
-                return True
+            # 解析并编译节点，提前发现无效的节点类型、条件表达式和子图
+            self._compile_workflow(workflow_id, definition)
+            
+            await asyncio.to_thread(self._save_definition, workflow_id, name, definition, description)
+            
+            self.invalidate_workflow_cache(workflow_id)
+            logger.info(f"创建工作流成功: {workflow_id}")
+            return True
                 
         except Exception as e:
             logger.error(f"创建工作流失败: {e}")
             return False
     
+    def _save_definition(self, workflow_id: str, name: str, definition: Dict[str, Any], description: str):
+        with self.SessionLocal() as session:
+            # 检查是否已存在
+            existing = session.query(WorkflowDefinition).filter(
+                WorkflowDefinition.workflow_id == workflow_id
+            ).first()
+            
+            text = json.dumps(definition, ensure_ascii=False)
+            if existing:
+                # 更新现有工作流
+                existing.definition = text
+                existing.definition_digest = _definition_digest(text)
+                existing.updated_at = datetime.utcnow()
+            else:
+                # 创建新工作流
+                workflow_def = WorkflowDefinition(
+                    workflow_id=workflow_id,
+                    name=name,
+                    description=description,
+                    definition=text,
+                    definition_digest=_definition_digest(text)
+                )
+                session.add(workflow_def)
+            
+            session.commit()
+    
     async def execute_workflow(
         self, 
         workflow_id: str, 
@@ -282,42 +399,25 @@ class WorkflowEngine:
         execution_id = str(uuid.uuid4())
         
         try:
-            # 获取工作流定义
-            with self.SessionLocal() as session:
-                workflow_def = session.query(WorkflowDefinition).filter(
-                    WorkflowDefinition.workflow_id == workflow_id,
-                    WorkflowDefinition.active == True
-                ).first()
-                
-                if not workflow_def:
-                    raise ValueError(f"工作流不存在: {workflow_id}")
-                
-                definition = json.loads(workflow_def.definition)
+            # 获取工作流图（优先使用缓存）
+            workflow = await asyncio.to_thread(self._get_compiled_workflow, workflow_id)
             
             # 创建执行上下文
             context = WorkflowContext(
                 workflow_id=workflow_id,
                 variables=initial_variables or {},
-                start_time=datetime.utcnow()
+                start_time=datetime.utcnow(),
+                event_listener=lambda event_type, data: workflow_events.publish(
+                    execution_id, event_type, data
+                )
             )
             
             # 记录执行开始
-            with self.SessionLocal() as session:
-                execution = WorkflowExecution(
-                    execution_id=execution_id,
-                    workflow_id=workflow_id,
-                    status=TaskStatus.RUNNING.value,
-                    context=json.dumps({
-                        'variables': context.variables,
-                        'history': context.history
-                    }, ensure_ascii=False),
-                    start_time=datetime.utcnow()
-                )
-                session.add(execution)
-                session.commit()
+            await asyncio.to_thread(self._record_start, execution_id, workflow_id, context)
             
             # 异步执行工作流
-            asyncio.create_task(self._run_workflow(execution_id, definition, context))
+            context.emit('workflow_started', {'workflow_id': workflow_id})
+            asyncio.create_task(self._run_workflow(execution_id, workflow, context))
             
             logger.info(f"工作流执行开始: {execution_id}")
             return execution_id
@@ -325,65 +425,67 @@ class WorkflowEngine:
         except Exception as e:
             logger.error(f"启动工作流失败: {e}")
             # 记录失败
-            with self.SessionLocal() as session:
-                execution = WorkflowExecution(
-                    execution_id=execution_id,
-                    workflow_id=workflow_id,
-                    status=TaskStatus.FAILED.value,
-                    error_message=str(e),
-                    start_time=datetime.utcnow(),
-                    end_time=datetime.utcnow()
-                )
-                session.add(execution)
-                session.commit()
+            await asyncio.to_thread(self._record_start_failure, execution_id, workflow_id, str(e))
             raise
     
+    def _record_start(self, execution_id: str, workflow_id: str, context: WorkflowContext):
+        with self.SessionLocal() as session:
+            execution = WorkflowExecution(
+                execution_id=execution_id,
+                workflow_id=workflow_id,
+                status=TaskStatus.RUNNING.value,
+                context=self._serialize_context(session, execution_id, context),
+                start_time=datetime.utcnow()
+            )
+            session.add(execution)
+            session.commit()
+    
+    def _record_start_failure(self, execution_id: str, workflow_id: str, error: str):
+        with self.SessionLocal() as session:
+            execution = WorkflowExecution(
+                execution_id=execution_id,
+                workflow_id=workflow_id,
+                status=TaskStatus.FAILED.value,
+                error_message=error,
+                start_time=datetime.utcnow(),
+                end_time=datetime.utcnow()
+            )
+            session.add(execution)
+            session.commit()
+    
+    def _record_finish(self, execution_id: str, context: WorkflowContext, error: Optional[str] = None):
+        """记录执行结束：成功时保存最终上下文，失败时记录错误信息"""
+        with self.SessionLocal() as session:
+            execution = session.query(WorkflowExecution).filter(
+                WorkflowExecution.execution_id == execution_id
+            ).first()
+            if execution:
+                execution.status = context.status.value
+                if error is None:
+                    execution.context = self._serialize_context(session, execution_id, context)
+                else:
+                    execution.error_message = error
+                execution.end_time = datetime.utcnow()
+                session.commit()
+    
     async def _run_workflow(
         self, 
         execution_id: str, 
-        definition: Dict[str, Any], 
+        workflow: CompiledWorkflow, 
         context: WorkflowContext
     ):
         """运行工作流"""
         try:
-            nodes = self._parse_nodes(definition)
-            current_node_id = definition.get('start_node')
-            
-            while current_node_id and current_node_id != 'end':
-                node = nodes.get(current_node_id)
-                if not node:
-                    raise ValueError(f"节点不存在: {current_node_id}")
-                
-                context.current_node = current_node_id
-                context.status = TaskStatus.RUNNING
-                
-                # 执行节点
-                result = await self._execute_node(node, context)
-                
-                if not result.get('success'):
-                    raise Exception(f"节点执行失败: {result.get('error')}")
-                
-                # 确定下一个节点
-                current_node_id = self._get_next_node(node, context, result)
+            await self._run_graph(workflow, context)
             
             # 工作流完成
             context.status = TaskStatus.COMPLETED
             context.end_time = datetime.utcnow()
             
             # 更新执行记录
-            with self.SessionLocal() as session:
-                execution = session.query(WorkflowExecution).filter(
-                    WorkflowExecution.execution_id == execution_id
-                ).first()
-                if execution:
-                    execution.status = TaskStatus.COMPLETED.value
-                    execution.context = json.dumps({
-                        'variables': context.variables,
-                        'history': context.history
-                    }, ensure_ascii=False)
-                    execution.end_time = datetime.utcnow()
-                    session.commit()
+            await asyncio.to_thread(self._record_finish, execution_id, context)
             
+            context.emit('workflow_completed', {'status': TaskStatus.COMPLETED.value})
             logger.info(f"工作流执行完成: {execution_id}")
             
         except Exception as e:
@@ -392,15 +494,154 @@ class WorkflowEngine:
             context.end_time = datetime.utcnow()
             
             # 更新执行记录
-            with self.SessionLocal() as session:
-                execution = session.query(WorkflowExecution).filter(
-                    WorkflowExecution.execution_id == execution_id
-                ).first()
-                if execution:
-                    execution.status = TaskStatus.FAILED.value
-                    execution.error_message = str(e)
-                    execution.end_time = datetime.utcnow()
-                    session.commit()
+            await asyncio.to_thread(self._record_finish, execution_id, context, str(e))
+            
+            context.emit('workflow_failed', {'status': TaskStatus.FAILED.value, 'error': str(e)})
+    
+    async def _run_graph(self, workflow: CompiledWorkflow, context: WorkflowContext):
+        """从起始节点依次执行工作流图，节点失败时抛出异常"""
+        current_node_id = workflow.start_node
+        
+        while current_node_id and current_node_id != 'end':
+            node = workflow.nodes.get(current_node_id)
+            if not node:
+                raise ValueError(f"节点不存在: {current_node_id}")
+            
+            context.current_node = current_node_id
+            context.status = TaskStatus.RUNNING
+            context.emit('node_started', {
+                'node_id': node.id,
+                'name': node.name,
+                'type': node.type.value
+            })
+            
+            # 执行节点
+            node_start = time.perf_counter()
+            result = await self._execute_node(node, context, workflow)
+            context.emit('node_finished', {
+                'node_id': node.id,
+                'success': bool(result.get('success')),
+                'duration_ms': round((time.perf_counter() - node_start) * 1000, 1),
+                'error': result.get('error')
+            })
+            
+            if not result.get('success'):
+                raise Exception(f"节点执行失败: {result.get('error')}")
+            
+            # 确定下一个节点
+            current_node_id = self._get_next_node(node, context, result)
+    
+    async def _execute_map_node(
+        self,
+        node: WorkflowNode,
+        context: WorkflowContext,
+        workflow: CompiledWorkflow
+    ) -> Dict[str, Any]:
+        """执行MAP节点：对列表变量中的每个元素运行一次子图
+        
+        config:
+            items: 列表变量名
+            item_variable / index_variable: 子图中当前元素及其下标的变量名
+            collect: 子图结束后收集的变量名，未指定时收集子图新写入的全部变量
+            output: 结果列表变量名，默认 {node_id}_results
+            concurrency: 并发数，不超过 WORKFLOW_MAX_CONCURRENT
+            fail_on_error: 有元素失败时是否让节点失败，默认只记录到 {node_id}_errors
+        """
+        config = node.config
+        items = context.get_variable(config.get('items', ''))
+        if not isinstance(items, (list, tuple)):
+            return {'success': False, 'error': f"MAP节点的输入不是列表: {config.get('items')}"}
+        
+        subgraph = workflow.subgraphs[node.id]
+        item_variable = config.get('item_variable', 'item')
+        index_variable = config.get('index_variable', 'item_index')
+        collect = config.get('collect')
+        concurrency = max(1, min(
+            int(config.get('concurrency', settings.WORKFLOW_MAP_CONCURRENCY)),
+            settings.WORKFLOW_MAX_CONCURRENT
+        ))
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def run_item(index: int, item: Any) -> Dict[str, Any]:
+            async with semaphore:
+                base_variables = {**context.variables, item_variable: item, index_variable: index}
+                # 子上下文不记录历史，也不推送子图内部的节点事件
+                item_context = WorkflowContext(
+                    workflow_id=context.workflow_id,
+                    variables=dict(base_variables),
+                    history_mode=HistoryMode.NONE,
+                    start_time=datetime.utcnow()
+                )
+                try:
+                    await self._run_graph(subgraph, item_context)
+                    if collect:
+                        value = item_context.get_variable(collect)
+                    else:
+                        value = {
+                            k: v for k, v in item_context.variables.items()
+                            if k not in base_variables or base_variables[k] is not v
+                        }
+                    outcome = {'index': index, 'success': True, 'result': value}
+                except Exception as e:
+                    logger.warning(f"MAP节点 {node.id} 第 {index} 个元素执行失败: {e}")
+                    outcome = {'index': index, 'success': False, 'error': str(e)}
+            
+            context.emit('map_item_finished', {
+                'node_id': node.id,
+                'index': index,
+                'success': outcome['success'],
+                'error': outcome.get('error')
+            })
+            return outcome
+        
+        outcomes = await asyncio.gather(*(run_item(i, item) for i, item in enumerate(items)))
+        
+        errors = [
+            {'index': outcome['index'], 'error': outcome['error']}
+            for outcome in outcomes if not outcome['success']
+        ]
+        context.set_variable(config.get('output', f"{node.id}_results"), [
+            outcome.get('result') for outcome in outcomes
+        ])
+        context.set_variable(f"{node.id}_errors", errors)
+        
+        if errors and config.get('fail_on_error', False):
+            return {'success': False, 'error': f"{len(errors)}/{len(items)} 个元素执行失败"}
+        return {'success': True, 'total': len(items), 'failed': len(errors)}
+    
+    def _serialize_context(self, session, execution_id: str, context: WorkflowContext) -> str:
+        """序列化执行上下文，超过阈值的变量转存到独立的大变量表"""
+        threshold = settings.WORKFLOW_VARIABLE_SPILL_BYTES
+        variables = {}
+        stale_blobs = {
+            blob.var_key: blob for blob in session.query(WorkflowVariableBlob).filter(
+                WorkflowVariableBlob.execution_id == execution_id
+            )
+        }
+        
+        for key, value in context.variables.items():
+            payload = _dump_value(value)
+            if threshold and len(payload.encode('utf-8')) > threshold:
+                summary = _summarize_value(payload, value)
+                blob = stale_blobs.pop(key, None)
+                if blob is None:
+                    blob = WorkflowVariableBlob(execution_id=execution_id, var_key=key)
+                    session.add(blob)
+                blob.value = payload
+                blob.size = summary['size']
+                blob.digest = summary['digest']
+                variables[key] = {SPILLED_MARKER: summary}
+            else:
+                variables[key] = value
+        
+        # 变量变小后改为内联存储，或已从上下文中移除时，删除旧的大变量记录
+        for blob in stale_blobs.values():
+            session.delete(blob)
+        
+        return json.dumps({
+            'variables': variables,
+            'history': list(context.history)
+        }, ensure_ascii=False, default=str)
     
     def _parse_nodes(self, definition: Dict[str, Any]) -> Dict[str, WorkflowNode]:
         """解析节点定义"""
@@ -414,13 +655,106 @@ class WorkflowEngine:
                 next_nodes=node_data.get('next_nodes', []),
                 condition=node_data.get('condition')
             )
+            if node.config.get('task_type', node.type.value) == NodeType.DECISION.value:
+                node.compiled_condition = compile_condition(
+                    node.config.get('condition') or node.condition or ''
+                )
             nodes[node.id] = node
         return nodes
     
-    async def _execute_node(self, node: WorkflowNode, context: WorkflowContext) -> Dict[str, Any]:
+    def _get_compiled_workflow(self, workflow_id: str) -> CompiledWorkflow:
+        """获取已解析的工作流图
+        
+        缓存有效期内直接复用；过期后仅查询定义的内容摘要，未变化时不重新解析。
+        （更新时间在 MySQL 中只精确到秒，同一秒内的修改无法据此区分）
+        """
+        ttl = settings.WORKFLOW_DEFINITION_CACHE_TTL
+        cached = self._workflow_cache.get(workflow_id)
+        if cached and ttl > 0 and time.monotonic() - cached.loaded_at < ttl:
+            self._cache_stats['hits'] += 1
+            return cached
+        
+        with self.SessionLocal() as session:
+            query = session.query(WorkflowDefinition).filter(
+                WorkflowDefinition.workflow_id == workflow_id,
+                WorkflowDefinition.active == True
+            )
+            # 先只取内容摘要，定义未变化时不必传输和解析定义正文
+            row = query.with_entities(WorkflowDefinition.definition_digest).first()
+            
+            if not row:
+                self.invalidate_workflow_cache(workflow_id)
+                raise ValueError(f"工作流不存在: {workflow_id}")
+            
+            digest = row.definition_digest
+            if cached and digest and cached.definition_digest == digest:
+                self._cache_stats['reloads'] += 1
+                cached.loaded_at = time.monotonic()
+                return cached
+            
+            text = query.with_entities(WorkflowDefinition.definition).scalar()
+        
+        self._cache_stats['misses'] += 1
+        workflow = self._compile_workflow(workflow_id, json.loads(text), digest or _definition_digest(text))
+        if ttl > 0:
+            self._workflow_cache[workflow_id] = workflow
+        return workflow
+    
+    def _compile_workflow(
+        self,
+        workflow_id: str,
+        definition: Dict[str, Any],
+        definition_digest: Optional[str] = None
+    ) -> CompiledWorkflow:
+        """解析工作流定义并创建任务实例"""
+        nodes = self._parse_nodes(definition)
+        tasks = {}
+        subgraphs = {}
+        for node in nodes.values():
+            if node.type == NodeType.MAP:
+                subgraph = node.config.get('subgraph')
+                if not isinstance(subgraph, dict) or not subgraph.get('nodes'):
+                    raise ValueError(f"MAP节点缺少子图定义: {node.id}")
+                if not node.config.get('items'):
+                    raise ValueError(f"MAP节点缺少输入列表变量: {node.id}")
+                subgraphs[node.id] = self._compile_workflow(workflow_id, subgraph, definition_digest)
+                continue
+            
+            task_class = self.task_registry.get(node.config.get('task_type', node.type.value))
+            if task_class:
+                tasks[node.id] = task_class(node)
+        
+        return CompiledWorkflow(
+            workflow_id=workflow_id,
+            definition_digest=definition_digest,
+            start_node=definition.get('start_node'),
+            nodes=nodes,
+            tasks=tasks,
+            subgraphs=subgraphs
+        )
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """获取工作流图缓存统计"""
+        return {
+            'cached_workflows': len(self._workflow_cache),
+            **self._cache_stats
+        }
+    
+    async def _execute_node(
+        self,
+        node: WorkflowNode,
+        context: WorkflowContext,
+        workflow: CompiledWorkflow
+    ) -> Dict[str, Any]:
         """执行节点"""
-        task_type = node.config.get('task_type', node.type.value)
+        if node.type == NodeType.MAP:
+            return await self._execute_map_node(node, context, workflow)
+        
+        task = workflow.tasks.get(node.id)
+        if task:
+            return await task.execute(context)
         
+        task_type = node.config.get('task_type', node.type.value)
         if task_type in self.task_registry:
             task_class = self.task_registry[task_type]
             task = task_class(node)
@@ -477,6 +811,50 @@ class WorkflowEngine:
             logger.error(f"获取执行状态失败: {e}")
             return {'error': str(e)}
     
+    def get_execution_variable(self, execution_id: str, key: str) -> Dict[str, Any]:
+        """获取执行上下文中的单个变量（包括已转存的大变量）
+
+        以执行上下文为准：内联存储的值直接返回，只有标记为已转存的变量才读取大变量表。
+        """
+        try:
+            with self.SessionLocal() as session:
+                execution = session.query(WorkflowExecution).filter(
+                    WorkflowExecution.execution_id == execution_id
+                ).first()
+                if not execution:
+                    return {'error': '执行记录不存在'}
+                
+                variables = json.loads(execution.context).get('variables', {}) if execution.context else {}
+                if key not in variables:
+                    return {'error': f'变量不存在: {key}'}
+                
+                value = variables[key]
+                if isinstance(value, dict) and SPILLED_MARKER in value:
+                    blob = session.query(WorkflowVariableBlob).filter(
+                        WorkflowVariableBlob.execution_id == execution_id,
+                        WorkflowVariableBlob.var_key == key
+                    ).first()
+                    if not blob:
+                        return {'error': f'转存的变量内容不存在: {key}'}
+                    return {
+                        'execution_id': execution_id,
+                        'key': key,
+                        'value': json.loads(blob.value),
+                        'size': blob.size,
+                        'digest': blob.digest,
+                        'spilled': True
+                    }
+                
+                return {
+                    'execution_id': execution_id,
+                    'key': key,
+                    'value': value,
+                    'spilled': False
+                }
+        except Exception as e:
+            logger.error(f"获取执行变量失败: {e}")
+            return {'error': str(e)}
+    
     def get_workflows(self) -> List[Dict[str, Any]]:
         """获取所有工作流"""
         try:
@@ -0,0 +1,143 @@
+"""
+Workflow事件总线
+在进程内广播工作流执行事件，支持按事件ID断点续传
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional, AsyncIterator, Deque
+from datetime import datetime
+import logging
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# 工作流结束事件，订阅者收到后结束订阅
+TERMINAL_EVENTS = ('workflow_completed', 'workflow_failed')
+
+class _ExecutionChannel:
+    """单个执行实例的事件通道"""
+
+    def __init__(self, buffer_size: int):
+        self.events: Deque[Dict[str, Any]] = deque(maxlen=buffer_size or None)
+        self.subscribers: List[asyncio.Queue] = []
+        self.next_id = 1
+        self.finished_at: Optional[float] = None
+        self.last_event_at = time.monotonic()
+
+class WorkflowEventBus:
+    """工作流事件总线"""
+
+    def __init__(
+        self,
+        buffer_size: int = None,
+        retention_seconds: int = None,
+        heartbeat_seconds: int = None,
+        max_age_seconds: int = None
+    ):
+        self.buffer_size = buffer_size or settings.WORKFLOW_EVENT_BUFFER_SIZE
+        self.retention_seconds = retention_seconds or settings.WORKFLOW_EVENT_RETENTION
+        self.heartbeat_seconds = heartbeat_seconds or settings.WORKFLOW_EVENT_HEARTBEAT
+        self.max_age_seconds = max_age_seconds or settings.WORKFLOW_EVENT_MAX_AGE
+        self._channels: Dict[str, _ExecutionChannel] = {}
+
+    def _get_channel(self, execution_id: str) -> _ExecutionChannel:
+        channel = self._channels.get(execution_id)
+        if channel is None:
+            self._prune()
+            channel = _ExecutionChannel(self.buffer_size)
+            self._channels[execution_id] = channel
+        return channel
+
+    def _prune(self):
+        """清理通道：已结束且超过保留时间的通道，以及最后一条事件超过最长保留时间的通道
+
+        后者覆盖未发布结束事件的执行（进程中断、订阅了不存在的执行等），其订阅者在下次心跳时结束订阅。
+        """
+        now = time.monotonic()
+        expired = [
+            execution_id for execution_id, channel in self._channels.items()
+            if (channel.finished_at and now - channel.finished_at > self.retention_seconds and not channel.subscribers)
+            or now - channel.last_event_at > self.max_age_seconds
+        ]
+        for execution_id in expired:
+            del self._channels[execution_id]
+
+    def has_channel(self, execution_id: str) -> bool:
+        """当前进程是否持有该执行的事件"""
+        return execution_id in self._channels
+
+    def publish(self, execution_id: str, event_type: str, data: Dict[str, Any] = None) -> Dict[str, Any]:
+        """发布事件"""
+        channel = self._get_channel(execution_id)
+        event = {
+            'id': channel.next_id,
+            'type': event_type,
+            'execution_id': execution_id,
+            'timestamp': datetime.utcnow().isoformat(),
+            'data': data or {}
+        }
+        channel.next_id += 1
+        channel.events.append(event)
+        channel.last_event_at = time.monotonic()
+        if event_type in TERMINAL_EVENTS:
+            channel.finished_at = time.monotonic()
+
+        for queue in channel.subscribers:
+            queue.put_nowait(event)
+        return event
+
+    async def subscribe(
+        self,
+        execution_id: str,
+        last_event_id: Optional[int] = None
+    ) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """订阅执行事件
+
+        先回放缓冲区中ID大于last_event_id的事件，再持续推送新事件，
+        收到结束事件后停止。空闲超过心跳间隔时产出None，供调用方发送心跳。
+        """
+        channel = self._get_channel(execution_id)
+        queue: asyncio.Queue = asyncio.Queue()
+        channel.subscribers.append(queue)
+        last_id = last_event_id or 0
+
+        try:
+            for event in list(channel.events):
+                if event['id'] <= last_id:
+                    continue
+                last_id = event['id']
+                yield event
+                if event['type'] in TERMINAL_EVENTS:
+                    return
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=self.heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    # 通道已过期清理，不会再有新事件
+                    if self._channels.get(execution_id) is not channel:
+                        return
+                    yield None
+                    continue
+
+                if event['id'] <= last_id:
+                    continue
+                last_id = event['id']
+                yield event
+                if event['type'] in TERMINAL_EVENTS:
+                    return
+        finally:
+            channel.subscribers.remove(queue)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取事件总线状态"""
+        return {
+            'channels': len(self._channels),
+            'subscribers': sum(len(c.subscribers) for c in self._channels.values())
+        }
+
+# 全局实例
+workflow_events = WorkflowEventBus()
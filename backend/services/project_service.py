@@ -1,6 +1,8 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from models.database_models import Project
+from services.result_stats import aggregate_project_results, latency_percentiles
 from schemas.response_schemas import ProjectCreate, ProjectResponse
 from core.logging import setup_logging
 
@@ -10,34 +12,34 @@ logger = setup_logging()[0]
 class ProjectService:
     """项目管理服务类"""
     
-    def create_project(self, db: Session, project: ProjectCreate) -> Project:
+    async def create_project(self, db: AsyncSession, project: ProjectCreate) -> Project:
         """创建测试项目"""
         try:
             db_project = Project(**project.dict())
             db.add(db_project)
-            db.commit()
-            db.refresh(db_project)
+            await db.commit()
+            await db.refresh(db_project)
             logger.info(f"创建项目成功: {project.name} (ID: {db_project.id})")
             return db_project
         except Exception as e:
             logger.error(f"创建项目失败: {project.name} - {str(e)}")
-            db.rollback()
+            await db.rollback()
             raise e
     
-    def get_projects(self, db: Session) -> List[Project]:
+    async def get_projects(self, db: AsyncSession) -> List[Project]:
         """获取所有项目（按创建时间倒序）"""
         try:
-            projects = db.query(Project).order_by(Project.created_at.desc()).all()
+            projects = (await db.scalars(select(Project).order_by(Project.created_at.desc()))).all()
             logger.info(f"获取项目列表成功，共 {len(projects)} 个项目")
             return projects
         except Exception as e:
             logger.error(f"获取项目列表失败: {str(e)}")
             raise e
     
-    def get_project(self, db: Session, project_id: int) -> Optional[Project]:
+    async def get_project(self, db: AsyncSession, project_id: int) -> Optional[Project]:
         """获取指定项目"""
         try:
-            project = db.query(Project).filter(Project.id == project_id).first()
+            project = await db.get(Project, project_id)
             if project:
                 logger.info(f"获取项目成功: {project.name} (ID: {project_id})")
             else:
@@ -47,10 +49,10 @@ class ProjectService:
             logger.error(f"获取项目失败: ID {project_id} - {str(e)}")
             raise e
     
-    def update_project(self, db: Session, project_id: int, project_update: dict) -> Optional[Project]:
+    async def update_project(self, db: AsyncSession, project_id: int, project_update: dict) -> Optional[Project]:
         """更新项目信息"""
         try:
-            project = db.query(Project).filter(Project.id == project_id).first()
+            project = await db.get(Project, project_id)
             if not project:
                 logger.warning(f"更新项目失败，项目不存在: ID {project_id}")
                 return None
@@ -59,68 +61,76 @@ class ProjectService:
                 if hasattr(project, field):
                     setattr(project, field, value)
             
-            db.commit()
-            db.refresh(project)
+            await db.commit()
+            await db.refresh(project)
             logger.info(f"更新项目成功: {project.name} (ID: {project_id})")
             return project
         except Exception as e:
             logger.error(f"更新项目失败: ID {project_id} - {str(e)}")
-            db.rollback()
+            await db.rollback()
             raise e
     
-    def delete_project(self, db: Session, project_id: int) -> bool:
+    async def delete_project(self, db: AsyncSession, project_id: int) -> bool:
         """删除项目"""
         try:
-            project = db.query(Project).filter(Project.id == project_id).first()
+            project = await db.get(Project, project_id)
             if not project:
                 logger.warning(f"删除项目失败，项目不存在: ID {project_id}")
                 return False
             
             project_name = project.name
-            db.delete(project)
-            db.commit()
+            await db.delete(project)
+            await db.commit()
             logger.info(f"删除项目成功: {project_name} (ID: {project_id})")
             return True
         except Exception as e:
             logger.error(f"删除项目失败: ID {project_id} - {str(e)}")
-            db.rollback()
+            await db.rollback()
             raise e
     
-    def get_project_statistics(self, db: Session, project_id: int) -> dict:
-        """获取项目统计信息"""
+    async def get_project_statistics(self, db: AsyncSession, project_id: int, include_percentiles: bool = False) -> dict:
+        """获取项目统计信息
+        
+        项目信息和用例数一条查询，测试结果按状态分组聚合一条查询；
+        include_percentiles 为 True 时额外用窗口函数计算耗时分位数。
+        """
         try:
-            from models.database_models import TestCase, TestResult
+            from models.database_models import TestCase
             
-            project = db.query(Project).filter(Project.id == project_id).first()
-            if not project:
+            testcase_count = (
+                select(func.count(TestCase.id))
+                .where(TestCase.project_id == Project.id)
+                .scalar_subquery()
+            )
+            row = (await db.execute(
+                select(Project.name, testcase_count).where(Project.id == project_id)
+            )).first()
+            if not row:
                 return None
-            
-            # 测试用例统计
-            total_testcases = db.query(TestCase).filter(TestCase.project_id == project_id).count()
+            project_name, total_testcases = row
             
             # 测试结果统计
-            total_results = db.query(TestResult).join(TestCase).filter(TestCase.project_id == project_id).count()
-            passed_results = db.query(TestResult).join(TestCase).filter(
-                TestCase.project_id == project_id,
-                TestResult.status == "passed"
-            ).count()
-            failed_results = db.query(TestResult).join(TestCase).filter(
-                TestCase.project_id == project_id,
-                TestResult.status == "failed"
-            ).count()
+            aggregated = await aggregate_project_results(db, project_id)
+            total_results = aggregated["total_results"]
+            passed_results = aggregated["status_counts"].get("passed", 0)
+            failed_results = aggregated["status_counts"].get("failed", 0)
             
             statistics = {
                 "project_id": project_id,
-                "project_name": project.name,
+                "project_name": project_name,
                 "total_testcases": total_testcases,
                 "total_results": total_results,
                 "passed_results": passed_results,
                 "failed_results": failed_results,
-                "success_rate": (passed_results / total_results * 100) if total_results > 0 else 0
+                "success_rate": (passed_results / total_results * 100) if total_results > 0 else 0,
+                "status_counts": aggregated["status_counts"],
+                "average_execution_time": aggregated["average_execution_time"]
             }
+            if include_percentiles:
+                statistics["execution_time_percentiles"] = await latency_percentiles(db, project_id)
             
-            logger.info(f"获取项目统计信息成功: {project.name} (ID: {project_id})")
+            logger.info(f"获取项目统计信息成功: {project_name} (ID: {project_id})")
             return statistics
         except Exception as e:
             logger.error(f"获取项目统计信息失败: ID {project_id} - {str(e)}")
-            raise e
\ No newline at end of file
+            raise e
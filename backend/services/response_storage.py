@@ -0,0 +1,127 @@
+import json
+import zlib
+import hashlib
+from typing import Dict, Any, List, Optional, Tuple
+from sqlalchemy import select, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from config.settings import settings
+from models.database_models import TestResultBlob
+from core.logging import setup_logging
+
+logger = setup_logging()[0]
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+    logger.warning("zstandard库未安装，测试结果响应内容将使用zlib压缩")
+
+
+def compress(data: bytes) -> Tuple[str, bytes]:
+    """压缩响应内容，返回 (编码方式, 压缩后内容)"""
+    if ZSTD_AVAILABLE:
+        return "zstd", zstandard.ZstdCompressor(level=settings.response_blob_zstd_level).compress(data)
+    return "zlib", zlib.compress(data, 6)
+
+
+def decompress(codec: str, content: bytes) -> bytes:
+    if codec == "zstd":
+        if not ZSTD_AVAILABLE:
+            raise RuntimeError("响应内容为zstd压缩，需要安装zstandard库")
+        return zstandard.ZstdDecompressor().decompress(content)
+    if codec == "zlib":
+        return zlib.decompress(content)
+    raise ValueError(f"不支持的压缩方式: {codec}")
+
+
+def decode_blob(blob: TestResultBlob) -> Any:
+    """还原外置存储的响应内容"""
+    return json.loads(decompress(blob.codec, blob.content).decode("utf-8"))
+
+
+class ResponseStorage:
+    """测试结果响应内容存储
+
+    序列化后不超过阈值的响应仍存放在 test_results.response_data；超过阈值的响应按 SHA-256
+    去重、压缩后存入 test_result_blobs，结果行只保留摘要、大小和截断预览，
+    完整内容通过 load 按需读取。
+    """
+
+    def __init__(
+        self,
+        threshold_bytes: int = settings.response_blob_threshold_bytes,
+        preview_chars: int = settings.response_preview_chars
+    ):
+        self.threshold_bytes = threshold_bytes
+        self.preview_chars = preview_chars
+
+    def prepare(self, response_data: Any) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+        """拆分一条响应：返回 (结果行的响应相关列, 需要外置存储的内容或 None)"""
+        if response_data is None:
+            return {"response_data": None}, None
+        text = json.dumps(response_data, ensure_ascii=False, separators=(",", ":"), default=str)
+        data = text.encode("utf-8")
+        if len(data) <= self.threshold_bytes:
+            return {"response_data": response_data}, None
+        digest = hashlib.sha256(data).hexdigest()
+        columns = {
+            "response_data": None,
+            "response_digest": digest,
+            "response_size": len(data),
+            "response_preview": text[:self.preview_chars]
+        }
+        return columns, {"digest": digest, "data": data}
+
+    async def store(self, db: AsyncSession, blobs: List[Dict[str, Any]]):
+        """在当前事务中保存外置响应内容，内容已存在（摘要相同）时跳过
+
+        已存在的内容用共享锁读取并持有到事务提交，清理孤立内容的删除会等待引用它的结果行写入，
+        不会删掉刚被复用的内容。调用方负责提交事务。
+        """
+        pending = {blob["digest"]: blob["data"] for blob in blobs if blob}
+        if not pending:
+            return
+        existing = set((await db.scalars(
+            select(TestResultBlob.digest)
+            .where(TestResultBlob.digest.in_(list(pending)))
+            .with_for_update(read=True)
+        )).all())
+        rows = []
+        for digest, data in pending.items():
+            if digest in existing:
+                continue
+            codec, content = compress(data)
+            rows.append({
+                "digest": digest,
+                "codec": codec,
+                "size": len(data),
+                "compressed_size": len(content),
+                "content": content
+            })
+        if not rows:
+            return
+        try:
+            # 相同内容可能被并发写入，放在保存点中，冲突时逐条跳过已存在的内容
+            async with db.begin_nested():
+                await db.execute(insert(TestResultBlob), rows)
+        except IntegrityError:
+            logger.info("响应内容被并发写入，逐条去重保存")
+            for row in rows:
+                try:
+                    async with db.begin_nested():
+                        await db.execute(insert(TestResultBlob), [row])
+                except IntegrityError:
+                    pass
+
+    async def load(self, db: AsyncSession, digest: str) -> Optional[Any]:
+        """按摘要读取完整的响应内容，不存在时返回 None"""
+        blob = await db.scalar(select(TestResultBlob).where(TestResultBlob.digest == digest))
+        if blob is None:
+            return None
+        return decode_blob(blob)
+
+
+# 全局实例
+response_storage = ResponseStorage()
@@ -0,0 +1,314 @@
+import os
+import glob
+import gzip
+import json
+from datetime import datetime, date
+from typing import Dict, Any, List, Optional, Iterator, Set, Tuple
+from sqlalchemy import select, text, func, delete, exists
+from sqlalchemy.engine import Connection
+from config.settings import settings
+from core.database import engine
+from models.database_models import TestCase, TestResult, TestResultBlob
+from services.response_storage import decode_blob
+from core.logging import setup_logging
+
+logger = setup_logging()[0]
+
+TABLE = "test_results"
+ARCHIVE_PATTERN = "test_results_*.jsonl.gz"
+
+
+def month_start(value: datetime) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"p{month:%Y%m}"
+
+
+def partition_definition(month: date) -> str:
+    """按月分区：分区 pYYYYMM 存放该月的测试结果"""
+    return f"PARTITION {partition_name(month)} VALUES LESS THAN (TO_DAYS('{add_months(month, 1).isoformat()}'))"
+
+
+def partition_clause(first_month: date, last_month: date) -> str:
+    """生成从 first_month 到 last_month 的按月分区定义，最后追加 pmax 兜底分区"""
+    definitions = []
+    month = first_month
+    while month <= last_month:
+        definitions.append(partition_definition(month))
+        month = add_months(month, 1)
+    definitions.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+    return ",\n    ".join(definitions)
+
+
+def _month_range(month: date) -> Tuple[datetime, datetime]:
+    return datetime.combine(month, datetime.min.time()), datetime.combine(add_months(month, 1), datetime.min.time())
+
+
+def _archive_month(path: str) -> Optional[date]:
+    try:
+        return datetime.strptime(os.path.basename(path)[len("test_results_"):-len(".jsonl.gz")], "%Y%m").date()
+    except ValueError:
+        return None
+
+
+class ResultRetentionService:
+    """测试结果保留策略
+
+    test_results 在 MySQL 上按 executed_at 月度分区（见迁移 0003）。超过保留期的月份先导出为
+    压缩的 JSONL 归档文件，再整体删除分区（非分区表按批删除），热表大小与保留月数保持一致。
+    归档文件可通过 iter_archived_results / aggregate_archived_results 继续用于报告统计；
+    结果汇总表（趋势查询）不受归档影响。
+    """
+
+    def __init__(self, archive_dir: str = settings.test_result_archive_dir):
+        self.archive_dir = archive_dir
+
+    # ---- 分区维护 ----
+
+    def is_partitioned(self, conn: Connection) -> bool:
+        if conn.dialect.name != "mysql":
+            return False
+        return bool(conn.execute(text(
+            "SELECT COUNT(*) FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL"
+        ), {"table": TABLE}).scalar())
+
+    def list_partitions(self, conn: Connection) -> List[str]:
+        return list(conn.execute(text(
+            "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL "
+            "ORDER BY PARTITION_ORDINAL_POSITION"
+        ), {"table": TABLE}).scalars())
+
+    def ensure_partitions(self, conn: Connection, months_ahead: int = settings.test_result_partition_months_ahead) -> List[str]:
+        """提前创建未来几个月的分区（从 pmax 中拆分），返回新建的分区名"""
+        existing = set(self.list_partitions(conn))
+        current = month_start(datetime.utcnow())
+        missing = [
+            add_months(current, offset) for offset in range(months_ahead + 1)
+            if partition_name(add_months(current, offset)) not in existing
+        ]
+        if not missing:
+            return []
+        # 只能按顺序拆分 pmax，已存在的最晚分区之后的月份才需要创建
+        latest = max((name for name in existing if name != "pmax"), default=None)
+        missing = [month for month in missing if latest is None or partition_name(month) > latest]
+        if not missing:
+            return []
+        conn.execute(text(
+            f"ALTER TABLE {TABLE} REORGANIZE PARTITION pmax INTO (\n    "
+            f"{partition_clause(missing[0], missing[-1])}\n)"
+        ))
+        created = [partition_name(month) for month in missing]
+        logger.info(f"创建测试结果分区: {', '.join(created)}")
+        return created
+
+    # ---- 归档 ----
+
+    def archive_path(self, month: date) -> str:
+        return os.path.join(self.archive_dir, f"test_results_{month:%Y%m}.jsonl.gz")
+
+    def archive_month(self, conn: Connection, month: date, chunk_size: int = 5000) -> Tuple[int, int]:
+        """把某月的测试结果（附带所属项目）导出到压缩归档文件，返回 (导出条数, 导出的最大 id)
+
+        先写临时文件再改名，中途失败不会留下不完整的归档。同月已有归档时保留其中的记录，
+        只追加尚未归档的行：上次删除后补写进该月的结果再次归档时，不会覆盖掉已删除的记录。
+        """
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = self.archive_path(month)
+        tmp_path = f"{path}.tmp"
+        start, end = _month_range(month)
+        exported = 0
+        last_id = 0
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as archive:
+            archived_ids = self._copy_archive(path, archive)
+            while True:
+                rows = conn.execute(
+                    select(TestResult.__table__, TestCase.project_id)
+                    .outerjoin(TestCase, TestResult.testcase_id == TestCase.id)
+                    .where(TestResult.executed_at >= start, TestResult.executed_at < end, TestResult.id > last_id)
+                    .order_by(TestResult.id)
+                    .limit(chunk_size)
+                ).mappings().all()
+                if not rows:
+                    break
+                # 外置存储的响应写回归档行，归档文件不依赖 test_result_blobs
+                digests = {row["response_digest"] for row in rows if row["response_digest"]}
+                blobs = {
+                    blob.digest: decode_blob(blob)
+                    for blob in conn.execute(select(TestResultBlob).where(TestResultBlob.digest.in_(digests)))
+                } if digests else {}
+                for row in rows:
+                    if row["id"] in archived_ids:
+                        continue
+                    record = dict(row)
+                    if record["response_digest"] in blobs:
+                        record["response_data"] = blobs[record["response_digest"]]
+                    archive.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                exported += len(rows)
+                last_id = rows[-1]["id"]
+        os.replace(tmp_path, path)
+        return exported, last_id
+
+    def _copy_archive(self, path: str, archive) -> Set[int]:
+        """把已有归档的记录复制到新归档文件，返回其中的结果 id"""
+        archived_ids: Set[int] = set()
+        if not os.path.exists(path):
+            return archived_ids
+        with gzip.open(path, "rt", encoding="utf-8") as existing:
+            for line in existing:
+                archived_ids.add(json.loads(line)["id"])
+                archive.write(line)
+        return archived_ids
+
+    def purge_month(self, conn: Connection, month: date, partitioned: bool, rows: int, max_id: int, chunk_size: int = 5000) -> bool:
+        """删除某月已归档的测试结果：分区表直接删除分区，否则按主键分批删除
+
+        rows/max_id 为归档时导出的条数和最大 id。归档之后该月又写入了结果时不删除分区，
+        返回 False，下次执行会重新归档；非分区表只删除 id 不超过 max_id 的行。
+        """
+        start, end = _month_range(month)
+        count, current_max = conn.execute(
+            select(func.count(), func.max(TestResult.id))
+            .where(TestResult.executed_at >= start, TestResult.executed_at < end)
+        ).one()
+        if count != rows or (count and current_max != max_id):
+            logger.warning(f"测试结果 {month:%Y-%m} 在归档后有新写入（归档 {rows} 条，当前 {count} 条），本次不删除")
+            return False
+        if partitioned:
+            if partition_name(month) in self.list_partitions(conn):
+                conn.execute(text(f"ALTER TABLE {TABLE} DROP PARTITION {partition_name(month)}"))
+            return True
+        while True:
+            ids = list(conn.execute(
+                select(TestResult.id)
+                .where(TestResult.executed_at >= start, TestResult.executed_at < end, TestResult.id <= max_id)
+                .limit(chunk_size)
+            ).scalars())
+            if not ids:
+                break
+            conn.execute(delete(TestResult).where(TestResult.id.in_(ids)))
+            conn.commit()
+        return True
+
+    def purge_orphan_blobs(self, conn: Connection, chunk_size: int = 1000) -> int:
+        """删除已不被任何测试结果引用的响应内容，返回删除条数
+
+        引用检查和删除在同一条语句中完成（按主键分段），不会删掉检查之后才被引用的内容；
+        复用已有内容的写入方见 ResponseStorage.store。
+        """
+        last_id = conn.execute(select(func.max(TestResultBlob.id))).scalar() or 0
+        referenced = exists().where(TestResult.response_digest == TestResultBlob.digest)
+        removed = 0
+        low = 0
+        while low < last_id:
+            high = low + chunk_size
+            result = conn.execute(
+                delete(TestResultBlob)
+                .where(TestResultBlob.id > low, TestResultBlob.id <= high, ~referenced)
+            )
+            conn.commit()
+            removed += result.rowcount
+            low = high
+        return removed
+
+    def apply_retention(self, retention_months: int = settings.test_result_retention_months) -> Dict[str, Any]:
+        """归档并删除超过保留期的测试结果，同时为分区表预建分区
+
+        retention_months 为 0 时不删除任何数据。
+        """
+        archived = []
+        created = []
+        with engine.connect() as conn:
+            partitioned = self.is_partitioned(conn)
+            if partitioned:
+                created = self.ensure_partitions(conn)
+            cutoff = add_months(month_start(datetime.utcnow()), -retention_months) if retention_months > 0 else None
+            oldest = conn.execute(select(func.min(TestResult.executed_at))).scalar()
+            conn.commit()
+            if cutoff and oldest:
+                month = month_start(oldest)
+                while month < cutoff:
+                    rows, max_id = self.archive_month(conn, month)
+                    conn.commit()
+                    purged = self.purge_month(conn, month, partitioned, rows, max_id)
+                    conn.commit()
+                    if rows and purged:
+                        archived.append({"month": f"{month:%Y-%m}", "rows": rows, "file": self.archive_path(month)})
+                        logger.info(f"归档测试结果: {month:%Y-%m} 共 {rows} 条")
+                    month = add_months(month, 1)
+            removed_blobs = self.purge_orphan_blobs(conn) if archived else 0
+        return {
+            "partitioned": partitioned,
+            "retention_months": retention_months,
+            "cutoff": cutoff.isoformat() if cutoff else None,
+            "created_partitions": created,
+            "archived": archived,
+            "removed_blobs": removed_blobs
+        }
+
+    # ---- 读取归档 ----
+
+    def list_archives(self) -> List[Dict[str, Any]]:
+        archives = []
+        for path in sorted(glob.glob(os.path.join(self.archive_dir, ARCHIVE_PATTERN))):
+            month = _archive_month(path)
+            if month:
+                archives.append({"month": f"{month:%Y-%m}", "file": path, "size": os.path.getsize(path)})
+        return archives
+
+    def iter_archived_results(
+        self,
+        project_id: Optional[int] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """逐行读取归档的测试结果，只打开时间范围内的月份文件"""
+        for path in sorted(glob.glob(os.path.join(self.archive_dir, ARCHIVE_PATTERN))):
+            month = _archive_month(path)
+            if month is None:
+                continue
+            if since and add_months(month, 1) <= since.date():
+                continue
+            if until and month > until.date():
+                continue
+            with gzip.open(path, "rt", encoding="utf-8") as archive:
+                for line in archive:
+                    row = json.loads(line)
+                    if project_id is not None and row.get("project_id") != project_id:
+                        continue
+                    executed_at = datetime.fromisoformat(row["executed_at"]) if row.get("executed_at") else None
+                    if since and (executed_at is None or executed_at < since):
+                        continue
+                    if until and (executed_at is None or executed_at >= until):
+                        continue
+                    row["executed_at"] = executed_at
+                    yield row
+
+    def aggregate_archived_results(self, project_id: int) -> Dict[str, Any]:
+        """统计归档中项目的测试结果，返回格式与 aggregate_project_results 相同"""
+        status_counts: Dict[str, int] = {}
+        duration_sum = 0
+        duration_count = 0
+        for row in self.iter_archived_results(project_id=project_id):
+            status_counts[row["status"]] = status_counts.get(row["status"], 0) + 1
+            if row.get("execution_time") is not None:
+                duration_sum += row["execution_time"]
+                duration_count += 1
+        return {
+            "total_results": sum(status_counts.values()),
+            "status_counts": status_counts,
+            "average_execution_time": duration_sum / duration_count if duration_count else 0,
+            "timed_results": duration_count
+        }
+
+
+# 全局实例
+result_retention = ResultRetentionService()
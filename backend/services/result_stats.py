@@ -0,0 +1,81 @@
+from sqlalchemy import select, func, case, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, Any, Sequence
+from models.database_models import TestCase, TestResult
+
+
+async def aggregate_project_results(db: AsyncSession, project_id: int) -> Dict[str, Any]:
+    """在数据库中按状态分组统计项目的测试结果
+
+    一条 GROUP BY 查询返回各状态的结果数和平均耗时，不把结果行加载到内存。
+    """
+    rows = (await db.execute(
+        select(
+            TestResult.status,
+            func.count(TestResult.id),
+            func.avg(TestResult.execution_time)
+        )
+        .join(TestCase, TestResult.testcase_id == TestCase.id)
+        .where(TestCase.project_id == project_id)
+        .group_by(TestResult.status)
+    )).all()
+
+    status_counts = {status: count for status, count, _ in rows}
+    total = sum(status_counts.values())
+    # 各状态的平均值按结果数加权得到总体平均耗时
+    weighted = sum(float(avg) * count for _, count, avg in rows if avg is not None)
+    timed = sum(count for _, count, avg in rows if avg is not None)
+    return {
+        "total_results": total,
+        "status_counts": status_counts,
+        "average_execution_time": weighted / timed if timed else 0,
+        "timed_results": timed
+    }
+
+
+def merge_result_aggregates(*aggregates: Dict[str, Any]) -> Dict[str, Any]:
+    """合并多份结果统计（如数据库中的结果与归档的结果）"""
+    status_counts: Dict[str, int] = {}
+    for aggregated in aggregates:
+        for status, count in aggregated["status_counts"].items():
+            status_counts[status] = status_counts.get(status, 0) + count
+    timed = sum(aggregated["timed_results"] for aggregated in aggregates)
+    weighted = sum(aggregated["average_execution_time"] * aggregated["timed_results"] for aggregated in aggregates)
+    return {
+        "total_results": sum(status_counts.values()),
+        "status_counts": status_counts,
+        "average_execution_time": weighted / timed if timed else 0,
+        "timed_results": timed
+    }
+
+
+async def latency_percentiles(
+    db: AsyncSession,
+    project_id: int,
+    percentiles: Sequence[int] = (50, 90, 99)
+) -> Dict[str, Any]:
+    """用窗口函数计算项目测试结果耗时的分位数（最近秩法）
+
+    ROW_NUMBER/COUNT OVER 在数据库中完成排序，每个分位数取排名为 ceil(n*p/100) 的值。
+    """
+    ranked = (
+        select(
+            TestResult.execution_time.label("execution_time"),
+            func.row_number().over(order_by=TestResult.execution_time).label("rank"),
+            func.count().over().label("total")
+        )
+        .join(TestCase, TestResult.testcase_id == TestCase.id)
+        .where(TestCase.project_id == project_id, TestResult.execution_time.isnot(None))
+        .subquery()
+    )
+
+    # rank*100 >= total*p 且 (rank-1)*100 < total*p 即 rank == ceil(total*p/100)，只用整数运算
+    columns = [
+        func.max(case(
+            (and_(ranked.c.rank * 100 >= ranked.c.total * p, (ranked.c.rank - 1) * 100 < ranked.c.total * p),
+             ranked.c.execution_time)
+        )).label(f"p{p}")
+        for p in percentiles
+    ]
+    row = (await db.execute(select(*columns))).one()
+    return {f"p{p}": value for p, value in zip(percentiles, row)}
@@ -0,0 +1,142 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from config.settings import settings
+from core.database import async_session
+from services.testcase_service import TestCaseService
+from core.logging import setup_logging
+
+logger = setup_logging()[0]
+
+
+class ResultWriter:
+    """测试结果缓冲写入器
+
+    执行结果先进入内存队列，由后台任务每累计 batch_size 条或每隔 flush_interval_ms 毫秒
+    批量写入一次（多行 INSERT + 汇总表更新同一事务）。队列满时 submit 会等待，形成背压；
+    应用关闭时 stop 会写完队列中剩余的结果。
+    """
+
+    def __init__(
+        self,
+        batch_size: int = settings.result_writer_batch_size,
+        flush_interval_ms: int = settings.result_writer_flush_interval_ms,
+        max_pending: int = settings.result_writer_max_pending
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_pending = max_pending
+        self.testcase_service = TestCaseService()
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {
+            "submitted": 0,
+            "written": 0,
+            "failed": 0,
+            "flushes": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        """启动后台写入任务（重复调用无副作用）"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"测试结果写入器已启动: 批量 {self.batch_size} 条，间隔 {self.flush_interval * 1000:.0f} ms")
+
+    async def submit(self, testcase_id: int, result_data: Dict[str, Any]):
+        """提交一条测试结果，队列已满时等待写入器腾出空间"""
+        if not self.running:
+            await self.start()
+        item = {**result_data, "testcase_id": testcase_id}
+        # 执行时间以提交时刻为准，而不是写入数据库的时刻
+        item.setdefault("executed_at", datetime.utcnow())
+        await self._queue.put(item)
+        self._stats["submitted"] += 1
+
+    async def flush(self):
+        """等待已提交的结果全部写入"""
+        if self.running:
+            await self._queue.join()
+
+    async def stop(self):
+        """写完队列中剩余的结果后停止后台任务"""
+        if not self.running:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info(f"测试结果写入器已停止: 共写入 {self._stats['written']} 条，失败 {self._stats['failed']} 条")
+
+    async def _next_batch(self) -> List[Dict[str, Any]]:
+        """阻塞等待第一条结果，之后在刷新间隔内尽量凑满一批"""
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _save(self, batch: List[Dict[str, Any]]):
+        async with async_session("result_writer") as db:
+            await self.testcase_service.save_test_results(db, batch)
+
+    async def _write(self, batch: List[Dict[str, Any]]):
+        start = time.perf_counter()
+        try:
+            await self._save(batch)
+            self._stats["written"] += len(batch)
+        except Exception as e:
+            # 整批失败（如某条结果的用例已被删除）时逐条重写，只丢弃写不进去的结果
+            logger.warning(f"批量写入测试结果失败，改为逐条写入 {len(batch)} 条: {str(e)}")
+            for item in batch:
+                try:
+                    await self._save([item])
+                    self._stats["written"] += 1
+                except Exception as item_error:
+                    self._stats["failed"] += 1
+                    logger.error(f"丢弃无法写入的测试结果: 测试用例ID {item.get('testcase_id')} - {str(item_error)}")
+        duration_ms = (time.perf_counter() - start) * 1000
+        self._stats["flushes"] += 1
+        self._stats["last_flush_ms"] = round(duration_ms, 3)
+        self._stats["max_flush_ms"] = round(max(self._stats["max_flush_ms"], duration_ms), 3)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取写入器运行状态"""
+        return {
+            **self._stats,
+            "running": self.running,
+            "pending": self._queue.qsize() if self._queue else 0,
+            "batch_size": self.batch_size,
+            "flush_interval_ms": int(self.flush_interval * 1000),
+            "max_pending": self.max_pending
+        }
+
+
+# 全局实例
+result_writer = ResultWriter()
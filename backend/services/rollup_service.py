@@ -0,0 +1,250 @@
+from sqlalchemy import select, func, cast, Integer
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+from models.database_models import TestCase, TestResult, TestResultRollup
+from services.ai.result_aggregator import PASS_STATUSES, FAIL_STATUSES, normalize_status
+from core.logging import setup_logging
+
+logger = setup_logging()[0]
+
+# 汇总粒度
+GRANULARITIES = ("hour", "day")
+
+# 耗时直方图的桶上界（毫秒），按约1-2-5倍数递增，最后一个桶收集超出上界的值
+LATENCY_BUCKETS_MS = (
+    1, 2, 5, 10, 20, 50, 100, 200, 500,
+    1000, 2000, 5000, 10000, 20000, 60000
+)
+
+# 状态归一化与结果聚合一致：success/pass 计为通过，fail/failure 计为失败
+_STATUS_COLUMNS = {
+    **{status: "passed" for status in PASS_STATUSES},
+    **{status: "failed" for status in FAIL_STATUSES},
+    "error": "error"
+}
+
+RollupKey = Tuple[int, int, str, datetime]
+
+
+def bucket_start(executed_at: datetime, granularity: str) -> datetime:
+    """计算结果所在汇总区间的起始时间"""
+    if granularity == "hour":
+        return executed_at.replace(minute=0, second=0, microsecond=0)
+    return executed_at.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _empty_delta() -> Dict[str, Any]:
+    return {
+        "total": 0, "passed": 0, "failed": 0, "error": 0, "other": 0,
+        "duration_count": 0, "duration_sum": 0, "duration_max": 0,
+        "latency_buckets": [0] * (len(LATENCY_BUCKETS_MS) + 1)
+    }
+
+
+def _merge_buckets(left: Optional[List[int]], right: List[int]) -> List[int]:
+    left = list(left or [])
+    left += [0] * (len(right) - len(left))
+    return [a + b for a, b in zip(left, right)]
+
+
+def estimate_percentile(buckets: List[int], q: float, max_value: int = 0) -> Optional[int]:
+    """按直方图估算分位数（返回所在桶的上界，最后一个桶返回最大值）"""
+    total = sum(buckets)
+    if not total:
+        return None
+    target = total * q
+    seen = 0
+    for index, count in enumerate(buckets):
+        seen += count
+        if seen >= target:
+            return LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else max_value
+    return max_value
+
+
+class RollupService:
+    """测试结果汇总服务：写入测试结果时增量更新汇总表，趋势查询只读取汇总表"""
+
+    def _collect(self, results: List[Dict[str, Any]]) -> Dict[RollupKey, Dict[str, Any]]:
+        """将一批结果按 (项目, 用例, 粒度, 区间) 合并为增量"""
+        deltas: Dict[RollupKey, Dict[str, Any]] = defaultdict(_empty_delta)
+        for result in results:
+            executed_at = result.get("executed_at") or datetime.utcnow()
+            status = normalize_status(result.get("status"))
+            duration = result.get("execution_time")
+            for granularity in GRANULARITIES:
+                key = (result["project_id"], result["testcase_id"], granularity, bucket_start(executed_at, granularity))
+                delta = deltas[key]
+                delta["total"] += 1
+                delta[_STATUS_COLUMNS.get(status, "other")] += 1
+                if isinstance(duration, (int, float)):
+                    delta["duration_count"] += 1
+                    delta["duration_sum"] += int(duration)
+                    delta["duration_max"] = max(delta["duration_max"], int(duration))
+                    delta["latency_buckets"][bisect_left(LATENCY_BUCKETS_MS, duration)] += 1
+        return deltas
+
+    @staticmethod
+    def _merged_buckets(current, incoming):
+        """逐桶相加两个耗时直方图的SQL表达式"""
+        return func.json_array(*[
+            func.coalesce(cast(func.json_extract(current, f"$[{index}]"), Integer), 0)
+            + func.coalesce(cast(func.json_extract(incoming, f"$[{index}]"), Integer), 0)
+            for index in range(len(LATENCY_BUCKETS_MS) + 1)
+        ])
+
+    def _upsert(self, dialect: str, rows: List[Dict[str, Any]]):
+        """构造累加写入汇总行的 upsert 语句：区间不存在时插入，已存在时在数据库中累加"""
+        table = TestResultRollup.__table__
+        if dialect == "mysql":
+            stmt = mysql_insert(table).values(rows)
+            incoming = stmt.inserted
+            greatest = func.greatest
+        elif dialect == "sqlite":
+            stmt = sqlite_insert(table).values(rows)
+            incoming = stmt.excluded
+            greatest = func.max
+        else:
+            raise NotImplementedError(f"汇总表累加写入不支持的数据库: {dialect}")
+
+        # 每个赋值只引用自身列，MySQL 按顺序求值时不会读到已更新的其他列
+        assignments = {
+            field: func.coalesce(table.c[field], 0) + incoming[field]
+            for field in ("total", "passed", "failed", "error", "other", "duration_count", "duration_sum")
+        }
+        assignments["duration_max"] = greatest(func.coalesce(table.c.duration_max, 0), incoming.duration_max)
+        assignments["latency_buckets"] = self._merged_buckets(table.c.latency_buckets, incoming.latency_buckets)
+        assignments["updated_at"] = incoming.updated_at
+        if dialect == "mysql":
+            return stmt.on_duplicate_key_update(**assignments)
+        return stmt.on_conflict_do_update(
+            index_elements=[table.c.project_id, table.c.testcase_id, table.c.granularity, table.c.bucket_start],
+            set_=assignments
+        )
+
+    async def apply(self, db: AsyncSession, results: List[Dict[str, Any]]):
+        """在当前事务中把一批测试结果累加到汇总表
+
+        results 中每项需包含 project_id、testcase_id、status、execution_time、executed_at。
+        调用方负责提交事务，汇总与结果写入同时生效或同时回滚。
+        使用单条 upsert 在数据库中累加（MySQL 为 ON DUPLICATE KEY UPDATE，SQLite 为 ON CONFLICT），
+        不先读后写，也不需要 FOR UPDATE 锁住尚不存在的区间；行按唯一键排序写入，
+        并发批次以相同顺序加锁，避免互相等待形成死锁。
+        """
+        deltas = self._collect(results)
+        if not deltas:
+            return
+
+        now = datetime.utcnow()
+        rows = [
+            {
+                "project_id": project_id,
+                "testcase_id": testcase_id,
+                "granularity": granularity,
+                "bucket_start": start,
+                **deltas[(project_id, testcase_id, granularity, start)],
+                "updated_at": now
+            }
+            for project_id, testcase_id, granularity, start in sorted(deltas)
+        ]
+        await db.execute(self._upsert(db.get_bind().dialect.name, rows))
+
+    async def rebuild(self, db: AsyncSession, project_id: int, chunk_size: int = 5000) -> int:
+        """根据原始测试结果重建项目的汇总数据（用于历史数据回填），返回处理的结果数"""
+        await db.execute(
+            TestResultRollup.__table__.delete().where(TestResultRollup.project_id == project_id)
+        )
+        processed = 0
+        last_id = 0
+        while True:
+            rows = (await db.execute(
+                select(TestResult.id, TestResult.testcase_id, TestResult.status,
+                       TestResult.execution_time, TestResult.executed_at)
+                .join(TestCase, TestResult.testcase_id == TestCase.id)
+                .where(TestCase.project_id == project_id, TestResult.id > last_id)
+                .order_by(TestResult.id)
+                .limit(chunk_size)
+            )).all()
+            if not rows:
+                break
+            await self.apply(db, [
+                {
+                    "project_id": project_id,
+                    "testcase_id": row.testcase_id,
+                    "status": row.status,
+                    "execution_time": row.execution_time,
+                    "executed_at": row.executed_at
+                }
+                for row in rows
+            ])
+            await db.flush()
+            processed += len(rows)
+            last_id = rows[-1].id
+        await db.commit()
+        logger.info(f"重建测试结果汇总完成: 项目ID {project_id}，共 {processed} 条结果")
+        return processed
+
+    async def get_trends(
+        self,
+        db: AsyncSession,
+        project_id: int,
+        granularity: str = "day",
+        days: int = 30,
+        testcase_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """从汇总表读取项目（或单个用例）在最近若干天内的趋势"""
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"不支持的汇总粒度: {granularity}")
+        since = bucket_start(datetime.utcnow() - timedelta(days=days), granularity)
+        query = select(TestResultRollup).where(
+            TestResultRollup.project_id == project_id,
+            TestResultRollup.granularity == granularity,
+            TestResultRollup.bucket_start >= since
+        )
+        if testcase_id is not None:
+            query = query.where(TestResultRollup.testcase_id == testcase_id)
+        rollups = (await db.scalars(query.order_by(TestResultRollup.bucket_start))).all()
+
+        # 同一区间内的各用例汇总合并为一个点
+        points: Dict[datetime, Dict[str, Any]] = {}
+        for rollup in rollups:
+            point = points.setdefault(rollup.bucket_start, _empty_delta())
+            self._apply_delta_to_point(point, rollup)
+
+        series = []
+        for start, point in points.items():
+            series.append({
+                "bucket_start": start.isoformat(),
+                "total": point["total"],
+                "passed": point["passed"],
+                "failed": point["failed"],
+                "error": point["error"],
+                "other": point["other"],
+                "pass_rate": round(point["passed"] / point["total"], 4) if point["total"] else 0.0,
+                "average_execution_time": round(point["duration_sum"] / point["duration_count"], 2) if point["duration_count"] else None,
+                "p50_execution_time": estimate_percentile(point["latency_buckets"], 0.5, point["duration_max"]),
+                "p95_execution_time": estimate_percentile(point["latency_buckets"], 0.95, point["duration_max"]),
+                "max_execution_time": point["duration_max"] if point["duration_count"] else None
+            })
+        return {
+            "project_id": project_id,
+            "testcase_id": testcase_id,
+            "granularity": granularity,
+            "since": since.isoformat(),
+            "series": series
+        }
+
+    @staticmethod
+    def _apply_delta_to_point(point: Dict[str, Any], rollup: TestResultRollup):
+        for field in ("total", "passed", "failed", "error", "other", "duration_count", "duration_sum"):
+            point[field] += getattr(rollup, field) or 0
+        point["duration_max"] = max(point["duration_max"], rollup.duration_max or 0)
+        point["latency_buckets"] = _merge_buckets(point["latency_buckets"], rollup.latency_buckets or [])
+
+
+# 全局实例
+rollup_service = RollupService()
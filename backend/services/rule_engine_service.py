@@ -1,5 +1,7 @@
 from typing import List, Dict, Any, Optional
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from models.database_models import RuleTemplate, RuleDefinition, AssertionRule, TestCaseRule
 import json
 import copy
@@ -7,10 +9,10 @@ import copy
 
 class RuleEngineService:
     
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
     
-    def generate_testcases_by_rules(
+    async def generate_testcases_by_rules(
         self, 
         api_info: Dict[str, Any], 
         rule_template_ids: List[int]
@@ -18,7 +20,7 @@ class RuleEngineService:
         testcases = []
         
         for template_id in rule_template_ids:
-            template = self.get_rule_template_with_details(template_id)
+            template = await self.get_rule_template_with_details(template_id)
             if not template or not template.is_enabled:
                 continue
             
@@ -33,10 +35,13 @@ class RuleEngineService:
         
         return testcases
     
-    def get_rule_template_with_details(self, template_id: int) -> Optional[RuleTemplate]:
-        return self.db.query(RuleTemplate).filter(
-            RuleTemplate.id == template_id
-        ).first()
+    async def get_rule_template_with_details(self, template_id: int) -> Optional[RuleTemplate]:
+        # 预加载规则定义和断言，生成用例时不再触发延迟加载
+        return await self.db.scalar(
+            select(RuleTemplate)
+            .where(RuleTemplate.id == template_id)
+            .options(selectinload(RuleTemplate.rule_definitions).selectinload(RuleDefinition.assertion_rules))
+        )
     
     def _generate_positive_case(
         self, 
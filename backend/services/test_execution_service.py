@@ -1,10 +1,14 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Dict, Any, Optional
 from models.database_models import TestReport, BatchTestTask
 from schemas.response_schemas import HttpTestRequest, HttpTestResponse, TcpTestRequest, TcpTestResponse, MqTestRequest, MqTestResponse, BatchTestRequest
 from utils.http_client import HttpClient
 from utils.tcp_client import TcpClient
 from utils.mq_client import MqClient
+from services.result_stats import aggregate_project_results, latency_percentiles, merge_result_aggregates
+from services.result_retention import result_retention
+from services.result_writer import result_writer
 from core.logging import setup_logging
 import uuid
 import asyncio
@@ -35,10 +39,10 @@ class TestExecutionService:
                 )
                 
                 logger.info(f"HTTP测试完成: {request.method} {request.url}")
-                return HttpTestResponse(**result)
+                response = HttpTestResponse(**result)
         except Exception as e:
             logger.error(f"HTTP测试失败: {request.method} {request.url} - {str(e)}")
-            return HttpTestResponse(
+            response = HttpTestResponse(
                 status_code=0,
                 headers={},
                 body=None,
@@ -46,6 +50,12 @@ class TestExecutionService:
                 success=False,
                 error_message=str(e)
             )
+        await self._record_result(request.testcase_id, response, {
+            "status_code": response.status_code,
+            "headers": response.headers,
+            "body": response.body
+        })
+        return response
     
     async def execute_tcp_test(self, request: TcpTestRequest) -> TcpTestResponse:
         """执行TCP接口测试"""
@@ -59,15 +69,17 @@ class TestExecutionService:
             )
             
             logger.info(f"TCP测试完成: {request.host}:{request.port}")
-            return TcpTestResponse(**result)
+            response = TcpTestResponse(**result)
         except Exception as e:
             logger.error(f"TCP测试失败: {request.host}:{request.port} - {str(e)}")
-            return TcpTestResponse(
+            response = TcpTestResponse(
                 success=False,
                 response_data=None,
                 execution_time=0,
                 error_message=str(e)
             )
+        await self._record_result(request.testcase_id, response, {"response_data": response.response_data})
+        return response
     
     async def execute_mq_test(self, request: MqTestRequest) -> MqTestResponse:
         """执行MQ接口测试"""
@@ -86,18 +98,34 @@ class TestExecutionService:
             )
             
             logger.info(f"MQ测试完成: {request.mq_type} {request.host}:{request.port}")
-            return MqTestResponse(**result)
+            response = MqTestResponse(**result)
         except Exception as e:
             logger.error(f"MQ测试失败: {request.mq_type} {request.host}:{request.port} - {str(e)}")
-            return MqTestResponse(
+            response = MqTestResponse(
                 success=False,
                 message_id=None,
                 response_data=None,
                 execution_time=0,
                 error_message=str(e)
             )
+        await self._record_result(request.testcase_id, response, {
+            "message_id": response.message_id,
+            "response_data": response.response_data
+        })
+        return response
     
-    async def execute_batch_test(self, db: Session, batch_request: BatchTestRequest) -> str:
+    async def _record_result(self, testcase_id: Optional[int], response, response_data: Dict[str, Any]):
+        """请求指定了测试用例时，把执行结果交给缓冲写入器批量保存"""
+        if testcase_id is None:
+            return
+        await result_writer.submit(testcase_id, {
+            "status": "passed" if response.success else "failed",
+            "response_data": response_data,
+            "execution_time": response.execution_time,
+            "error_message": response.error_message
+        })
+    
+    async def execute_batch_test(self, db: AsyncSession, batch_request: BatchTestRequest) -> str:
         """执行批量测试"""
         task_id = str(uuid.uuid4())
         
@@ -114,7 +142,7 @@ class TestExecutionService:
                 error_tests=0
             )
             db.add(batch_task)
-            db.commit()
+            await db.commit()
             
             logger.info(f"批量测试任务创建成功: {task_id}")
             
@@ -125,13 +153,13 @@ class TestExecutionService:
             return task_id
         except Exception as e:
             logger.error(f"创建批量测试任务失败: {str(e)}")
-            db.rollback()
+            await db.rollback()
             raise e
     
-    async def get_batch_test_status(self, db: Session, task_id: str) -> Optional[Dict[str, Any]]:
+    async def get_batch_test_status(self, db: AsyncSession, task_id: str) -> Optional[Dict[str, Any]]:
         """获取批量测试任务状态"""
         try:
-            task = db.query(BatchTestTask).filter(BatchTestTask.task_id == task_id).first()
+            task = await db.scalar(select(BatchTestTask).where(BatchTestTask.task_id == task_id))
             if not task:
                 return None
             
@@ -149,10 +177,10 @@ class TestExecutionService:
             logger.error(f"获取批量测试任务状态失败: {task_id} - {str(e)}")
             raise e
     
-    def get_test_report(self, db: Session, report_id: int) -> Optional[TestReport]:
+    async def get_test_report(self, db: AsyncSession, report_id: int) -> Optional[TestReport]:
         """获取测试报告"""
         try:
-            report = db.query(TestReport).filter(TestReport.id == report_id).first()
+            report = await db.get(TestReport, report_id)
             if report:
                 logger.info(f"获取测试报告成功: ID {report_id}")
             else:
@@ -162,22 +190,36 @@ class TestExecutionService:
             logger.error(f"获取测试报告失败: ID {report_id} - {str(e)}")
             raise e
     
-    async def generate_test_report(self, db: Session, project_id: int, version_id: Optional[int] = None) -> TestReport:
-        """生成测试报告"""
+    async def generate_test_report(
+        self,
+        db: AsyncSession,
+        project_id: int,
+        version_id: Optional[int] = None,
+        include_percentiles: bool = False,
+        include_archived: bool = False
+    ) -> TestReport:
+        """生成测试报告
+        
+        用例数和按状态分组的结果统计均在数据库中聚合完成，不加载测试结果行；
+        include_archived 为 True 时同时统计已归档（超过保留期）的测试结果。
+        """
         try:
-            from models.database_models import TestCase, TestResult
+            from models.database_models import TestCase
             
-            # 获取项目的所有测试用例
-            testcases = db.query(TestCase).filter(TestCase.project_id == project_id).all()
-            
-            # 获取所有测试结果
-            results = db.query(TestResult).join(TestCase).filter(TestCase.project_id == project_id).all()
+            # 获取项目的测试用例数
+            total_tests = await db.scalar(
+                select(func.count(TestCase.id)).where(TestCase.project_id == project_id)
+            )
             
-            # 统计测试结果
-            total_tests = len(testcases)
-            passed_tests = len([r for r in results if r.status == "passed"])
-            failed_tests = len([r for r in results if r.status == "failed"])
-            error_tests = len([r for r in results if r.status == "error"])
+            # 按状态分组统计测试结果
+            aggregated = await aggregate_project_results(db, project_id)
+            if include_archived:
+                archived = await asyncio.to_thread(result_retention.aggregate_archived_results, project_id)
+                aggregated = merge_result_aggregates(aggregated, archived)
+            status_counts = aggregated["status_counts"]
+            passed_tests = status_counts.get("passed", 0)
+            failed_tests = status_counts.get("failed", 0)
+            error_tests = status_counts.get("error", 0)
             
             # 计算成功率
             success_rate = (passed_tests / total_tests * 100) if total_tests > 0 else 0
@@ -189,8 +231,10 @@ class TestExecutionService:
                 "failed_tests": failed_tests,
                 "error_tests": error_tests,
                 "success_rate": success_rate,
-                "average_execution_time": sum(r.execution_time for r in results) / len(results) if results else 0
+                "average_execution_time": aggregated["average_execution_time"]
             }
+            if include_percentiles:
+                summary["execution_time_percentiles"] = await latency_percentiles(db, project_id)
             
             # 创建测试报告
             report = TestReport(
@@ -204,12 +248,12 @@ class TestExecutionService:
             )
             
             db.add(report)
-            db.commit()
-            db.refresh(report)
+            await db.commit()
+            await db.refresh(report)
             
             logger.info(f"生成测试报告成功: 项目ID {project_id}，报告ID {report.id}")
             return report
         except Exception as e:
             logger.error(f"生成测试报告失败: 项目ID {project_id} - {str(e)}")
-            db.rollback()
+            await db.rollback()
             raise e
\ No newline at end of file
@@ -1,11 +1,15 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select, insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
+from datetime import datetime
 from models.database_models import TestCase, TestResult
 from schemas.response_schemas import TestCaseCreate, TestCaseResponse
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
     from models.database_models import TestCase as TestCaseModel
+from services.rollup_service import rollup_service
+from services.response_storage import response_storage
 from core.logging import setup_logging
 
 logger = setup_logging()[0]
@@ -14,44 +18,44 @@ logger = setup_logging()[0]
 class TestCaseService:
     """测试用例管理服务类"""
     
-    def create_testcase(self, db: Session, project_id: int, testcase: TestCaseCreate) -> TestCase:
+    async def create_testcase(self, db: AsyncSession, project_id: int, testcase: TestCaseCreate) -> TestCase:
         """创建测试用例"""
         try:
             db_testcase = TestCase(**testcase.dict(), project_id=project_id)
             db.add(db_testcase)
-            db.commit()
-            db.refresh(db_testcase)
+            await db.commit()
+            await db.refresh(db_testcase)
             logger.info(f"创建测试用例成功: {testcase.name} (项目ID: {project_id})")
             return db_testcase
         except Exception as e:
             logger.error(f"创建测试用例失败: {testcase.name} - {str(e)}")
-            db.rollback()
+            await db.rollback()
             raise e
     
-    def get_testcases(self, db: Session, project_id: int) -> List[TestCase]:
+    async def get_testcases(self, db: AsyncSession, project_id: int) -> List[TestCase]:
         """获取项目的测试用例"""
         try:
-            testcases = db.query(TestCase).filter(TestCase.project_id == project_id).all()
+            testcases = (await db.scalars(select(TestCase).where(TestCase.project_id == project_id))).all()
             logger.info(f"获取测试用例列表成功，项目ID: {project_id}，共 {len(testcases)} 个用例")
             return testcases
         except Exception as e:
             logger.error(f"获取测试用例列表失败: 项目ID {project_id} - {str(e)}")
             raise e
 
-    def get_all_testcases(self, db: Session) -> List[TestCase]:
+    async def get_all_testcases(self, db: AsyncSession) -> List[TestCase]:
         """获取所有测试用例"""
         try:
-            testcases = db.query(TestCase).all()
+            testcases = (await db.scalars(select(TestCase))).all()
             logger.info(f"获取所有测试用例成功，共 {len(testcases)} 个用例")
             return testcases
         except Exception as e:
             logger.error(f"获取所有测试用例失败: {str(e)}")
             raise e
     
-    def get_testcase(self, db: Session, testcase_id: int) -> Optional[TestCase]:
+    async def get_testcase(self, db: AsyncSession, testcase_id: int) -> Optional[TestCase]:
         """获取指定测试用例"""
         try:
-            testcase = db.query(TestCase).filter(TestCase.id == testcase_id).first()
+            testcase = await db.get(TestCase, testcase_id)
             if testcase:
                 logger.info(f"获取测试用例成功: {testcase.name} (ID: {testcase_id})")
             else:
@@ -61,10 +65,10 @@ class TestCaseService:
             logger.error(f"获取测试用例失败: ID {testcase_id} - {str(e)}")
             raise e
     
-    def update_testcase(self, db: Session, testcase_id: int, testcase_update: dict) -> Optional[TestCase]:
+    async def update_testcase(self, db: AsyncSession, testcase_id: int, testcase_update: dict) -> Optional[TestCase]:
         """更新测试用例"""
         try:
-            testcase = db.query(TestCase).filter(TestCase.id == testcase_id).first()
+            testcase = await db.get(TestCase, testcase_id)
             if not testcase:
                 logger.warning(f"更新测试用例失败，用例不存在: ID {testcase_id}")
                 return None
@@ -73,72 +77,159 @@ class TestCaseService:
                 if hasattr(testcase, field):
                     setattr(testcase, field, value)
             
-            db.commit()
-            db.refresh(testcase)
+            await db.commit()
+            await db.refresh(testcase)
             logger.info(f"更新测试用例成功: {testcase.name} (ID: {testcase_id})")
             return testcase
         except Exception as e:
             logger.error(f"更新测试用例失败: ID {testcase_id} - {str(e)}")
-            db.rollback()
+            await db.rollback()
             raise e
     
-    def delete_testcase(self, db: Session, testcase_id: int) -> bool:
+    async def delete_testcase(self, db: AsyncSession, testcase_id: int) -> bool:
         """删除测试用例"""
         try:
-            testcase = db.query(TestCase).filter(TestCase.id == testcase_id).first()
+            testcase = await db.get(TestCase, testcase_id)
             if not testcase:
                 logger.warning(f"删除测试用例失败，用例不存在: ID {testcase_id}")
                 return False
             
             testcase_name = testcase.name
-            db.delete(testcase)
-            db.commit()
+            await db.delete(testcase)
+            await db.commit()
             logger.info(f"删除测试用例成功: {testcase_name} (ID: {testcase_id})")
             return True
         except Exception as e:
             logger.error(f"删除测试用例失败: ID {testcase_id} - {str(e)}")
-            db.rollback()
+            await db.rollback()
             raise e
     
-    def get_testcases_by_protocol(self, db: Session, project_id: int, protocol: str) -> List[TestCase]:
+    async def get_testcases_by_protocol(self, db: AsyncSession, project_id: int, protocol: str) -> List[TestCase]:
         """根据协议类型获取测试用例"""
         try:
-            testcases = db.query(TestCase).filter(
+            testcases = (await db.scalars(select(TestCase).where(
                 TestCase.project_id == project_id,
                 TestCase.protocol == protocol
-            ).all()
+            ))).all()
             logger.info(f"获取协议测试用例成功: {protocol}，项目ID: {project_id}，共 {len(testcases)} 个用例")
             return testcases
         except Exception as e:
             logger.error(f"获取协议测试用例失败: {protocol}，项目ID {project_id} - {str(e)}")
             raise e
     
-    def save_test_result(self, db: Session, testcase_id: int, result_data: dict) -> TestResult:
-        """保存测试结果"""
+    async def save_test_result(self, db: AsyncSession, testcase_id: int, result_data: dict) -> TestResult:
+        """保存测试结果，并在同一事务中更新结果汇总"""
         try:
+            project_id = await db.scalar(select(TestCase.project_id).where(TestCase.id == testcase_id))
+            response_columns, blob = response_storage.prepare(result_data.get("response_data", {}))
             test_result = TestResult(
                 testcase_id=testcase_id,
                 status=result_data.get("status", "unknown"),
-                response_data=result_data.get("response_data", {}),
                 execution_time=result_data.get("execution_time", 0),
-                error_message=result_data.get("error_message")
+                error_message=result_data.get("error_message"),
+                executed_at=datetime.utcnow(),
+                **response_columns
             )
+            await response_storage.store(db, [blob])
             db.add(test_result)
-            db.commit()
-            db.refresh(test_result)
+            if project_id is not None:
+                await rollup_service.apply(db, [self._rollup_entry(project_id, test_result)])
+            await db.commit()
+            await db.refresh(test_result)
             logger.info(f"保存测试结果成功: 测试用例ID {testcase_id}")
             return test_result
         except Exception as e:
             logger.error(f"保存测试结果失败: 测试用例ID {testcase_id} - {str(e)}")
-            db.rollback()
+            await db.rollback()
             raise e
     
-    def get_test_results(self, db: Session, testcase_id: int, limit: int = 10) -> List[TestResult]:
+    async def save_test_results(self, db: AsyncSession, results: List[dict]) -> int:
+        """批量保存测试结果（每项需包含 testcase_id），一次提交并合并更新结果汇总，返回保存条数
+        
+        使用批量 INSERT（executemany，驱动会改写为多行 VALUES），不逐行回读自增主键。
+        """
+        if not results:
+            return 0
+        try:
+            testcase_ids = {item["testcase_id"] for item in results}
+            project_ids = dict((await db.execute(
+                select(TestCase.id, TestCase.project_id).where(TestCase.id.in_(testcase_ids))
+            )).all())
+            
+            now = datetime.utcnow()
+            rows = []
+            blobs = []
+            for item in results:
+                response_columns, blob = response_storage.prepare(item.get("response_data", {}))
+                blobs.append(blob)
+                # executemany 要求每行的列相同，未外置的响应也带上空的摘要列
+                rows.append({
+                    "testcase_id": item["testcase_id"],
+                    "status": item.get("status", "unknown"),
+                    "response_digest": None,
+                    "response_size": None,
+                    "response_preview": None,
+                    "execution_time": item.get("execution_time", 0),
+                    "error_message": item.get("error_message"),
+                    "executed_at": item.get("executed_at") or now,
+                    **response_columns
+                })
+            # 相同的大响应在一批中只保存一份
+            await response_storage.store(db, blobs)
+            await db.execute(insert(TestResult), rows)
+            await rollup_service.apply(db, [
+                {"project_id": project_ids[row["testcase_id"]], **row}
+                for row in rows
+                if project_ids.get(row["testcase_id"]) is not None
+            ])
+            await db.commit()
+            logger.info(f"批量保存测试结果成功，共 {len(rows)} 条")
+            return len(rows)
+        except Exception as e:
+            logger.error(f"批量保存测试结果失败: {str(e)}")
+            await db.rollback()
+            raise e
+    
+    @staticmethod
+    def _rollup_entry(project_id: int, test_result: TestResult) -> dict:
+        return {
+            "project_id": project_id,
+            "testcase_id": test_result.testcase_id,
+            "status": test_result.status,
+            "execution_time": test_result.execution_time,
+            "executed_at": test_result.executed_at
+        }
+    
+    async def get_test_result_response(self, db: AsyncSession, result_id: int) -> Optional[dict]:
+        """获取测试结果的完整响应内容（外置存储的响应在此时才读取并解压）"""
+        row = (await db.execute(
+            select(TestResult.id, TestResult.response_data, TestResult.response_digest, TestResult.response_size)
+            .where(TestResult.id == result_id)
+        )).first()
+        if row is None:
+            return None
+        if row.response_digest is None:
+            return {"result_id": row.id, "stored": "inline", "response_data": row.response_data}
+        response_data = await response_storage.load(db, row.response_digest)
+        if response_data is None:
+            logger.error(f"测试结果的响应内容缺失: 结果ID {result_id}，摘要 {row.response_digest}")
+        return {
+            "result_id": row.id,
+            "stored": "blob",
+            "digest": row.response_digest,
+            "size": row.response_size,
+            "response_data": response_data
+        }
+    
+    async def get_test_results(self, db: AsyncSession, testcase_id: int, limit: int = 10) -> List[TestResult]:
         """获取测试用例的执行历史"""
         try:
-            results = db.query(TestResult).filter(
-                TestResult.testcase_id == testcase_id
-            ).order_by(TestResult.executed_at.desc()).limit(limit).all()
+            results = (await db.scalars(
+                select(TestResult)
+                .where(TestResult.testcase_id == testcase_id)
+                .order_by(TestResult.executed_at.desc())
+                .limit(limit)
+            )).all()
             logger.info(f"获取测试结果历史成功: 测试用例ID {testcase_id}，共 {len(results)} 条记录")
             return results
         except Exception as e:
@@ -0,0 +1,33 @@
+import pytest
+
+from services.ai.condition_evaluator import ConditionError, compile_condition, _MAX_RESULT_LEN
+
+
+@pytest.mark.parametrize("function", ["str", "lower", "upper"])
+def test_text_function_rejects_container(function):
+    # 嵌套重复的列表转成字符串会展开为超大字符串，必须在构造前拒绝
+    condition = compile_condition(f"len({function}(['a' * 10000] * 10000)) > 0")
+    with pytest.raises(ConditionError):
+        condition({})
+
+
+@pytest.mark.parametrize("function", ["str", "lower", "upper"])
+def test_text_function_result_length_is_bounded(function):
+    condition = compile_condition(f"len({function}(text)) > 0")
+    with pytest.raises(ConditionError):
+        condition({"text": "a" * (_MAX_RESULT_LEN + 1)})
+
+
+@pytest.mark.parametrize("expression, expected", [
+    ("str(code) == '200'", True),
+    ("lower(status) == 'ok'", True),
+    ("upper(status) == 'OK'", True),
+    ("str() == ''", True),
+])
+def test_text_function_on_scalars(expression, expected):
+    assert compile_condition(expression)({"code": 200, "status": "Ok"}) is expected
+
+
+def test_sequence_repeat_is_bounded():
+    with pytest.raises(ConditionError):
+        compile_condition("len('a' * 1000000) > 0")({})
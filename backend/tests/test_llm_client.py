@@ -0,0 +1,74 @@
+import asyncio
+
+from config.settings import settings
+from services.ai.llm_client import LLMClient, LLMProviderError, MockProvider
+from services.ai.rate_limiter import ProviderLimiter
+
+
+def test_cancelled_call_refunds_reserved_tokens(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_MOCK_ENABLED", True)
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "LLM_CACHE_DB_PATH", "")
+
+    async def run():
+        client = LLMClient()
+        limiter = client.limiters["mock"] = ProviderLimiter("mock", rpm=0, tpm=100000, max_concurrency=0)
+        started = asyncio.Event()
+
+        async def slow_call(*args, **kwargs):
+            started.set()
+            await asyncio.sleep(10)
+
+        monkeypatch.setattr(client, "_call_provider_once", slow_call)
+        # 模拟对冲请求中落败的一方：预留token后被取消
+        task = asyncio.create_task(client._call_provider("chat", "mock", [{"role": "user", "content": "hi"}], {"max_tokens": 5000}))
+        await started.wait()
+        assert limiter.tokens.available < 100000 - 5000 + 1
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert limiter.tokens.available >= 100000 - 1
+
+    asyncio.run(run())
+
+
+def test_stream_reports_the_provider_that_served_it(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_MOCK_ENABLED", True)
+    monkeypatch.setattr(settings, "LLM_MOCK_LATENCY_MS", 0)
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "LLM_CACHE_DB_PATH", "")
+    monkeypatch.setattr(settings, "LLM_FAILOVER_ORDER", ["bad", "mock"])
+
+    class FailingProvider(MockProvider):
+        async def stream_chat_completion(self, messages, **kwargs):
+            raise LLMProviderError("boom")
+            yield ""
+
+    async def run():
+        client = LLMClient()
+        client.providers["bad"] = FailingProvider()
+        client.limiters["bad"] = ProviderLimiter.from_settings("bad")
+        served = {}
+        chunks = [chunk async for chunk in client.stream_text_completion("hi", provider="bad", served=served)]
+        assert chunks
+        assert served["provider"] == "mock"
+
+    asyncio.run(run())
+
+
+def test_stream_cache_entry_carries_estimated_usage(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_MOCK_ENABLED", True)
+    monkeypatch.setattr(settings, "LLM_MOCK_LATENCY_MS", 0)
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "LLM_CACHE_DB_PATH", "")
+
+    async def run():
+        client = LLMClient()
+        messages = [{"role": "user", "content": "hello"}]
+        streamed = "".join([chunk async for chunk in client.stream_chat_completion(messages, provider="mock", temperature=0)])
+        result = await client.chat_completion(messages, provider="mock", temperature=0)
+        assert result["content"] == streamed
+        usage = result["usage"]
+        assert usage["completion_tokens"] > 0
+        assert usage["total_tokens"] == usage["prompt_tokens"] + usage["completion_tokens"]
+
+    asyncio.run(run())
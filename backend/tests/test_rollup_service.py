@@ -0,0 +1,22 @@
+from datetime import datetime
+
+import pytest
+
+from services.rollup_service import RollupService
+
+
+@pytest.mark.parametrize("status, column", [
+    ("passed", "passed"), ("success", "passed"), ("PASS", "passed"),
+    ("failed", "failed"), ("fail", "failed"), ("Error", "error"),
+    ("skipped", "other"), (None, "other"),
+])
+def test_collect_normalizes_status_like_the_aggregator(status, column):
+    deltas = RollupService()._collect([{
+        "project_id": 1, "testcase_id": 2, "status": status,
+        "execution_time": 15, "executed_at": datetime(2025, 1, 1, 10, 30)
+    }])
+    assert len(deltas) == 2
+    for delta in deltas.values():
+        assert delta["total"] == 1
+        assert delta[column] == 1
+        assert sum(delta[name] for name in ("passed", "failed", "error", "other")) == 1
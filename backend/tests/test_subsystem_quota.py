@@ -0,0 +1,85 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from sqlalchemy import exc
+
+from config.settings import settings
+from core import database
+from core.database import SubsystemQuota, session_factory
+
+
+@pytest.fixture
+def workflow_quota(monkeypatch):
+    quota = SubsystemQuota("workflow", 1)
+    monkeypatch.setitem(database._quotas, "workflow", quota)
+    monkeypatch.setattr(settings, "db_pool_timeout", 0.2)
+    return quota
+
+
+def test_quota_blocks_workflow_sessions(workflow_quota):
+    SessionLocal = session_factory("workflow")
+    holder = SessionLocal()
+    try:
+        start = time.perf_counter()
+        with pytest.raises(exc.TimeoutError):
+            SessionLocal()
+        assert time.perf_counter() - start >= 0.2
+        assert workflow_quota.get_stats()["timeouts"] == 1
+    finally:
+        holder.close()
+
+    with SessionLocal():
+        assert workflow_quota.in_use == 1
+    assert workflow_quota.in_use == 0
+
+
+def test_waiting_session_gets_quota_after_release(workflow_quota, monkeypatch):
+    monkeypatch.setattr(settings, "db_pool_timeout", 5)
+    SessionLocal = session_factory("workflow")
+    holder = SessionLocal()
+    threading.Timer(0.1, holder.close).start()
+    with SessionLocal():
+        assert workflow_quota.get_stats()["waits"] == 1
+
+
+def test_sync_session_on_event_loop_is_rejected(workflow_quota):
+    SessionLocal = session_factory("workflow")
+
+    async def open_on_loop():
+        SessionLocal()
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(open_on_loop())
+    assert workflow_quota.in_use == 0
+
+
+def test_quota_wait_in_thread_does_not_block_event_loop(workflow_quota, monkeypatch):
+    monkeypatch.setattr(settings, "db_pool_timeout", 5)
+    SessionLocal = session_factory("workflow")
+
+    def use_session(hold: float):
+        with SessionLocal():
+            time.sleep(hold)
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        await asyncio.gather(asyncio.to_thread(use_session, 0.2), asyncio.to_thread(use_session, 0.2))
+        task.cancel()
+        return ticks
+
+    start = time.perf_counter()
+    ticks = asyncio.run(main())
+    # 两个会话依次占用配额，等待期间事件循环仍在运行
+    assert time.perf_counter() - start >= 0.4
+    assert ticks >= 20
+    assert workflow_quota.get_stats()["waits"] == 1
@@ -0,0 +1,35 @@
+import asyncio
+import time
+
+from services.ai.workflow_events import WorkflowEventBus
+
+
+def test_unfinished_channel_expires_after_max_age():
+    bus = WorkflowEventBus(retention_seconds=600, max_age_seconds=60)
+    bus.publish("stale", "workflow_started")
+    bus.publish("finished", "workflow_completed")
+    bus._channels["stale"].last_event_at = time.monotonic() - 120
+    bus.publish("new", "workflow_started")
+    assert not bus.has_channel("stale")
+    assert bus.has_channel("finished")
+    assert bus.has_channel("new")
+
+
+def test_subscriber_of_expired_channel_stops():
+    async def run():
+        bus = WorkflowEventBus(heartbeat_seconds=0.05, max_age_seconds=60)
+        bus.publish("stale", "workflow_started")
+        events = []
+
+        async def consume():
+            async for event in bus.subscribe("stale"):
+                events.append(event)
+
+        task = asyncio.create_task(consume())
+        await asyncio.sleep(0.02)
+        bus._channels["stale"].last_event_at = time.monotonic() - 120
+        bus.publish("new", "workflow_started")
+        await asyncio.wait_for(task, 1)
+        assert events[0]["type"] == "workflow_started"
+
+    asyncio.run(run())